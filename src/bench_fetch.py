@@ -0,0 +1,91 @@
+"""
+Benchmark hors ligne : boucle messages().get séquentielle vs récupération par lots
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from fake_gmail import FakeGmailService, generate_mailbox, make_message
+from gmail_fetch import USER_ID, iter_messages, iter_messages_by_id, parse_message
+from gmail_sync import HistorySync, load_cursor
+
+
+def serial_fetch(service, q="is:unread", max_results=500):
+    """Reproduit l'ancienne boucle : une requête HTTP par message"""
+    res = service.users().messages().list(userId=USER_ID, q=q, maxResults=max_results).execute()
+    out = []
+    for m in res.get("messages", []):
+        msg = service.users().messages().get(userId=USER_ID, id=m["id"], format="full").execute()
+        out.append(parse_message(msg))
+    return out
+
+
+def run(label, fn, service):
+    service.reset_counters()
+    start = time.perf_counter()
+    messages = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(messages):>5} msgs  {elapsed:7.2f}s  "
+          f"{service.http_requests:>4} appels HTTP  {len(messages) / elapsed:8.1f} msgs/s")
+
+
+def check_outage(latency):
+    """Gmail en 429 permanent sur messages.get : rien ne lève, le curseur reste en place
+    et le message est repris au cycle suivant. Retourne la liste des problèmes."""
+    service = FakeGmailService(generate_mailbox(5), latency=latency)
+    sync = HistorySync(service, cursor_path=os.path.join(tempfile.mkdtemp(), "history_cursor.json"))
+    sync.poll()
+    sync.commit()
+    before = load_cursor(sync.cursor_path)
+    service.add_message(make_message("panne0", "client@exemple.com", "Info", "Combien coûte la formation ?"))
+
+    def cycle():
+        stats = {"metadata": 0, "full": 0, "rejected": 0, "failed": []}
+        ids = [m["id"] for m in iter_messages_by_id(service, sync.poll(), stats=stats)]
+        sync.commit(failed=len(stats["failed"]))
+        return ids, stats["failed"]
+
+    problems = []
+    service.error_rate = 1.0
+    try:
+        fetched, failed = cycle()
+    except Exception as e:
+        return [f"cycle en panne interrompu : {type(e).__name__}: {e}"]
+    if fetched or failed != ["panne0"]:
+        problems.append(f"échecs signalés {failed} au lieu de ['panne0']")
+    if load_cursor(sync.cursor_path) != before:
+        problems.append("curseur avancé malgré un message en échec")
+    service.error_rate = 0.0
+    fetched, failed = cycle()
+    if fetched != ["panne0"]:
+        problems.append(f"message non repris après la panne (récupérés : {fetched})")
+    if load_cursor(sync.cursor_path) == before:
+        problems.append("curseur resté en place après un cycle réussi")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.02, help="secondes par aller-retour HTTP")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[10, 50, 100])
+    args = parser.parse_args()
+
+    service = FakeGmailService(generate_mailbox(args.messages), latency=args.latency)
+    print(f"📦 {args.messages} messages non lus, latence {args.latency * 1000:.0f} ms\n")
+    run("séquentiel", lambda: serial_fetch(service, max_results=args.messages), service)
+    for size in args.batch_size:
+        run(f"batch={size}", lambda: list(iter_messages(service, batch_size=size)), service)
+
+    print("\n🔌 Panne Gmail (429 sur tous les messages.get, reprises épuisées)")
+    problems = check_outage(args.latency)
+    for problem in problems:
+        print(f"ÉCHEC : {problem}")
+    if not problems:
+        print("ok : aucune exception, curseur conservé puis avancé une fois le message repris")
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
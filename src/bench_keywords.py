@@ -0,0 +1,69 @@
+"""
+Micro-benchmark : boucles `k in body.lower()` vs KeywordMatcher compilé
+"""
+import argparse
+import random
+import time
+
+from fake_gmail import generate_mailbox
+from gmail_fetch import extract_text
+from keyword_matcher import KeywordMatcher
+from src.config import DEFAULT_CONFIG
+
+SCRIPT_KEYWORDS = ["formation", "gardiennage", "prix", "intéressé par la formation"]
+
+
+def legacy(body, keywords):
+    """Ancien code : any() puis une seconde passe, body.lower() à chaque terme"""
+    if not any(k in body.lower() for k in keywords):
+        return []
+    return [k for k in keywords if k in body.lower()]
+
+
+def synthetic_synonyms(n, seed=7):
+    """n termes factices répartis sur les catégories (volume d'un vrai lexique)"""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyzéèà"
+    synonyms = {}
+    for i in range(n):
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(5, 12)))
+        synonyms.setdefault(SCRIPT_KEYWORDS[i % len(SCRIPT_KEYWORDS)], []).append(word)
+    return synonyms
+
+
+def timed(label, fn, bodies, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        hits = sum(1 for body in bodies if fn(body))
+    per_mail = (time.perf_counter() - start) / (repeat * len(bodies)) * 1e6
+    print(f"{label:<34} {per_mail:8.1f} µs/courriel  {hits:>4} courriels détectés")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--body-repeat", type=int, default=200, help="≈ 28 octets par répétition")
+    parser.add_argument("--synonyms", type=int, nargs="+", default=[0, 100, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bodies = [extract_text(m["payload"]) for m in generate_mailbox(args.messages,
+                                                                   body_repeat=args.body_repeat)]
+    avg = sum(len(b) for b in bodies) / len(bodies)
+    print(f"📦 {len(bodies)} courriels, {avg / 1024:.1f} Ko en moyenne\n")
+    for n in args.synonyms:
+        synonyms = synthetic_synonyms(n)
+        keywords = SCRIPT_KEYWORDS + [w for ws in synonyms.values() for w in ws]
+        matcher = KeywordMatcher(SCRIPT_KEYWORDS, synonyms)
+        print(f"— {len(matcher)} termes")
+        timed("  any() + liste (ancien)", lambda b: legacy(b, keywords), bodies, args.repeat)
+        timed("  KeywordMatcher.matching", matcher.matching, bodies, args.repeat)
+        timed("  KeywordMatcher.search", matcher.search, bodies, args.repeat)
+    config_matcher = KeywordMatcher.from_config(DEFAULT_CONFIG)
+    sample = "Je suis INTERESSE par vos Formations de GARDIENNAGE"
+    print(f"\n🔤 {sample!r} → ancien {legacy(sample, DEFAULT_CONFIG['keywords'])}, "
+          f"compilé {config_matcher.matching(sample)}")
+
+
+if __name__ == "__main__":
+    main()
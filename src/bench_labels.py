@@ -0,0 +1,76 @@
+"""
+Benchmark hors ligne : labels().list + modify par message vs registre de labels et batchModify par cycle
+"""
+import argparse
+import time
+
+from fake_gmail import FakeGmailService, generate_mailbox
+from gmail_labels import LabelQueue, LabelRegistry
+
+USER_ID = "me"
+
+
+def legacy_move_to_label(service, msg_id, label_name):
+    """Ancienne version de gmail_chatgpt_auto_reply.move_to_label"""
+    labels = service.users().labels().list(userId=USER_ID).execute().get("labels", [])
+    label_id = next((l["id"] for l in labels if l["name"].lower() == label_name.lower()), None)
+    if not label_id:
+        label = service.users().labels().create(userId=USER_ID, body={"name": label_name}).execute()
+        label_id = label["id"]
+    service.users().messages().modify(userId=USER_ID, id=msg_id,
+                                      body={"addLabelIds": [label_id]}).execute()
+
+
+def legacy_mark_processed(service, msg_id, label_name):
+    legacy_move_to_label(service, msg_id, label_name)
+    service.users().messages().modify(userId=USER_ID, id=msg_id,
+                                      body={"removeLabelIds": ["UNREAD"]}).execute()
+
+
+def cycles(service, n_cycles, per_cycle):
+    """IDs par cycle : (Élite, traités)"""
+    ids = list(service.order)
+    for c in range(n_cycles):
+        chunk = ids[c * per_cycle * 2:(c + 1) * per_cycle * 2]
+        yield chunk[:per_cycle], chunk[per_cycle:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--per-cycle", type=int, default=40, help="messages Élite et traités par cycle")
+    parser.add_argument("--latency", type=float, default=0.02, help="secondes par aller-retour HTTP")
+    args = parser.parse_args()
+    mailbox = generate_mailbox(args.cycles * args.per_cycle * 2, body_repeat=1)
+
+    service = FakeGmailService(mailbox, latency=args.latency)
+    start = time.perf_counter()
+    for elite, processed in cycles(service, args.cycles, args.per_cycle):
+        for msg_id in elite:
+            legacy_move_to_label(service, msg_id, "Élite")
+        for msg_id in processed:
+            legacy_mark_processed(service, msg_id, "Traité")
+    print(f"par message      {time.perf_counter() - start:6.2f}s  {service.http_requests:>4} appels HTTP  "
+          f"({service.calls['labels.list']} labels.list, {service.calls['messages.modify']} modify)")
+
+    service = FakeGmailService(mailbox, latency=args.latency)
+    queue = LabelQueue(LabelRegistry(USER_ID), USER_ID)
+    start = time.perf_counter()
+    for elite, processed in cycles(service, args.cycles, args.per_cycle):
+        for msg_id in elite:
+            queue.add(msg_id, add=["Élite"])
+        for msg_id in processed:
+            queue.mark_processed(msg_id, "Traité", read=True)
+        queue.flush(service)
+    print(f"batchModify      {time.perf_counter() - start:6.2f}s  {service.http_requests:>4} appels HTTP  "
+          f"({service.calls['labels.list']} labels.list, {service.calls['messages.batchModify']} batchModify)")
+
+    labels = {l["name"]: l["id"] for l in service.labels.values()}
+    elite = sum(labels["Élite"] in m["labelIds"] for m in service.messages.values())
+    processed = sum(labels["Traité"] in m["labelIds"] and "UNREAD" not in m["labelIds"]
+                    for m in service.messages.values())
+    print(f"\n✔️ {elite} messages « Élite », {processed} messages « Traité » et lus")
+
+
+if __name__ == "__main__":
+    main()
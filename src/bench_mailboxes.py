@@ -0,0 +1,111 @@
+"""
+Benchmark hors ligne : plusieurs boîtes traitées l'une après l'autre vs en parallèle (mailboxes.run_mailboxes),
+Gmail, OpenAI et Sheets remplacés par les faux services locaux
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import core
+import gmail_chatgpt_auto_reply as pipeline
+from fake_gmail import FakeGmailService, generate_mailbox
+from fake_openai import FakeOpenAIServer
+from fake_sheets import FakeWorksheet
+from gmail_labels import LabelQueue, LabelRegistry
+from mailboxes import Mailbox, run_mailbox, run_mailboxes
+from reply_cache import ReplyCache
+from reply_pool import RateLimiter, ReplyPool
+from sheet_writer import SheetWriter
+
+
+class BenchMailbox(Mailbox):
+    """Boîte branchée sur un FakeGmailService et une FakeWorksheet"""
+
+    def __init__(self, name, service, worksheet, sheets_limiter):
+        super().__init__(name, f"bench-{name}", processed_label="Traité")
+        self.service = service
+        self.worksheet = worksheet
+        self.sheets_limiter = sheets_limiter
+        self.cursor_dir = tempfile.mkdtemp()
+
+    @property
+    def store_path(self):
+        return ":memory:"
+
+    @property
+    def cursor_path(self):
+        return os.path.join(self.cursor_dir, "history_cursor.json")
+
+    def gmail_service(self):
+        return self.service
+
+    def account(self):
+        return pipeline.Account(
+            SheetWriter(self.name, worksheet=self.worksheet, limiter=self.sheets_limiter),
+            LabelQueue(LabelRegistry()), core.filter_rules(), name=self.name,
+            processed_label=self.processed_label)
+
+
+def build(args, mailboxes):
+    """Nouvelles boîtes factices et clients partagés neufs (caches vides) pour une passe"""
+    pipeline.REPLY_CACHE = ReplyCache(path=None)
+    pipeline.REPLY_POOL = ReplyPool(workers=args.workers, limiter=RateLimiter(rpm=args.rpm, tpm=args.tpm),
+                                    base_delay=0.05)
+    sheets_limiter = RateLimiter(rpm=args.sheets_rpm)
+    return [BenchMailbox(f"boite{i}", FakeGmailService(messages, latency=args.gmail_latency),
+                         FakeWorksheet(latency=args.sheets_latency), sheets_limiter)
+            for i, messages in enumerate(mailboxes)]
+
+
+def report(label, elapsed, boxes, results):
+    seen = sum(r["seen"] for r in results if not isinstance(r, Exception))
+    suggested = sum(r["suggested"] for r in results if not isinstance(r, Exception))
+    http = sum(m.service.http_requests for m in boxes)
+    sheets = sum(sum(m.worksheet.calls.values()) for m in boxes)
+    print(f"{label:<20} {elapsed:6.2f}s  {seen / elapsed:6.1f} messages/s  {seen} examinés, "
+          f"{suggested} suggestions  Gmail {http} appels  Sheets {sheets} appels")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--accounts", type=int, default=3, help="nombre de boîtes")
+    parser.add_argument("--messages", type=int, default=60, help="messages par boîte")
+    parser.add_argument("--keyword-rate", type=float, default=0.3)
+    parser.add_argument("--gmail-latency", type=float, default=0.05, help="secondes par aller-retour HTTP")
+    parser.add_argument("--openai-latency", type=float, default=0.3, help="secondes par complétion")
+    parser.add_argument("--sheets-latency", type=float, default=0.1, help="secondes par appel Sheets")
+    parser.add_argument("--workers", type=int, default=4, help="requêtes OpenAI simultanées (pool commun)")
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=200000)
+    parser.add_argument("--sheets-rpm", type=int, default=60, help="budget Sheets commun aux boîtes")
+    parser.add_argument("--verbose", action="store_true", help="affiche la sortie du pipeline")
+    args = parser.parse_args()
+
+    mailboxes = [generate_mailbox(args.messages, keyword_rate=args.keyword_rate, seed=i, body_repeat=5)
+                 for i in range(args.accounts)]
+    print(f"📦 {args.accounts} boîtes de {args.messages} messages\n")
+
+    with FakeOpenAIServer(latency=args.openai_latency) as server:
+        openai = core.get_openai()
+        openai.api_base = server.url
+        openai.api_key = "sk-bench"
+        output = None if args.verbose else io.StringIO()
+
+        boxes = build(args, mailboxes)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            results = [run_mailbox(m) for m in boxes]
+        report("l'une après l'autre", time.perf_counter() - start, boxes, results)
+
+        boxes = build(args, mailboxes)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            results = list(run_mailboxes(boxes).values())
+        report("en parallèle", time.perf_counter() - start, boxes, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Fixtures MIME (iPhone, Outlook, charsets, attachmentId…) et débit de l'extracteur de corps
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import time
+
+from fake_gmail import FakeGmailService, generate_mailbox
+from gmail_fetch import iter_messages
+from mime_text import MAX_BODY_BYTES, extract_text
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "mime")
+
+
+def legacy_extract_text(payload):
+    """Ancien extracteur : parties text/plain de premier niveau seulement, UTF-8 imposé"""
+    for part in payload.get("parts", []) or []:
+        if part.get("mimeType") == "text/plain":
+            data = part.get("body", {}).get("data", "")
+            return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+    data = (payload.get("body") or {}).get("data")
+    if data:
+        return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+    return ""
+
+
+def load_fixtures(directory=FIXTURE_DIR):
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            fixtures[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+    return fixtures
+
+
+def check(name, fixture, text):
+    missing = [s for s in fixture["expect"] if s not in text]
+    leaked = [s for s in fixture.get("absent", []) if s in text]
+    return not missing and not leaked, missing + [f"!{s}" for s in leaked]
+
+
+def run_fixtures(fixtures):
+    """Chaque fixture passe par le vrai chemin : FakeGmailService → iter_messages → extract_text"""
+    service = FakeGmailService([f["message"] for f in fixtures.values()])
+    for f in fixtures.values():
+        service.attachments.update(f["attachments"])
+    bodies = {m["id"]: m["body"] for m in iter_messages(service, q=None)}
+    failures = 0
+    print(f"{'fixture':<28} {'nouveau':<8} {'ancien':<8}")
+    for name, fixture in fixtures.items():
+        ok, problems = check(name, fixture, bodies[fixture["message"]["id"]])
+        try:
+            legacy_ok = check(name, fixture, legacy_extract_text(fixture["message"]["payload"]))[0]
+            legacy = "ok" if legacy_ok else "raté"
+        except Exception as e:
+            legacy = f"erreur ({type(e).__name__})"
+        failures += not ok
+        print(f"{name:<28} {'ok' if ok else 'ÉCHEC':<8} {legacy:<8} {' '.join(problems)}")
+    print(f"\n📎 attachments().get appelé {service.calls['messages.attachments.get']} fois "
+          f"(corps lus uniquement)")
+    return failures
+
+
+def _throughput(title, payloads):
+    size = sum(len(json.dumps(p)) for p in payloads)
+    print(title)
+    for label, fn in (("ancien", legacy_extract_text), ("nouveau", extract_text)):
+        start = time.perf_counter()
+        for p in payloads:
+            try:
+                fn(p)
+            except Exception:
+                pass
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<8} {len(payloads) / elapsed:10.0f} msgs/s  {size / elapsed / 1e6:7.1f} Mo/s")
+
+
+def run_throughput(fixtures, repeat):
+    _throughput("Fixtures (l'ancien extracteur abandonne souvent tôt) :",
+                [f["message"]["payload"] for f in fixtures.values() if not f["attachments"]] * repeat)
+    _throughput("Boîte synthétique multipart/alternative, ~5 Ko (les deux réussissent) :",
+                [m["payload"] for m in generate_mailbox(repeat // 4, body_repeat=200, html=True)])
+
+    capped = "x" * (MAX_BODY_BYTES * 8)
+    huge = {"mimeType": "text/plain",
+            "body": {"data": base64.urlsafe_b64encode(capped.encode()).decode()}}
+    start = time.perf_counter()
+    text = extract_text(huge)
+    print(f"\n✂️ corps de {len(capped) // 1024} Ko plafonné à {len(text) // 1024} Ko "
+          f"en {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    failures = run_fixtures(fixtures)
+    print()
+    run_throughput(fixtures, args.repeat)
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark hors ligne : liste de 1000 messages, tout charger puis reconstruire vs pages au défilement et deltas
+"""
+import argparse
+import time
+
+from fake_gmail import FakeGmailService, generate_mailbox, make_message
+from gmail_fetch import iter_messages, iter_messages_by_id, list_page
+from paged_inbox import PAGE_SIZE, PagedInbox, fill_view, sync_tree
+
+QUERY = "is:unread"
+
+
+class FakeTree:
+    """Treeview sans affichage : mêmes méthodes que ttk.Treeview, opérations comptées.
+
+    visible : lignes tenant dans la vue, pour yview().
+    """
+
+    def __init__(self, visible=20):
+        self.items = []
+        self.ops = 0
+        self.visible = visible
+
+    def yview(self):
+        return 0.0, min(1.0, self.visible / len(self.items)) if self.items else 1.0
+
+    def after_idle(self, fn):
+        fn()
+
+    def get_children(self):
+        return tuple(self.items)
+
+    def delete(self, *items):
+        self.ops += len(items)
+        gone = set(items)
+        self.items = [i for i in self.items if i not in gone]
+
+    def insert(self, parent, index, iid=None, values=()):
+        self.ops += 1
+        self.items.insert(len(self.items) if index == "end" else index, iid)
+
+    def move(self, item, parent, index):
+        self.ops += 1
+        self.items.remove(item)
+        self.items.insert(index, item)
+
+
+def row(msg):
+    return {"id": msg["id"], "from": msg["from"], "subject": msg["subject"]}
+
+
+def rebuild(tree, rows):
+    """Ancien comportement : tree.delete(*get_children()) puis une insertion par ligne"""
+    tree.delete(*tree.get_children())
+    for r in rows:
+        tree.insert("", "end", iid=r["id"], values=(r["from"], r["subject"]))
+
+
+def report(label, service, start, tree, rows):
+    print(f"{label:<34} {time.perf_counter() - start:6.2f}s  {service.http_requests:>4} appels HTTP  "
+          f"{len(rows):>5} lignes  {tree.ops:>5} opérations Treeview")
+    service.reset_counters()
+    tree.ops = 0
+
+
+def check_filtered_first_page(latency, page_size=10, visible=20):
+    """Deux pages sans prospect en tête de boîte, filtrées côté client : fill_view() doit
+    charger la suite sans défilement. Retourne la liste des problèmes."""
+    noise = [make_message(f"bruit{i}", "Notifications <noreply@exemple.com>", "Notification", "Rien à voir")
+             for i in range(2 * page_size + 5)]
+    prospects = [make_message(f"client{i}", f"Client <c{i}@exemple.com>", "Demande d'information",
+                              "Bonjour, quel est le prix de la formation ?") for i in range(visible + 5)]
+    service = FakeGmailService(noise + prospects, latency=latency)
+    tree = FakeTree(visible=visible)
+    inbox = PagedInbox(lambda token, size: list_page(service, q=QUERY, page_token=token, page_size=size),
+                       lambda ids: {m["id"]: row(m) if "prix" in m["snippet"] else None
+                                    for m in iter_messages_by_id(service, ids, fmt="metadata")},
+                       page_size=page_size)
+
+    def load_more():
+        # Même enchaînement que les interfaces : rappel de l'exécuteur → sync_tree → fill_view
+        sync_tree(tree, inbox.load_more(), lambda r: r["id"], lambda r: (r["from"], r["subject"]))
+        fill_view(tree, inbox, load_more)
+
+    load_more()
+    print(f"\n   première page filtrée : {len(tree.items)} lignes affichées "
+          f"après {inbox.stats['pages']} pages (vue de {visible} lignes)")
+    if len(tree.items) < visible and not inbox.exhausted:
+        return [f"vue non remplie : {len(tree.items)} lignes sur {visible}, boîte non épuisée"]
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02, help="secondes par aller-retour HTTP")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--scroll-pages", type=int, default=4, help="pages parcourues par l'opérateur")
+    parser.add_argument("--new", type=int, default=5, help="messages arrivés avant le rafraîchissement")
+    parser.add_argument("--read", type=int, default=10, help="messages lus ailleurs avant le rafraîchissement")
+    args = parser.parse_args()
+
+    mailbox = generate_mailbox(args.messages, keyword_rate=0.3, body_repeat=5)
+    values = lambda r: (r["from"], r["subject"])
+
+    def changes(service, step):
+        """Nouveaux messages en tête et messages lus depuis un autre poste"""
+        for i in range(args.new):
+            service.add_message(make_message(f"nouveau-{step}-{i}", f"Client <n{i}@exemple.com>",
+                                             "Demande d'information", "Bonjour, quel est le prix ?"))
+        for msg_id in list(service.order)[args.new:args.new + args.read * 3:3]:
+            service.messages[msg_id]["labelIds"].remove("UNREAD")
+
+    # Ancien comportement : tout le listing en métadonnées, reconstruit à chaque rafraîchissement
+    service = FakeGmailService(mailbox, latency=args.latency)
+    tree = FakeTree()
+    start = time.perf_counter()
+    rows = [row(m) for m in iter_messages(service, q=QUERY, fmt="metadata")]
+    rebuild(tree, rows)
+    report("tout charger : première liste", service, start, tree, rows)
+    changes(service, 1)
+    start = time.perf_counter()
+    rows = [row(m) for m in iter_messages(service, q=QUERY, fmt="metadata")]
+    rebuild(tree, rows)
+    report("tout charger : rafraîchissement", service, start, tree, rows)
+
+    # Pages au défilement, rafraîchissement par deltas
+    service = FakeGmailService(mailbox, latency=args.latency)
+    tree = FakeTree()
+    inbox = PagedInbox(lambda token, size: list_page(service, q=QUERY, page_token=token, page_size=size),
+                       lambda ids: {m["id"]: row(m) for m in iter_messages_by_id(service, ids, fmt="metadata")},
+                       page_size=args.page_size)
+    start = time.perf_counter()
+    rows = inbox.load_more()
+    sync_tree(tree, rows, lambda r: r["id"], values)
+    report("pages : première page", service, start, tree, rows)
+    start = time.perf_counter()
+    for _ in range(args.scroll_pages - 1):
+        rows = inbox.load_more()
+        sync_tree(tree, rows, lambda r: r["id"], values)
+    report(f"pages : défilement ({args.scroll_pages - 1} pages)", service, start, tree, rows)
+    selected = rows[len(rows) // 2]["id"]
+    changes(service, 1)
+    start = time.perf_counter()
+    rows = inbox.refresh()
+    inserted, removed, moved = sync_tree(tree, rows, lambda r: r["id"], values)
+    report("pages : rafraîchissement", service, start, tree, rows)
+    print(f"\n   deltas : +{inserted} -{removed} ~{moved} ; ligne sélectionnée toujours présente : "
+          f"{selected in tree.items}")
+
+    problems = check_filtered_first_page(args.latency)
+    for problem in problems:
+        print(f"ÉCHEC : {problem}")
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark de bout en bout : une boîte enregistrée ou synthétique rejouée dans gmail_chatgpt_auto_reply.run_cycle,
+Gmail, OpenAI et Sheets remplacés par les faux services locaux
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import time
+import tracemalloc
+
+import core
+import gmail_chatgpt_auto_reply as pipeline
+from fake_gmail import FakeGmailService, generate_mailbox, load_mailbox
+from fake_openai import FakeOpenAIServer
+from fake_sheets import FakeWorksheet
+from gmail_labels import LabelQueue, LabelRegistry
+from message_store import MessageStore
+from reply_cache import ReplyCache
+from reply_pool import RateLimiter, ReplyPool
+from sheet_writer import SheetWriter
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def timed(items, key, fetched):
+    """Note l'heure à laquelle chaque message sort du téléchargement"""
+    for item in items:
+        fetched.setdefault(key(item), time.perf_counter())
+        yield item
+
+
+def install(args, server, fetched, latencies):
+    """Remplace les clients du pipeline par les faux services ; retourne la feuille factice"""
+    openai = core.get_openai()
+    openai.api_base = server.url
+    openai.api_key = "sk-bench"
+    pipeline.REPLY_CACHE = ReplyCache(path=None)
+    pipeline.REPLY_POOL = ReplyPool(workers=args.workers, limiter=RateLimiter(rpm=args.rpm, tpm=args.tpm),
+                                    base_delay=0.05)
+    worksheet = FakeWorksheet(latency=args.sheets_latency)
+    pipeline.SHEET_WRITER = SheetWriter("bench", worksheet=worksheet)
+    pipeline.LABEL_QUEUE = LabelQueue(LabelRegistry(pipeline.USER_ID), pipeline.USER_ID)
+    pipeline.PROCESSED_LABEL = args.processed_label
+
+    # Latence par message : sortie du téléchargement → ligne remise à la feuille
+    iter_messages_by_id, iter_conversations = pipeline.iter_messages_by_id, pipeline.iter_conversations
+    pipeline.iter_messages_by_id = lambda *a, **kw: timed(iter_messages_by_id(*a, **kw),
+                                                          lambda m: m["id"], fetched)
+    pipeline.iter_conversations = lambda *a, **kw: timed(iter_conversations(*a, **kw),
+                                                         lambda c: c.latest["id"], fetched)
+    append = pipeline.SHEET_WRITER.append
+
+    def timed_append(row):
+        latencies.append(time.perf_counter() - fetched.get(row[1], time.perf_counter()))
+        append(row)
+    pipeline.SHEET_WRITER.append = timed_append
+    return worksheet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fixture", help="boîte enregistrée (JSON format=full) au lieu d'une boîte synthétique")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--keyword-rate", type=float, default=0.3)
+    parser.add_argument("--html-only-rate", type=float, default=0.2, help="proportion de messages HTML seul")
+    parser.add_argument("--attachment-rate", type=float, default=0.1, help="proportion avec pièce jointe")
+    parser.add_argument("--body-repeat", type=int, default=5)
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=False,
+                        help="corps répétés, servis en partie par le cache de réponses (défaut : --no-cache, "
+                             "un corps distinct par message pour mesurer la génération elle-même)")
+    parser.add_argument("--threads", action="store_true", help="mode conversation (run_cycle(threads=True))")
+    parser.add_argument("--gmail-latency", type=float, default=0.02, help="secondes par aller-retour HTTP")
+    parser.add_argument("--bandwidth", type=float, default=2e6, help="octets/s (défaut : 2 Mo/s)")
+    parser.add_argument("--openai-latency", type=float, default=0.3, help="secondes par complétion")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="proportion de 429 injectés")
+    parser.add_argument("--sheets-latency", type=float, default=0.1, help="secondes par appel Sheets")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=200000)
+    parser.add_argument("--processed-label", default="Traité", help="label appliqué en fin de cycle")
+    parser.add_argument("--verbose", action="store_true", help="affiche la sortie du pipeline")
+    parser.add_argument("--json", metavar="PATH", help="écrit les résultats en JSON (suivi des régressions)")
+    args = parser.parse_args()
+
+    if args.fixture:
+        mailbox = load_mailbox(args.fixture)
+        source = os.path.basename(args.fixture)
+    else:
+        mailbox = generate_mailbox(args.messages, keyword_rate=args.keyword_rate, body_repeat=args.body_repeat,
+                                   html=True, html_only_rate=args.html_only_rate,
+                                   attachment_rate=args.attachment_rate, unique_bodies=not args.cache)
+        source = (f"synthétique, mots-clés {args.keyword_rate:.0%}, HTML seul {args.html_only_rate:.0%}, "
+                  f"pièces jointes {args.attachment_rate:.0%}, "
+                  f"{'corps répétés' if args.cache else 'corps distincts'}")
+    print(f"📦 {len(mailbox)} messages ({source})\n")
+
+    service = FakeGmailService(mailbox, latency=args.gmail_latency, bandwidth=args.bandwidth)
+    fetched, latencies = {}, []
+    with FakeOpenAIServer(latency=args.openai_latency, error_rate=args.openai_error_rate) as server:
+        worksheet = install(args, server, fetched, latencies)
+        output = None if args.verbose else io.StringIO()
+        tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            result = pipeline.run_cycle(service, MessageStore(":memory:"), threads=args.threads)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        openai_calls = dict(server.calls)
+
+    results = {
+        "messages": len(mailbox),
+        "seen": result["seen"],
+        "suggested": result["suggested"],
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(len(mailbox) / elapsed, 1),
+        "seen_per_second": round(result["seen"] / elapsed, 1),
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "gmail": {"http_requests": service.http_requests, "bytes": service.bytes_sent, **service.calls},
+        "openai": openai_calls,
+        "sheets": dict(worksheet.calls),
+        "peak_python_mb": round(peak / 1e6, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    print(f"⏱️  {results['seconds']:.2f}s  {results['seen']} examinés, {results['suggested']} suggestions")
+    print(f"   débit : {results['messages_per_second']:.1f} messages de la boîte/s, "
+          f"{results['seen_per_second']:.1f} messages examinés/s")
+    print(f"   latence par message (téléchargé → feuille) : p50 {results['latency_p50']:.2f}s  "
+          f"p95 {results['latency_p95']:.2f}s")
+    print(f"📨 Gmail  : {service.http_requests} appels HTTP, {service.bytes_sent / 1024:.0f} Ko  "
+          f"{dict(service.calls)}")
+    print(f"🤖 OpenAI : {openai_calls.get('requests', 0)} requêtes  {openai_calls}")
+    print(f"📄 Sheets : {sum(worksheet.calls.values())} appels  {dict(worksheet.calls)}")
+    print(f"🧠 Mémoire : pic Python du cycle {results['peak_python_mb']} Mo (tracemalloc), "
+          f"RSS max {results['max_rss_mb']} Mo")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Résultats écrits dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark hors ligne : attente par clic dans l'interface, avec et sans pré-génération des suggestions
+"""
+import argparse
+import heapq
+import itertools
+import statistics
+import time
+
+from fake_openai import FakeOpenAIServer, chat_completion
+from tk_tasks import PREFETCH_ROWS, PREFETCH_WORKERS, SuggestionPrefetcher
+
+
+class FakeRoot:
+    """Boucle d'événements minimale (after) à la place de Tk, pour tourner sans affichage"""
+
+    def __init__(self):
+        self.timers = []
+        self.counter = itertools.count()
+
+    def after(self, ms, fn):
+        heapq.heappush(self.timers, (time.perf_counter() + ms / 1000, next(self.counter), fn))
+
+    def run_until(self, done, timeout=60):
+        deadline = time.perf_counter() + timeout
+        while not done() and time.perf_counter() < deadline:
+            when, _, fn = heapq.heappop(self.timers)
+            time.sleep(max(0.0, when - time.perf_counter()))
+            fn()
+
+    def run_for(self, seconds):
+        end = time.perf_counter() + seconds
+        self.run_until(lambda: time.perf_counter() >= end, timeout=seconds + 1)
+
+
+def triage(server, messages, read_time, rows, workers):
+    """L'opérateur clique chaque ligne dans l'ordre et lit la suggestion read_time secondes"""
+    root = FakeRoot()
+    prefetcher = SuggestionPrefetcher(root, lambda body: chat_completion(server.url, body),
+                                      rows=rows, workers=workers)
+    prefetcher.prefetch(list(enumerate(messages)) if rows else [])
+    waits = []
+    for i, body in enumerate(messages):
+        shown = []
+        start = time.perf_counter()
+        prefetcher.request(i, body, shown.append)
+        root.run_until(lambda: shown)
+        waits.append(time.perf_counter() - start)
+        root.run_for(read_time)
+    prefetcher.shutdown()
+    return waits, prefetcher.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=1.5, help="secondes par complétion")
+    parser.add_argument("--read", type=float, default=1.0, help="secondes de lecture par courriel")
+    parser.add_argument("--rows", type=int, default=PREFETCH_ROWS)
+    parser.add_argument("--workers", type=int, default=PREFETCH_WORKERS)
+    args = parser.parse_args()
+
+    messages = [f"Bonjour, je suis intéressé par la formation de gardiennage (demande {i})."
+                for i in range(args.messages)]
+    with FakeOpenAIServer(latency=args.latency) as server:
+        for label, rows in (("à la demande", 0), ("pré-génération", args.rows)):
+            server.calls.clear()
+            start = time.perf_counter()
+            waits, stats = triage(server, messages, args.read, rows, args.workers)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<15} attente/clic moy. {statistics.mean(waits):5.2f}s  "
+                  f"max {max(waits):5.2f}s  immédiates {stats['instant']:>3}/{len(waits)}  "
+                  f"appels {server.calls['completions']:>3}  session {elapsed:6.1f}s")
+
+
+if __name__ == "__main__":
+    main()
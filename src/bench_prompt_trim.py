@@ -0,0 +1,98 @@
+"""
+Benchmark hors ligne : jetons, coût et latence des prompts avant/après retrait des citations et signatures
+"""
+import argparse
+import random
+import time
+
+from fake_openai import FakeOpenAIServer, chat_completion
+from prompt_trim import PromptTrimmer, clean_body
+from reply_pool import ReplyPool, estimate_tokens
+
+QUESTIONS = [
+    "Bonjour,\n\nJe suis intéressé par la formation de gardiennage. Quel est le prix et quand commence "
+    "la prochaine cohorte ?",
+    "Bonjour, est-ce que la formation est offerte en ligne ? Merci de me revenir rapidement.",
+    "Allô, mon fils voudrait s'inscrire au cours de gardiennage, comment payer ?",
+]
+SIGNATURE = ("\n\nCordialement,\nJean Tremblay\nDirecteur des opérations\nSécurité ABC inc.\n"
+             "1234, rue Principale, Montréal (Québec)\nT. 514-555-1234\nwww.securite-abc.ca\n\n"
+             "AVIS DE CONFIDENTIALITÉ : Ce courriel et ses pièces jointes peuvent contenir des "
+             "renseignements confidentiels. ")
+DISCLAIMER = ("Si vous avez reçu ce message par erreur, veuillez en aviser l'expéditeur et le détruire. "
+              "Toute diffusion est interdite. ") * 4
+PREVIOUS = ("Bonjour Jean,\nMerci pour votre intérêt. Voici le calendrier des prochaines sessions, les "
+            "modalités d'inscription et la liste des documents requis pour le permis du BSP. ") * 3
+
+
+# (corps, fragments à conserver, fragments à retirer) : un « Merci! » en milieu de message n'est pas une signature
+CASES = [
+    ("Bonjour,\nMerci!\nJ'aimerais connaître le prix de la formation.\nQuand commence la prochaine cohorte ?\n"
+     "Est-ce possible le soir ?\nJean",
+     ["le prix", "prochaine cohorte ?", "le soir ?", "Jean"], []),
+    ("Bonjour,\nThanks\nMon numéro est le 514-555-1234, appelez-moi après 17 h pour l'inscription.\nJean",
+     ["514-555-1234", "après 17 h", "Jean"], []),
+    ("Quel est le prix de la formation ?" + SIGNATURE,
+     ["Quel est le prix", "Cordialement,", "Jean Tremblay"], ["Directeur des opérations", "514-555-1234"]),
+]
+
+
+def check_cases():
+    """Nombre de cas de CASES dont le nettoyage perd du texte utile ou garde la signature"""
+    failures = 0
+    for i, (body, keep, drop) in enumerate(CASES, 1):
+        cleaned = clean_body(body)
+        problems = [s for s in keep if s not in cleaned] + [f"!{s}" for s in drop if s in cleaned]
+        failures += bool(problems)
+        print(f"cas {i} : {'ok' if not problems else 'ÉCHEC'} {' '.join(problems)}")
+    return failures
+
+
+def make_thread_body(rng):
+    """Question + signature + historique cité d'une longueur variable (0 à 6 échanges)"""
+    body = rng.choice(QUESTIONS) + SIGNATURE + DISCLAIMER
+    for depth in range(rng.randint(0, 6)):
+        quoted = "\n".join("> " * (depth + 1) + line for line in (PREVIOUS + SIGNATURE).splitlines())
+        body += (f"\n\nLe lun. {depth + 3} juin 2024 à 10:0{depth}, Académie XGuard "
+                 f"<academie@academiexguard.ca> a écrit :\n\n{quoted}")
+    return body
+
+
+def run(label, server, prompts, workers):
+    server.calls.clear()
+    start = time.perf_counter()
+    ReplyPool(workers=workers).map(lambda p: chat_completion(server.url, p), prompts,
+                                   cost=lambda p: estimate_tokens(p) + 300)
+    elapsed = time.perf_counter() - start
+    tokens = server.calls["prompt_tokens"]
+    return label, elapsed, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=800, help="jetons max par corps")
+    parser.add_argument("--latency", type=float, default=0.2, help="secondes fixes par complétion")
+    parser.add_argument("--prompt-latency", type=float, default=0.15, help="secondes par 1000 jetons")
+    parser.add_argument("--price", type=float, default=2.50, help="$ par million de jetons d'entrée")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    failures = check_cases()
+    print()
+    rng = random.Random(3)
+    bodies = [make_thread_body(rng) for _ in range(args.messages)]
+    trimmer = PromptTrimmer(budget=args.budget)
+    trimmed = [trimmer.trim(b) for b in bodies]
+    print(trimmer.summary())
+    print(f"exemple après nettoyage :\n{trimmed[0]}\n")
+
+    with FakeOpenAIServer(latency=args.latency, prompt_latency=args.prompt_latency) as server:
+        for label, elapsed, tokens in (run("corps complet", server, bodies, args.workers),
+                                       run("corps nettoyé", server, trimmed, args.workers)):
+            print(f"{label:<15} {tokens:>7} jetons  {tokens * args.price / 1e6:7.4f} $  {elapsed:6.2f}s")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark hors ligne du mode push : latence bout en bout et appels API à vide, puis le
+câblage réel (daemon_receiver + AutoReplyDaemon) face à un cycle en échec
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+import core
+import gmail_chatgpt_auto_reply as pipeline
+from bench_mailboxes import BenchMailbox
+from fake_gmail import FakeGmailService, generate_mailbox, make_message
+from fake_openai import FakeOpenAIServer
+from fake_pubsub import FakePubSubPublisher
+from fake_sheets import FakeWorksheet
+from gmail_auto_reply_daemon import AutoReplyDaemon
+from gmail_fetch import iter_messages_by_id
+from gmail_push import PushReceiver, daemon_receiver, register_watch
+from gmail_sync import HistorySync
+from reply_cache import ReplyCache
+from reply_pool import RateLimiter
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def check_daemon_wiring(latency):
+    """Cycle du démon en échec (panne Gmail) puis même notification renvoyée par Pub/Sub :
+    le second passage doit traiter le message. Retourne la liste des problèmes."""
+    gmail = FakeGmailService(generate_mailbox(10), latency=latency)
+    worksheet = FakeWorksheet()
+    pipeline.REPLY_CACHE = ReplyCache(path=None)
+    mailbox = BenchMailbox("push", gmail, worksheet, RateLimiter(rpm=600))
+    daemon = AutoReplyDaemon(incremental=True, mailbox=mailbox)
+    problems = []
+    with FakeOpenAIServer(latency=0.0) as server, contextlib.redirect_stdout(io.StringIO()):
+        openai = core.get_openai()
+        openai.api_base = server.url
+        openai.api_key = "sk-bench"
+        daemon.run_once()   # curseur initial : la boîte existante est traitée hors du test
+        receiver = daemon_receiver(daemon, port=0).start()
+        publisher = FakePubSubPublisher(receiver.url)
+        publisher.attach(gmail)
+        register_watch(gmail, "projects/local/topics/gmail")
+
+        gmail.outage = True
+        gmail.add_message(make_message("panne0", "client@exemple.com", "Info", "Combien coûte la formation ?"))
+        if not wait_until(lambda: receiver.runs >= 1):
+            problems.append("aucun passage pendant la panne")
+        gmail.outage = False
+        publisher.publish(gmail.history_id)   # Pub/Sub renvoie la même notification
+        wait_until(lambda: receiver.runs >= 2)
+        receiver.stop()
+        with daemon.cycle_lock:
+            daemon.close()
+
+    if receiver.failures != 1:
+        problems.append(f"{receiver.failures} passage(s) en échec au lieu de 1")
+    if receiver.runs < 2:
+        problems.append("notification renvoyée ignorée après un cycle en échec")
+    if "panne0" not in worksheet.col_values(2):
+        problems.append("message de la panne jamais consigné dans la feuille")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20, help="messages livrés pendant le test")
+    parser.add_argument("--latency", type=float, default=0.02, help="latence Gmail simulée")
+    parser.add_argument("--idle", type=float, default=2.0, help="secondes sans courrier mesurées")
+    parser.add_argument("--burst", type=int, default=10, help="messages livrés pendant un passage en cours")
+    args = parser.parse_args()
+
+    gmail = FakeGmailService(generate_mailbox(50), latency=args.latency)
+    cursor = os.path.join(tempfile.mkdtemp(), "history_cursor.json")
+    sync = HistorySync(gmail, cursor_path=cursor)
+    sync.poll()
+    sync.commit()
+
+    delivered = {}
+    processed = {}
+    handled = []
+    done = threading.Event()
+    gate = threading.Event()   # fermé : le passage en cours reste bloqué
+    gate.set()
+
+    def on_new_history(history_id):
+        gate.wait()
+        for msg in iter_messages_by_id(gmail, sync.poll()):
+            processed[msg["id"]] = time.perf_counter()
+            handled.append(msg["id"])
+        sync.commit()
+        if len(processed) >= args.messages + args.burst:
+            done.set()
+        return True
+
+    receiver = PushReceiver(on_new_history, port=0).start()
+    FakePubSubPublisher(receiver.url).attach(gmail)
+    register_watch(gmail, "projects/local/topics/gmail")
+
+    gmail.reset_counters()
+    time.sleep(args.idle)
+    idle_calls = gmail.http_requests
+
+    for i in range(args.messages):
+        msg_id = f"push{i}"
+        delivered[msg_id] = time.perf_counter()
+        gmail.add_message(make_message(msg_id, f"client{i}@exemple.com", "Info",
+                                       "Combien coûte la formation ?"))
+        time.sleep(0.05)
+
+    # Rafale pendant un passage bloqué : au plus ce passage et un seul suivant pour tout le lot
+    time.sleep(0.5)
+    gate.clear()
+    runs_before = receiver.runs
+    for i in range(args.burst):
+        gmail.add_message(make_message(f"burst{i}", f"client{i}@exemple.com", "Info",
+                                       "Combien coûte la formation ?"))
+    gate.set()
+    done.wait(timeout=30)
+    receiver.stop()
+    burst_runs = receiver.runs - runs_before
+
+    delays = sorted(processed[i] - delivered[i] for i in processed if i in delivered)
+    print(f"appels Gmail pendant {args.idle:.0f}s sans courrier : {idle_calls}")
+    print(f"messages traités : {len(delays)}/{args.messages}, notifications : {receiver.notifications}, "
+          f"passages : {receiver.runs}")
+    if delays:
+        print(f"latence bout en bout : médiane {delays[len(delays) // 2] * 1000:.0f} ms, "
+              f"max {delays[-1] * 1000:.0f} ms")
+    print(f"rafale de {args.burst} messages : {burst_runs} passage(s)")
+    print(f"appels API : {dict(gmail.calls)}")
+
+    problems = []
+    if idle_calls:
+        problems.append(f"{idle_calls} appel(s) Gmail sans courrier")
+    if len(processed) < args.messages + args.burst:
+        problems.append(f"{args.messages + args.burst - len(processed)} message(s) jamais traités")
+    if len(handled) > len(set(handled)):
+        problems.append(f"{len(handled) - len(set(handled))} message(s) traités deux fois")
+    if burst_runs > 2:
+        problems.append(f"rafale non regroupée : {burst_runs} passages au lieu de 2 au plus")
+    wiring = check_daemon_wiring(args.latency)
+    print(f"démon : cycle en échec puis notification renvoyée {'ok' if not wiring else 'ÉCHEC'}")
+    problems += wiring
+    for problem in problems:
+        print(f"ÉCHEC : {problem}")
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
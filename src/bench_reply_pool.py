@@ -0,0 +1,58 @@
+"""
+Benchmark hors ligne : génération séquentielle vs ReplyPool contre le serveur OpenAI factice
+"""
+import argparse
+import time
+
+from fake_openai import FakeOpenAIServer, chat_completion
+from reply_pool import RateLimiter, ReplyPool, call_with_retry, estimate_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.3, help="secondes par complétion")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="proportion de 429 injectés")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=200000)
+    args = parser.parse_args()
+
+    prompts = [f"Message {i} : combien coûte la formation gardiennage ?" for i in range(args.messages)]
+    with FakeOpenAIServer(latency=args.latency, error_rate=args.error_rate) as server:
+        def generate(prompt):
+            return chat_completion(server.url, prompt)["choices"][0]["message"]["content"]
+
+        start = time.perf_counter()
+        for p in prompts:
+            call_with_retry(lambda: generate(p), base_delay=0.05)
+        serial = time.perf_counter() - start
+
+        pool = ReplyPool(workers=args.workers, limiter=RateLimiter(args.rpm, args.tpm), base_delay=0.05)
+        rejected = server.calls["429"]
+        start = time.perf_counter()
+        results = pool.map(generate, prompts, cost=lambda p: estimate_tokens(p) + 300)
+        pooled = time.perf_counter() - start
+        rejected = server.calls["429"] - rejected
+
+        in_order = all(f"Message {i} " in r for i, r in enumerate(results) if isinstance(r, str))
+        failures = sum(isinstance(r, Exception) for r in results)
+        print(f"séquentiel : {serial:6.2f}s")
+        print(f"pool x{args.workers}  : {pooled:6.2f}s  ({serial / pooled:.1f}x)  "
+              f"reprises={pool.retry_count} échecs={failures} ordre conservé={in_order}")
+        print(f"serveur    : {dict(server.calls)}")
+
+    problems = []
+    if not in_order:
+        problems.append("résultats hors de l'ordre des messages")
+    if failures:
+        problems.append(f"{failures} message(s) en échec malgré les reprises")
+    if pool.retry_count < rejected:
+        problems.append(f"{rejected} 429 reçus pour seulement {pool.retry_count} reprises")
+    for problem in problems:
+        print(f"ÉCHEC : {problem}")
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
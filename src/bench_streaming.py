@@ -0,0 +1,81 @@
+"""
+Benchmark hors ligne : délai avant le premier texte affiché, réponse complète ou en flux (stream=True)
+"""
+import argparse
+import statistics
+import time
+
+from bench_prefetch import FakeRoot
+from fake_openai import FakeOpenAIServer, chat_completion, stream_completion
+from tk_tasks import SuggestionPrefetcher
+
+
+def click(root, prefetcher, key, body):
+    """Temps jusqu'au premier texte dans la boîte de réponse, puis jusqu'au texte complet"""
+    shown, deltas = [], []
+    start = time.perf_counter()
+    first = [None]
+
+    def on_delta(delta):
+        deltas.append(delta)
+        if first[0] is None:
+            first[0] = time.perf_counter() - start
+
+    def on_done(text):
+        shown.append(text)
+        if first[0] is None:
+            first[0] = time.perf_counter() - start
+
+    prefetcher.request(key, body, on_done, on_delta=on_delta)
+    root.run_until(lambda: shown)
+    return first[0], time.perf_counter() - start, shown[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.3, help="secondes avant le premier mot")
+    parser.add_argument("--token-latency", type=float, default=0.08, help="secondes par mot généré")
+    args = parser.parse_args()
+
+    bodies = [f"Bonjour, quel est le prix de la formation de gardiennage pour la session {i} ?"
+              for i in range(max(args.messages, 2))]
+    with FakeOpenAIServer(latency=args.latency, token_latency=args.token_latency) as server:
+        modes = (("réponse complète", dict(generate=lambda b: chat_completion(server.url, b)
+                                          ["choices"][0]["message"]["content"].strip())),
+                 ("flux", dict(stream=lambda b: stream_completion(server.url, b))))
+        for label, kwargs in modes:
+            root = FakeRoot()
+            prefetcher = SuggestionPrefetcher(root, rows=0, **kwargs)
+            results = [click(root, prefetcher, i, body) for i, body in enumerate(bodies[:args.messages])]
+            prefetcher.shutdown()
+            print(f"{label:<17} premier texte moy. {statistics.mean(r[0] for r in results):5.2f}s  "
+                  f"réponse complète moy. {statistics.mean(r[1] for r in results):5.2f}s")
+
+        # L'opérateur passe au courriel suivant pendant la génération : le flux est fermé
+        server.calls.clear()
+        root = FakeRoot()
+        prefetcher = SuggestionPrefetcher(root, rows=0, stream=lambda b: stream_completion(server.url, b))
+        prefetcher.request("a", bodies[0], lambda text: None)
+        root.run_for(args.latency + 3 * args.token_latency)
+        click(root, prefetcher, "b", bodies[1])
+        root.run_for(0.2)
+        prefetcher.shutdown()
+        print(f"changement de ligne : {prefetcher.stats['cancelled']} flux interrompu(s), "
+              f"{server.calls['cancelled']} connexion(s) fermée(s) côté serveur, "
+              f"suggestions gardées : {sorted(prefetcher.suggestions)}")
+
+    problems = []
+    if prefetcher.stats["cancelled"] != 1:
+        problems.append(f"{prefetcher.stats['cancelled']} flux interrompu(s) au lieu de 1")
+    if server.calls["cancelled"] < 1:
+        problems.append("connexion du flux abandonné restée ouverte côté serveur")
+    if sorted(prefetcher.suggestions) != ["b"]:
+        problems.append(f"suggestions gardées {sorted(prefetcher.suggestions)} au lieu de ['b']")
+    for problem in problems:
+        print(f"ÉCHEC : {problem}")
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark hors ligne : une suggestion par message vs une par conversation (threadId)
+"""
+import argparse
+import random
+import time
+
+from fake_gmail import FakeGmailService, PROSPECT_BODIES, make_message
+from fake_sheets import FakeWorksheet
+from gmail_fetch import iter_messages, iter_thread_ids
+from gmail_query import FilterRules
+from gmail_threads import iter_conversations
+from sheet_writer import SheetWriter
+
+RULES = FilterRules(keywords=["formation", "gardiennage", "prix"], base_query="is:unread", server_keywords=True)
+FOLLOW_UPS = ["Petite relance : avez-vous vu mon message ?", "Je me permets de vous relancer, merci.",
+              "Est-ce que la formation est toujours disponible ?"]
+
+
+def generate_threads(n, max_depth, seed=11):
+    """n conversations de prospects, chacune de 1 à max_depth messages non lus"""
+    rng = random.Random(seed)
+    now = int(time.time() * 1000)
+    messages, stamp = [], 0
+    for t in range(n):
+        depth = rng.randint(1, max_depth)
+        for d in range(depth):
+            body = rng.choice(PROSPECT_BODIES) if d == 0 else rng.choice(FOLLOW_UPS) + " Prix de la formation ?"
+            messages.append(make_message(f"t{t:04d}m{d}", f"Client {t} <client{t}@exemple.com>",
+                                         "Demande d'information" if d == 0 else "RE: Demande d'information",
+                                         body, thread_id=f"t{t:04d}", internal_date=now + stamp))
+            stamp += 60000
+    # FakeGmailService attend les plus récents d'abord
+    return sorted(messages, key=lambda m: -int(m["internalDate"]))
+
+
+def run(label, service, fn):
+    service.reset_counters()
+    sheet = SheetWriter("bench", worksheet=FakeWorksheet())
+    start = time.perf_counter()
+    prompts = fn(sheet)
+    sheet.flush()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {prompts:>4} appels GPT  {sheet.rows_written:>4} lignes  "
+          f"{service.http_requests:>3} appels HTTP  {service.bytes_sent / 1024:7.1f} Ko  {elapsed:5.2f}s")
+    return prompts
+
+
+def per_message(service):
+    def fn(sheet):
+        count = 0
+        for msg in iter_messages(service, q=RULES.query()):
+            if RULES.matching_keywords(msg["body"]) and not sheet.is_known(msg["id"]):
+                sheet.append(["", msg["id"], "", "", msg["subject"], "", "", "", "réponse", "", "", "", "Oui",
+                              msg["threadId"]])
+                count += 1
+        return count
+    return fn
+
+
+def per_thread(service):
+    def fn(sheet):
+        count = 0
+        thread_ids = iter_thread_ids(service, q=RULES.query())
+        for conv in iter_conversations(service, thread_ids, known=sheet.is_known):
+            msg = conv.latest
+            if RULES.matching_keywords(msg["body"]):
+                conv.prompt_body(msg["body"])
+                sheet.append(["", msg["id"], "", "", msg["subject"], "", "", "", "réponse", "", "", "", "Oui",
+                              conv.id])
+                count += 1
+        return count
+    return fn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    mailbox = generate_threads(args.threads, args.max_depth)
+    service = FakeGmailService(mailbox, latency=args.latency)
+    print(f"📦 {len(mailbox)} messages non lus dans {args.threads} conversations "
+          f"(profondeur moyenne {len(mailbox) / args.threads:.1f})\n")
+    before = run("par message", service, per_message(service))
+    after = run("par conversation", service, per_thread(service))
+    print(f"\n⚡ {before / max(after, 1):.1f}x moins d'appels GPT et de lignes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark hors ligne : format=full pour tout vs tri sur métadonnées puis format=full
+"""
+import argparse
+import json
+import os
+import time
+
+from fake_gmail import FakeGmailService, generate_mailbox, load_mailbox
+from gmail_fetch import iter_messages
+from gmail_query import FilterRules
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "mailbox_notifications.json")
+RULES = FilterRules.from_config(ignored_senders=["academie@academiexguard.ca"],
+                                excluded_subject_phrases=["confirmation d'inscription"],
+                                base_query="is:unread", server_keywords=False)
+
+
+def run(label, service, **kwargs):
+    service.reset_counters()
+    stats = {"metadata": 0, "full": 0, "rejected": 0}
+    start = time.perf_counter()
+    kept = [m for m in iter_messages(service, q=RULES.base_query, stats=stats, **kwargs)
+            if RULES.triage(m)]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<14} {len(kept):>4} retenus  {elapsed:6.2f}s  {service.http_requests:>3} appels HTTP  "
+          f"{service.bytes_sent / 1024:8.1f} Ko  (metadata={stats['metadata']}, full={stats['full']})")
+    return elapsed, service.bytes_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fixture", default=FIXTURE_PATH, help="boîte enregistrée (JSON format=full)")
+    parser.add_argument("--record", metavar="PATH", help="génère une boîte synthétique dans PATH et quitte")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--keyword-rate", type=float, default=0.15)
+    parser.add_argument("--latency", type=float, default=0.02, help="secondes par aller-retour HTTP")
+    parser.add_argument("--bandwidth", type=float, default=2e6, help="octets/s (défaut : 2 Mo/s)")
+    parser.add_argument("--body-repeat", type=int, default=50, help="taille des corps pour --record")
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.record:
+        os.makedirs(os.path.dirname(args.record) or ".", exist_ok=True)
+        with open(args.record, "w", encoding="utf-8") as f:
+            json.dump(generate_mailbox(args.messages, keyword_rate=args.keyword_rate,
+                                       body_repeat=args.body_repeat), f)
+        print(f"💾 {args.messages} messages enregistrés dans {args.record}")
+        return
+
+    mailbox = load_mailbox(args.fixture)
+    service = FakeGmailService(mailbox, latency=args.latency, bandwidth=args.bandwidth)
+    print(f"📦 {len(mailbox)} messages ({os.path.basename(args.fixture)}), "
+          f"latence {args.latency * 1000:.0f} ms, {args.bandwidth / 1e6:.1f} Mo/s\n")
+    full_time, full_bytes = run("full seul", service, batch_size=args.batch_size)
+    two_time, two_bytes = run("deux phases", service, batch_size=args.batch_size, triage=RULES.triage)
+    print(f"\n⚡ {full_bytes / max(two_bytes, 1):.1f}x moins d'octets, "
+          f"{full_time / max(two_time, 1e-9):.1f}x plus rapide")
+
+
+if __name__ == "__main__":
+    main()
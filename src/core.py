@@ -0,0 +1,185 @@
+"""
+Configuration et clients partagés par tous les points d'entrée (scripts, démon, interfaces)
+
+La configuration (src/config.py + .env) est chargée une fois par processus ;
+Gmail, OpenAI, la feuille, le cache et le pool de réponses sont construits au
+premier usage seulement, et les modules lourds (openai, googleapiclient,
+gspread) ne sont importés qu'à ce moment-là.
+"""
+import json
+import os
+import threading
+
+from src.config import DEFAULT_CONFIG, TOKEN_PATH, load_env
+
+from gmail_query import FilterRules
+from metrics import METRICS
+from prompt_trim import PromptTrimmer
+from reply_cache import ReplyCache
+from reply_pool import RateLimiter, ReplyPool
+from sheet_writer import SheetWriter
+from token_manager import get_gmail_service, get_token_manager
+
+_lock = threading.RLock()
+_config = None
+_openai = None
+_shared = {}
+
+
+# ---------- Configuration ---------- #
+def _load_config():
+    load_env()
+    env = os.getenv
+    config = dict(DEFAULT_CONFIG)
+    config.update({
+        "client_id": env("CLIENT_ID"),
+        "client_secret": env("CLIENT_SECRET"),
+        "refresh_token": env("REFRESH_TOKEN"),
+        "openai_api_key": env("OPENAI_API_KEY"),
+        "openai_api_base": env("OPENAI_API_BASE"),
+        "sheet_id": env("SHEET_ID") or DEFAULT_CONFIG["sheet_id"],
+        "reply_model": env("OPENAI_MODEL") or DEFAULT_CONFIG["reply_model"],
+        "gmail_batch_size": int(env("GMAIL_BATCH_SIZE", "50")),
+        "openai_workers": int(env("OPENAI_WORKERS", "4")),
+        "openai_rpm": int(env("OPENAI_RPM", "60")),
+        "openai_tpm": int(env("OPENAI_TPM", "40000")),
+        "sheets_rpm": int(env("SHEETS_RPM", "60")),
+        "prompt_body_tokens": int(env("PROMPT_BODY_TOKENS", DEFAULT_CONFIG["prompt_body_tokens"])),
+        "reply_cache_near_duplicates": env("REPLY_CACHE_NEAR_DUPLICATES") == "1",
+        "reply_streaming": env("REPLY_STREAMING", "1") != "0",
+        "processed_label": env("PROCESSED_LABEL", ""),
+        "mark_processed_read": env("MARK_PROCESSED_READ") == "1",
+        # Mots-clés dans q= (mots entiers seulement) et rapport de filtrage (2 listings par cycle)
+        "server_keywords": env("SERVER_KEYWORDS") == "1",
+        "filter_report": env("FILTER_REPORT") == "1",
+    })
+    return config
+
+
+def get_config():
+    """Configuration du processus : DEFAULT_CONFIG surchargé par les variables d'environnement"""
+    global _config
+    with _lock:
+        if _config is None:
+            _config = _load_config()
+        return _config
+
+
+def _shared_instance(name, factory):
+    with _lock:
+        if name not in _shared:
+            _shared[name] = factory()
+        return _shared[name]
+
+
+# ---------- Gmail ---------- #
+def _oauth_client():
+    """(client_id, client_secret, refresh_token) depuis .env, sinon depuis token.json (generate_token.py)"""
+    config = get_config()
+    if config["refresh_token"]:
+        return config["client_id"], config["client_secret"], config["refresh_token"]
+    for path in ("token.json", TOKEN_PATH):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        return data.get("client_id"), data.get("client_secret"), data.get("refresh_token")
+    return config["client_id"], config["client_secret"], None
+
+
+def token_manager():
+    return get_token_manager(*_oauth_client())
+
+
+def gmail_service():
+    """Service Gmail authentifié (un par thread, credentials et jeton partagés par le processus)"""
+    return get_gmail_service(token_manager())
+
+
+# ---------- OpenAI ---------- #
+def get_openai():
+    """Module openai importé et configuré au premier appel"""
+    global _openai
+    with _lock:
+        if _openai is None:
+            import openai
+            config = get_config()
+            if config["openai_api_key"]:
+                openai.api_key = config["openai_api_key"]
+            if config["openai_api_base"]:
+                openai.api_base = config["openai_api_base"]
+            _openai = openai
+        return _openai
+
+
+def complete(messages, max_tokens, model=None, stage="openai", log=False, **labels):
+    """Texte d'une complétion ; durée dans METRICS sous stage, jetons du champ usage comptés"""
+    model = model or get_config()["reply_model"]
+    openai = get_openai()
+    with METRICS.span(stage, log=log, **labels):
+        response = openai.ChatCompletion.create(model=model, messages=messages, max_tokens=max_tokens)
+    METRICS.record_completion(response, model)
+    return response["choices"][0]["message"]["content"].strip()
+
+
+def stream(messages, max_tokens, model=None, stage="openai", log=False, **labels):
+    """Générateur des morceaux d'une complétion stream=True ; close() ferme la connexion.
+
+    Le flux ne porte pas de champ usage : seule la requête est comptée.
+    """
+    model = model or get_config()["reply_model"]
+    openai = get_openai()
+    with METRICS.span(stage, log=log, **labels):
+        response = openai.ChatCompletion.create(model=model, messages=messages, max_tokens=max_tokens,
+                                                stream=True)
+        METRICS.record_completion(response, model)
+        try:
+            for chunk in response:
+                yield chunk["choices"][0]["delta"].get("content", "")
+        finally:
+            response.close()
+
+
+# ---------- Objets partagés ---------- #
+def filter_rules(**kwargs):
+    """FilterRules compilées depuis la configuration (expéditeurs, sujets, mots-clés)"""
+    config = get_config()
+    kwargs.setdefault("excluded_subject_phrases", config["excluded_subject_phrases"])
+    kwargs.setdefault("server_keywords", config["server_keywords"])
+    return FilterRules.from_config(config, **kwargs)
+
+
+def prompt_trimmer():
+    return PromptTrimmer(budget=get_config()["prompt_body_tokens"])
+
+
+def get_reply_cache():
+    """Un seul ReplyCache (et donc un seul reply_cache.json) par processus"""
+    return _shared_instance("reply_cache", lambda: ReplyCache(
+        near_duplicates=get_config()["reply_cache_near_duplicates"]))
+
+
+def get_reply_pool():
+    """Pool OpenAI dont le budget RPM/TPM est commun à tout le processus"""
+    config = get_config()
+    return _shared_instance("reply_pool", lambda: ReplyPool(
+        workers=config["openai_workers"],
+        limiter=RateLimiter(rpm=config["openai_rpm"], tpm=config["openai_tpm"])))
+
+
+def get_sheets_limiter():
+    """Budget de requêtes Google Sheets (SHEETS_RPM) commun à toutes les feuilles du processus"""
+    return _shared_instance("sheets_limiter", lambda: RateLimiter(rpm=get_config()["sheets_rpm"]))
+
+
+def sheet_writer(sheet_id, worksheet_name=None):
+    """Nouveau SheetWriter branché sur le budget Sheets partagé (une feuille par compte)"""
+    return SheetWriter(sheet_id, worksheet_name=worksheet_name, limiter=get_sheets_limiter())
+
+
+def get_sheet_writer():
+    """SheetWriter de la feuille de suivi ; gspread n'est importé qu'à la première écriture ou lecture"""
+    config = get_config()
+    return _shared_instance("sheet_writer", lambda: sheet_writer(config["sheet_id"],
+                                                                 config["worksheet_name"]))
@@ -0,0 +1,491 @@
+"""
+Faux backend Gmail local (même interface que googleapiclient) pour les benchmarks hors ligne
+"""
+import base64
+import copy
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+MAX_BATCH_SIZE = 100
+MAX_BATCH_MODIFY = 1000
+SYSTEM_LABELS = ["INBOX", "UNREAD", "SENT", "IMPORTANT", "STARRED", "SPAM", "TRASH"]
+
+
+class FakeHttpError(Exception):
+    """Imite googleapiclient.errors.HttpError (exc.resp.status)"""
+
+    class _Resp:
+        def __init__(self, status):
+            self.status = status
+
+    def __init__(self, status, reason=""):
+        super().__init__(f"HTTP {status} {reason}".strip())
+        self.resp = self._Resp(status)
+
+
+def _b64(text):
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+ATTACHMENT_DATA = _b64("%PDF-1.4 devis " * 200)
+
+
+def make_message(msg_id, sender, subject, body, thread_id=None, labels=("UNREAD", "INBOX"),
+                 internal_date=None, html=False, attachment=False):
+    """Construit une ressource Gmail format=full minimale (multipart/alternative).
+
+    html=True ajoute une partie text/html ; html="only" n'envoie que celle-ci
+    (Outlook). attachment=True enveloppe le tout dans un multipart/mixed avec un PDF.
+    """
+    headers = [{"name": "From", "value": sender}, {"name": "Subject", "value": subject},
+               {"name": "To", "value": "academie@academiexguard.ca"}]
+    parts = []
+    if html != "only":
+        parts.append({"partId": "0", "mimeType": "text/plain", "filename": "",
+                      "headers": [{"name": "Content-Type", "value": "text/plain; charset=UTF-8"}],
+                      "body": {"size": len(body.encode("utf-8")), "data": _b64(body)}})
+    if html:
+        markup = "<html><body><p>" + body.replace("\n", "<br>") + "</p></body></html>"
+        parts.append({"partId": str(len(parts)), "mimeType": "text/html", "filename": "",
+                      "headers": [{"name": "Content-Type", "value": "text/html; charset=UTF-8"}],
+                      "body": {"size": len(markup.encode("utf-8")), "data": _b64(markup)}})
+    payload = {"partId": "", "mimeType": "multipart/alternative", "filename": "",
+               "headers": headers, "body": {"size": 0}, "parts": parts}
+    if attachment:
+        for part in parts:
+            part["partId"] = "0." + part["partId"]
+        pdf = {"partId": "1", "mimeType": "application/pdf", "filename": "devis.pdf",
+               "headers": [{"name": "Content-Disposition", "value": 'attachment; filename="devis.pdf"'}],
+               "body": {"size": len(ATTACHMENT_DATA) * 3 // 4, "data": ATTACHMENT_DATA}}
+        payload = {"partId": "", "mimeType": "multipart/mixed", "filename": "", "headers": headers,
+                   "body": {"size": 0},
+                   "parts": [{"partId": "0", "mimeType": "multipart/alternative", "filename": "",
+                              "headers": [], "body": {"size": 0}, "parts": parts}, pdf]}
+    return {
+        "id": msg_id,
+        "threadId": thread_id or msg_id,
+        "labelIds": list(labels),
+        "snippet": body[:200],
+        "internalDate": str(internal_date or int(time.time() * 1000)),
+        "sizeEstimate": len(body) * 2 + 600 + (len(ATTACHMENT_DATA) if attachment else 0),
+        "payload": payload,
+    }
+
+
+# ---------- Boîte synthétique ---------- #
+PROSPECT_BODIES = [
+    "Bonjour, combien coûte la formation gardiennage ? Merci.",
+    "Je suis intéressé par la formation en sécurité, quel est le prix ?",
+    "Bonjour, quand commence la prochaine formation de gardiennage ?",
+]
+NOISE_BODIES = [
+    "Votre facture du mois est disponible dans votre espace client.",
+    "Rappel : réunion d'équipe demain à 9h.",
+    "Nouvelle connexion détectée sur votre compte.",
+]
+NOISE_SENDERS = ["noreply@banque.ca", "notification@linkedin.com", "academie@academiexguard.ca"]
+
+
+def generate_mailbox(n, keyword_rate=0.3, seed=42, body_repeat=20, html=False, html_only_rate=0.0,
+                     attachment_rate=0.0, unique_bodies=False):
+    """Retourne n messages synthétiques (les plus récents d'abord).
+
+    html_only_rate et attachment_rate : proportions de messages HTML seul et
+    avec pièce jointe, pour mélanger les structures MIME. unique_bodies ajoute
+    un numéro de demande à chaque corps : aucun n'est servi par le cache de réponses.
+    """
+    rng = random.Random(seed)
+    now = int(time.time() * 1000)
+    messages = []
+    for i in range(n):
+        if rng.random() < keyword_rate:
+            sender = f"Client {i} <client{i}@exemple.com>"
+            body = rng.choice(PROSPECT_BODIES)
+            subject = "Demande d'information"
+        else:
+            sender = rng.choice(NOISE_SENDERS)
+            body = rng.choice(NOISE_BODIES)
+            subject = "Notification"
+        if unique_bodies:
+            body = f"{body}\nNuméro de demande : {i}"
+        body = body + "\n\n" + ("Lorem ipsum dolor sit amet. " * body_repeat)
+        # Tirages seulement si demandés : les boîtes générées sans mélange MIME restent identiques
+        shape = "only" if html_only_rate and rng.random() < html_only_rate else html
+        attachment = bool(attachment_rate) and rng.random() < attachment_rate
+        messages.append(make_message(f"m{i:06d}", sender, subject, body, internal_date=now - i * 60000,
+                                     html=shape, attachment=attachment))
+    return messages
+
+
+def load_mailbox(path):
+    """Charge une boîte enregistrée (liste JSON de ressources format=full)"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------- Recherche q= ---------- #
+_QUERY_TOKENS = re.compile(r'-?\w+:"[^"]*"|-?\w+:\S+|\([^)]*\)|"[^"]*"|\S+')
+
+
+def _message_text(msg):
+    headers = {h["name"].lower(): h["value"] for h in msg["payload"].get("headers", [])}
+    body = ""
+    stack = [msg["payload"]]
+    while stack:
+        part = stack.pop()
+        stack.extend(reversed(part.get("parts", []) or []))
+        data = part.get("body", {}).get("data")
+        if data and part.get("mimeType", "text/plain") == "text/plain":
+            body += base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+    return headers, (headers.get("subject", "") + " " + body).lower()
+
+
+def matches_query(msg, q):
+    """Évalue le sous-ensemble de la syntaxe Gmail produit par gmail_query (mots entiers)"""
+    headers, text = _message_text(msg)
+    words = set(re.findall(r"\w+", text))
+
+    def term_matches(term):
+        term = term.strip('"').lower()
+        if " " in term:
+            return term in text
+        return term in words
+
+    for token in _QUERY_TOKENS.findall(q or ""):
+        negate = token.startswith("-")
+        token = token.lstrip("-")
+        if token == "is:unread":
+            ok = "UNREAD" in msg.get("labelIds", [])
+        elif token.startswith("from:"):
+            ok = token[5:].strip('"').lower() in headers.get("from", "").lower()
+        elif token.startswith("subject:"):
+            ok = token[8:].strip('"').lower() in headers.get("subject", "").lower()
+        elif token.startswith("("):
+            ok = any(term_matches(t) for t in re.findall(r'"[^"]*"|[^\s()]+', token) if t != "OR")
+        else:
+            ok = term_matches(token)
+        if ok == negate:
+            return False
+    return True
+
+
+# ---------- Service ---------- #
+class _Request:
+    def __init__(self, service, method, fn):
+        self.service = service
+        self.method = method
+        self.fn = fn
+
+    def execute(self):
+        self.service._http_call()
+        return self.service._invoke(self.method, self.fn)
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self.requests) >= MAX_BATCH_SIZE:
+            raise ValueError(f"Exceeded the maximum calls({MAX_BATCH_SIZE}) in a single batch request.")
+        self.requests.append((request, callback, request_id or str(len(self.requests) + 1)))
+
+    def execute(self):
+        self.service._http_call(batch=True)
+        for request, callback, request_id in self.requests:
+            try:
+                response, exception = self.service._invoke(request.method, request.fn), None
+            except FakeHttpError as e:
+                response, exception = None, e
+            (callback or self.callback)(request_id, response, exception)
+
+
+class _Resource:
+    def __init__(self, service, prefix, methods):
+        self.service = service
+        for name, fn in methods.items():
+            setattr(self, name, self._bind(f"{prefix}.{name}", fn))
+
+    def _bind(self, method, fn):
+        def call(**kwargs):
+            return _Request(self.service, method, lambda: fn(**kwargs))
+        return call
+
+
+class FakeGmailService:
+    """Sous-ensemble de l'API Gmail v1 en mémoire, avec latence et compteurs.
+
+    latency : délai simulé par aller-retour HTTP (un batch = un aller-retour).
+    error_rate : proportion de sous-requêtes qui échouent en 429.
+    outage : tant qu'il est vrai, tous les appels échouent en 503 (panne Gmail).
+    bandwidth : débit simulé en octets/s (None = transfert instantané).
+    inline_limit : comme Gmail, les corps plus gros (en caractères base64) sont
+    retirés du message et servis par messages().attachments().get.
+    """
+
+    def __init__(self, messages=(), latency=0.0, error_rate=0.0, seed=0, bandwidth=None,
+                 attachments=None, inline_limit=None):
+        self.messages = {}
+        self.order = []
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.attachments = dict(attachments or {})
+        self.inline_limit = inline_limit
+        self.error_rate = error_rate
+        self.outage = False
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.http_requests = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self.history_id = 1000
+        self.history = []           # [(history_id, message_id)]
+        self.oldest_history_id = self.history_id
+        self.watch_topic = None
+        self.on_history = None     # rappel(historyId) : branché par fake_pubsub
+        self.labels = {name: {"id": name, "name": name, "type": "system"} for name in SYSTEM_LABELS}
+        for m in reversed(list(messages)):
+            self.add_message(m)
+
+    # -- état --
+    def add_message(self, msg):
+        """Ajoute un message (le plus récent) et enregistre un événement messageAdded"""
+        with self.lock:
+            self.messages[msg["id"]] = copy.deepcopy(msg)
+            if self.inline_limit:
+                self._detach_bodies(self.messages[msg["id"]])
+            self.order.insert(0, msg["id"])
+            self.history_id += 1
+            self.history.append((self.history_id, msg["id"]))
+            self.messages[msg["id"]]["historyId"] = str(self.history_id)
+            history_id = self.history_id
+        if self.watch_topic and self.on_history:
+            self.on_history(history_id)
+
+    def _detach_bodies(self, msg):
+        stack = [msg["payload"]]
+        while stack:
+            part = stack.pop()
+            stack.extend(part.get("parts", []) or [])
+            body = part.get("body") or {}
+            if len(body.get("data", "")) > self.inline_limit:
+                attachment_id = f"att-{msg['id']}-{part.get('partId') or 0}"
+                self.attachments[attachment_id] = body["data"]
+                part["body"] = {"attachmentId": attachment_id, "size": body.get("size", 0)}
+
+    def expire_history(self):
+        """Simule la purge de l'historique Gmail : les anciens curseurs renvoient 404"""
+        with self.lock:
+            self.history.clear()
+            self.history_id += 1
+            self.oldest_history_id = self.history_id
+
+    def _http_call(self, batch=False):
+        with self.lock:
+            self.http_requests += 1
+            self.calls["batch" if batch else "http"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _invoke(self, method, fn):
+        with self.lock:
+            self.calls[method] += 1
+        if self.outage:
+            raise FakeHttpError(503, "backendError")
+        if self.error_rate and method == "messages.get" and self.rng.random() < self.error_rate:
+            raise FakeHttpError(429, "rateLimitExceeded")
+        result = fn()
+        size = len(json.dumps(result))
+        with self.lock:
+            self.bytes_sent += size
+        if self.bandwidth:
+            time.sleep(size / self.bandwidth)
+        return result
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.http_requests = 0
+        self.bytes_sent = 0
+
+    # -- interface googleapiclient --
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+    def users(self):
+        return _Users(self)
+
+    # -- implémentations --
+    def _matches(self, msg, q=None, label_ids=None):
+        labels = set(msg.get("labelIds", []))
+        if label_ids and not set(label_ids) <= labels:
+            return False
+        return matches_query(msg, q)
+
+    def _messages_list(self, userId, q=None, labelIds=None, maxResults=100, pageToken=None,
+                       includeSpamTrash=False):
+        ids = [i for i in self.order if self._matches(self.messages[i], q, labelIds)]
+        start = int(pageToken or 0)
+        page = ids[start:start + min(maxResults, 500)]
+        res = {"resultSizeEstimate": len(ids)}
+        if page:
+            res["messages"] = [{"id": i, "threadId": self.messages[i]["threadId"]} for i in page]
+        if start + len(page) < len(ids):
+            res["nextPageToken"] = str(start + len(page))
+        return res
+
+    def _messages_get(self, userId, id, format="full", metadataHeaders=None):
+        if id not in self.messages:
+            raise FakeHttpError(404, "Not Found")
+        msg = copy.deepcopy(self.messages[id])
+        if format == "minimal":
+            msg.pop("payload", None)
+        elif format == "metadata":
+            payload = msg["payload"]
+            headers = payload.get("headers", [])
+            if metadataHeaders:
+                wanted = {h.lower() for h in metadataHeaders}
+                headers = [h for h in headers if h["name"].lower() in wanted]
+            msg["payload"] = {"mimeType": payload.get("mimeType"), "headers": headers}
+        elif format == "raw":
+            msg.pop("payload", None)
+            msg["raw"] = _b64(json.dumps(self.messages[id]["payload"]))
+        return msg
+
+
+    def _threads_list(self, userId, q=None, labelIds=None, maxResults=100, pageToken=None,
+                      includeSpamTrash=False):
+        thread_ids = []
+        for i in self.order:
+            thread_id = self.messages[i]["threadId"]
+            if thread_id not in thread_ids and self._matches(self.messages[i], q, labelIds):
+                thread_ids.append(thread_id)
+        start = int(pageToken or 0)
+        page = thread_ids[start:start + min(maxResults, 500)]
+        res = {"resultSizeEstimate": len(thread_ids)}
+        if page:
+            res["threads"] = [{"id": t, "snippet": "", "historyId": str(self.history_id)} for t in page]
+        if start + len(page) < len(thread_ids):
+            res["nextPageToken"] = str(start + len(page))
+        return res
+
+    def _threads_get(self, userId, id, format="full", metadataHeaders=None):
+        # Gmail renvoie les messages du fil du plus ancien au plus récent
+        ids = [i for i in reversed(self.order) if self.messages[i]["threadId"] == id]
+        if not ids:
+            raise FakeHttpError(404, "Not Found")
+        return {"id": id, "historyId": str(self.history_id),
+                "messages": [self._messages_get(userId, i, format, metadataHeaders) for i in ids]}
+
+    def _labels_list(self, userId):
+        return {"labels": [dict(label) for label in self.labels.values()]}
+
+    def _labels_create(self, userId, body):
+        with self.lock:
+            if any(label["name"].lower() == body["name"].lower() for label in self.labels.values()):
+                raise FakeHttpError(409, "Label name exists or conflicts")
+            label_id = f"Label_{len(self.labels) - len(SYSTEM_LABELS) + 1}"
+            self.labels[label_id] = {"id": label_id, "name": body["name"], "type": "user"}
+        return dict(self.labels[label_id])
+
+    def _apply_labels(self, msg_id, add, remove):
+        if msg_id not in self.messages:
+            raise FakeHttpError(404, "Not Found")
+        unknown = [i for i in list(add) + list(remove) if i not in self.labels]
+        if unknown:
+            raise FakeHttpError(400, f"Invalid label: {unknown[0]}")
+        labels = [i for i in self.messages[msg_id]["labelIds"] if i not in remove]
+        self.messages[msg_id]["labelIds"] = labels + [i for i in add if i not in labels]
+
+    def _messages_modify(self, userId, id, body):
+        with self.lock:
+            self._apply_labels(id, body.get("addLabelIds", []), body.get("removeLabelIds", []))
+        return {"id": id, "threadId": self.messages[id]["threadId"],
+                "labelIds": list(self.messages[id]["labelIds"])}
+
+    def _messages_batch_modify(self, userId, body):
+        ids = body.get("ids", [])
+        if len(ids) > MAX_BATCH_MODIFY:
+            raise FakeHttpError(400, f"Too many ids: {len(ids)} > {MAX_BATCH_MODIFY}")
+        with self.lock:
+            for msg_id in ids:
+                if msg_id in self.messages:
+                    self._apply_labels(msg_id, body.get("addLabelIds", []), body.get("removeLabelIds", []))
+        return ""
+
+    def _attachments_get(self, userId, messageId, id):
+        if id not in self.attachments:
+            raise FakeHttpError(404, "Not Found")
+        data = self.attachments[id]
+        return {"attachmentId": id, "size": len(data) * 3 // 4, "data": data}
+
+    def _get_profile(self, userId):
+        return {"emailAddress": "academie@academiexguard.ca", "historyId": str(self.history_id),
+                "messagesTotal": len(self.messages)}
+
+    def _watch(self, userId, body):
+        self.watch_topic = body["topicName"]
+        return {"historyId": str(self.history_id),
+                "expiration": str(int((time.time() + 7 * 24 * 3600) * 1000))}
+
+    def _history_list(self, userId, startHistoryId, historyTypes=None, labelId=None,
+                      maxResults=100, pageToken=None):
+        start = int(startHistoryId)
+        if start < self.oldest_history_id:
+            raise FakeHttpError(404, "Requested entity was not found.")
+        records = []
+        for hid, msg_id in self.history:
+            if hid <= start or msg_id not in self.messages:
+                continue
+            msg = self.messages[msg_id]
+            if labelId and labelId not in msg.get("labelIds", []):
+                continue
+            records.append({"id": str(hid), "messages": [{"id": msg_id}],
+                            "messagesAdded": [{"message": {"id": msg_id, "threadId": msg["threadId"],
+                                                           "labelIds": msg.get("labelIds", [])}}]})
+        offset = int(pageToken or 0)
+        page = records[offset:offset + maxResults]
+        res = {"historyId": str(self.history_id)}
+        if page:
+            res["history"] = page
+        if offset + len(page) < len(records):
+            res["nextPageToken"] = str(offset + len(page))
+        return res
+
+
+class _Users:
+    def __init__(self, service):
+        self.service = service
+
+    def getProfile(self, **kwargs):
+        s = self.service
+        return _Request(s, "getProfile", lambda: s._get_profile(**kwargs))
+
+    def watch(self, **kwargs):
+        s = self.service
+        return _Request(s, "watch", lambda: s._watch(**kwargs))
+
+    def threads(self):
+        s = self.service
+        return _Resource(s, "threads", {"list": s._threads_list, "get": s._threads_get})
+
+    def history(self):
+        s = self.service
+        return _Resource(s, "history", {"list": s._history_list})
+
+    def labels(self):
+        s = self.service
+        return _Resource(s, "labels", {"list": s._labels_list, "create": s._labels_create})
+
+    def messages(self):
+        s = self.service
+        resource = _Resource(s, "messages", {"list": s._messages_list, "get": s._messages_get,
+                                             "modify": s._messages_modify,
+                                             "batchModify": s._messages_batch_modify})
+        resource.attachments = lambda: _Resource(s, "messages.attachments", {"get": s._attachments_get})
+        return resource
@@ -0,0 +1,182 @@
+"""
+Serveur OpenAI factice local (POST /v1/chat/completions, stream=True compris) avec latence et erreurs 429 injectées
+"""
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIServer:
+    """À utiliser avec openai.api_base = server.url (openai<1.0) ou chat_completion() ci-dessous.
+
+    latency : délai de chaque complétion, en secondes.
+    prompt_latency : délai supplémentaire par millier de jetons de prompt.
+    token_latency : délai par mot généré ; en stream=True, chaque mot part dans
+    son propre événement SSE, sinon la réponse entière attend le dernier mot.
+    error_rate : proportion de requêtes refusées en 429.
+    """
+
+    def __init__(self, latency=0.5, error_rate=0.0, seed=0, port=0, prompt_latency=0.0, token_latency=0.0):
+        self.latency = latency
+        self.prompt_latency = prompt_latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _event(self, payload):
+                self.wfile.write(b"data: " + (payload if isinstance(payload, bytes)
+                                              else json.dumps(payload).encode("utf-8")) + b"\n\n")
+                self.wfile.flush()
+
+            def _stream(self, model, words):
+                """Événements SSE au format chat.completion.chunk, puis data: [DONE]"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                def chunk(delta, finish_reason=None):
+                    return {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "model": model,
+                            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                try:
+                    self._event(chunk({"role": "assistant"}))
+                    for word in words:
+                        time.sleep(server.token_latency)
+                        self._event(chunk({"content": word}))
+                    self._event(chunk({}, "stop"))
+                    self._event(b"[DONE]")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Le client a fermé la connexion : génération annulée
+                    with server.lock:
+                        server.calls["cancelled"] += 1
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with server.lock:
+                    server.calls["requests"] += 1
+                    rejected = server.rng.random() < server.error_rate
+                if rejected:
+                    with server.lock:
+                        server.calls["429"] += 1
+                    return self._send(429, {"error": {"message": "Rate limit reached",
+                                                      "type": "requests", "code": "rate_limit_exceeded"}})
+                prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+                content = "Bonjour, merci pour votre message. " + prompt[:80]
+                prompt_tokens = len(prompt) // 4 + 1
+                time.sleep(server.latency + server.prompt_latency * prompt_tokens / 1000)
+                completion_tokens = len(content) // 4 + 1
+                with server.lock:
+                    server.calls["completions"] += 1
+                    server.calls["prompt_tokens"] += prompt_tokens
+                words = content.split(" ")
+                if request.get("stream"):
+                    with server.lock:
+                        server.calls["streams"] += 1
+                    return self._stream(request.get("model", ""),
+                                        [w if i == 0 else " " + w for i, w in enumerate(words)])
+                time.sleep(server.token_latency * len(words))
+                self._send(200, {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "model": request.get("model", ""),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubAPIError(Exception):
+    def __init__(self, http_status, message=""):
+        super().__init__(f"HTTP {http_status} {message}".strip())
+        self.http_status = http_status
+
+
+def chat_completion(base_url, prompt, model="gpt-4o", max_tokens=300, timeout=60):
+    """Client minimal (sans dépendance) vers le serveur factice ; retourne le JSON de réponse"""
+    body = json.dumps({"model": model, "max_tokens": max_tokens,
+                       "messages": [{"role": "user", "content": prompt}]}).encode("utf-8")
+    req = urllib.request.Request(f"{base_url}/chat/completions", data=body,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        raise StubAPIError(e.code, e.reason) from None
+
+
+def stream_completion(base_url, prompt, model="gpt-4o", max_tokens=300, timeout=60):
+    """Équivalent stream=True de chat_completion() : générateur des morceaux de texte.
+
+    Fermer le générateur (close(), ou abandon de la boucle) ferme la connexion ;
+    le serveur factice compte alors la génération comme annulée.
+    """
+    body = json.dumps({"model": model, "max_tokens": max_tokens, "stream": True,
+                       "messages": [{"role": "user", "content": prompt}]}).encode("utf-8")
+    req = urllib.request.Request(f"{base_url}/chat/completions", data=body,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        resp = urllib.request.urlopen(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        raise StubAPIError(e.code, e.reason) from None
+    try:
+        for line in resp:
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            delta = json.loads(data)["choices"][0]["delta"]
+            if delta.get("content"):
+                yield delta["content"]
+    finally:
+        resp.close()
@@ -0,0 +1,38 @@
+"""
+Faux éditeur Pub/Sub : envoie des notifications Gmail au format push vers un PushReceiver local
+"""
+import base64
+import json
+import threading
+import urllib.request
+
+
+class FakePubSubPublisher:
+    """Imite un abonnement push : POST {message: {data, messageId}, subscription} vers endpoint"""
+
+    def __init__(self, endpoint, email="academie@academiexguard.ca",
+                 subscription="projects/local/subscriptions/gmail-push"):
+        self.endpoint = endpoint
+        self.email = email
+        self.subscription = subscription
+        self.published = 0
+        self.lock = threading.Lock()
+
+    def publish(self, history_id):
+        with self.lock:
+            self.published += 1
+            message_id = str(self.published)
+        data = json.dumps({"emailAddress": self.email, "historyId": int(history_id)})
+        envelope = {
+            "message": {"data": base64.b64encode(data.encode("utf-8")).decode("ascii"),
+                        "messageId": message_id},
+            "subscription": self.subscription,
+        }
+        req = urllib.request.Request(self.endpoint, data=json.dumps(envelope).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status
+
+    def attach(self, gmail_service):
+        """Publie automatiquement à chaque message ajouté dans un FakeGmailService surveillé"""
+        gmail_service.on_history = self.publish
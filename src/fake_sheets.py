@@ -0,0 +1,43 @@
+"""
+Fausse feuille Google Sheets en mémoire (sous-ensemble de gspread.Worksheet) pour les benchmarks
+"""
+import threading
+import time
+from collections import Counter
+
+
+class FakeWorksheet:
+    """latency : délai simulé par appel API"""
+
+    def __init__(self, rows=(), latency=0.0, title="Feuille 1"):
+        self.title = title
+        self.rows = [list(r) for r in rows]
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def _call(self, method):
+        with self.lock:
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def append_row(self, values, value_input_option="RAW"):
+        self._call("append_row")
+        with self.lock:
+            self.rows.append(list(values))
+
+    def append_rows(self, values, value_input_option="RAW"):
+        self._call("append_rows")
+        with self.lock:
+            self.rows.extend(list(v) for v in values)
+
+    def col_values(self, col):
+        self._call("col_values")
+        with self.lock:
+            return [r[col - 1] if len(r) >= col else "" for r in self.rows]
+
+    def get_all_values(self):
+        self._call("get_all_values")
+        with self.lock:
+            return [list(r) for r in self.rows]
@@ -0,0 +1,234 @@
+"""
+Démon résident : exécute le pipeline gmail_chatgpt_auto_reply en boucle selon check_interval
+"""
+import argparse
+import os
+import signal
+import threading
+import time
+
+import gmail_chatgpt_auto_reply as pipeline
+from gmail_sync import CURSOR_PATH, HistorySync
+from message_store import MessageStore
+from metrics import METRICS
+from src.config import DEFAULT_CONFIG
+
+LOCK_PATH = "auto_reply.lock"
+
+
+class FileLock:
+    """Verrou inter-processus : empêche un cron et le démon de traiter la boîte en même temps"""
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = path
+        self.handle = None
+
+    def acquire(self):
+        self.handle = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.handle.close()
+            self.handle = None
+            return False
+        return True
+
+    def release(self):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+
+
+class AutoReplyDaemon:
+    """Boucle de planification avec clients chauds et intervalle adaptatif.
+
+    L'intervalle part de check_interval, se resserre (÷2, jusqu'à min_interval)
+    quand un cycle produit des suggestions, et s'allonge (×1.5, jusqu'à
+    max_interval) quand la boîte est calme. Un cycle en cours n'est jamais
+    interrompu : SIGINT/SIGTERM attendent sa fin avant l'arrêt.
+
+    Avec mailbox (mailboxes.Mailbox), la boucle traite cette boîte avec ses
+    propres clients, cache et curseur ; MultiMailboxDaemon en lance une par
+    boîte avec un stop_event commun.
+    """
+
+    def __init__(self, interval=None, min_interval=60, max_interval=None, incremental=True,
+                 threads=False, mailbox=None, stop_event=None):
+        self.base_interval = interval or DEFAULT_CONFIG["check_interval"]
+        self.min_interval = min(min_interval, self.base_interval)
+        self.max_interval = max_interval or self.base_interval * 4
+        self.interval = self.base_interval
+        self.incremental = incremental
+        self.threads = threads
+        self.stop_event = stop_event or threading.Event()
+        self.cycle_lock = threading.Lock()
+        self.cycles = 0
+        self.name = mailbox.name if mailbox else ""
+        self.prefix = f"[{self.name}] " if self.name else ""
+        self.labels = {"account": self.name} if self.name else {}
+        # Clients créés une seule fois pour toute la durée du démon
+        if mailbox:
+            self.service = mailbox.gmail_service()
+            self.store = MessageStore(mailbox.store_path)
+            self.account = mailbox.account()
+            cursor_path = mailbox.cursor_path
+        else:
+            self.service = pipeline.gmail_service()
+            self.store = MessageStore()
+            self.account = None
+            cursor_path = CURSOR_PATH
+        self.sync = HistorySync(self.service, cursor_path=cursor_path) if incremental else None
+
+    def next_interval(self, stats):
+        if stats is None:
+            # Erreur : on s'éloigne pour ne pas marteler une API en panne
+            return min(self.max_interval, self.interval * 2)
+        if stats["suggested"]:
+            return max(self.min_interval, self.interval / 2)
+        if stats["seen"]:
+            return self.base_interval
+        return min(self.max_interval, self.interval * 1.5)
+
+    def run_once(self, wait=False):
+        """Un cycle protégé contre le chevauchement ; retourne les stats ou None.
+
+        wait=True attend la fin du cycle en cours au lieu d'ignorer le tick.
+        """
+        if not self.cycle_lock.acquire(blocking=wait):
+            print(f"{self.prefix}⏭️ Cycle précédent encore en cours, tick ignoré")
+            return None
+        try:
+            start = time.monotonic()
+            stats = pipeline.run_cycle(self.service, self.store, self.sync, threads=self.threads,
+                                       account=self.account)
+            self.cycles += 1
+            METRICS.inc("cycles_total", result="ok", **self.labels)
+            print(f"{self.prefix}🔁 Cycle {self.cycles} : {stats['seen']} examinés, "
+                  f"{stats['suggested']} suggestions en {time.monotonic() - start:.1f}s")
+            return stats
+        except Exception as e:
+            print(f"{self.prefix}❌ Cycle en échec : {e}")
+            METRICS.inc("cycles_total", result="error", **self.labels)
+            METRICS.export("cycle_failed", script="gmail_auto_reply_daemon", error=type(e).__name__,
+                           **self.labels)
+            return None
+        finally:
+            self.cycle_lock.release()
+
+    def request_stop(self, signum=None, frame=None):
+        if not self.stop_event.is_set():
+            print("🛑 Arrêt demandé, fin du cycle en cours…")
+        self.stop_event.set()
+
+    def close(self):
+        (self.account.sheet_writer if self.account else pipeline.SHEET_WRITER).close()
+        pipeline.REPLY_CACHE.save()
+        self.store.close()
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            stats = self.run_once()
+            self.interval = self.next_interval(stats)
+            print(f"{self.prefix}⏲️ Prochain cycle dans {self.interval:.0f}s")
+            self.stop_event.wait(self.interval)
+
+    def run(self):
+        file_lock = FileLock()
+        if not file_lock.acquire():
+            print("⚠️ Une autre instance traite déjà la boîte, abandon.")
+            return
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        try:
+            self.loop()
+        finally:
+            self.close()
+            METRICS.close()
+            file_lock.release()
+            print("👋 Démon arrêté.")
+
+
+class MultiMailboxDaemon:
+    """Une boucle AutoReplyDaemon par boîte, chacune dans son thread.
+
+    Chaque boîte garde son intervalle adaptatif, son recul après erreur et ses
+    clients ; le pool OpenAI, le cache de réponses et le budget Sheets de core
+    sont partagés. Une boîte qui ne démarre pas est signalée sans arrêter les
+    autres.
+    """
+
+    def __init__(self, mailboxes, **options):
+        self.mailboxes = mailboxes
+        self.options = options
+        self.stop_event = threading.Event()
+
+    def request_stop(self, signum=None, frame=None):
+        if not self.stop_event.is_set():
+            print("🛑 Arrêt demandé, fin des cycles en cours…")
+        self.stop_event.set()
+
+    def _worker(self, mailbox):
+        # Clients construits dans le thread qui les utilise (service Gmail par thread)
+        try:
+            daemon = AutoReplyDaemon(mailbox=mailbox, stop_event=self.stop_event, **self.options)
+        except Exception as e:
+            print(f"❌ [{mailbox.name}] Démarrage impossible : {e}")
+            return
+        try:
+            daemon.loop()
+        finally:
+            daemon.close()
+
+    def run(self):
+        file_lock = FileLock()
+        if not file_lock.acquire():
+            print("⚠️ Une autre instance traite déjà les boîtes, abandon.")
+            return
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        workers = [threading.Thread(target=self._worker, args=(m,), name=f"mailbox-{m.name}")
+                   for m in self.mailboxes]
+        print(f"📬 {len(workers)} boîtes surveillées : {', '.join(m.name for m in self.mailboxes)}")
+        try:
+            for worker in workers:
+                worker.start()
+            # join() avec délai : le thread principal reste disponible pour les signaux
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=1)
+        finally:
+            self.stop_event.set()
+            METRICS.close()
+            file_lock.release()
+            print("👋 Démon arrêté.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--interval", type=float, default=DEFAULT_CONFIG["check_interval"],
+                        help="intervalle de base en secondes (défaut : check_interval)")
+    parser.add_argument("--min-interval", type=float, default=60)
+    parser.add_argument("--max-interval", type=float, default=None)
+    parser.add_argument("--full", action="store_true",
+                        help="relister is:unread à chaque cycle au lieu de l'historique Gmail")
+    parser.add_argument("--threads", action="store_true",
+                        help="une suggestion par conversation (dernier message non lu du fil)")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", "0")),
+                        help="expose les métriques Prometheus sur ce port (/metrics)")
+    parser.add_argument("--accounts", metavar="PATH",
+                        help="fichier JSON des boîtes à surveiller ensemble (voir mailboxes.py)")
+    args = parser.parse_args()
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+    options = dict(interval=args.interval, min_interval=args.min_interval,
+                   max_interval=args.max_interval, incremental=not args.full, threads=args.threads)
+    if args.accounts:
+        from mailboxes import load_mailboxes
+        MultiMailboxDaemon(load_mailboxes(args.accounts), **options).run()
+    else:
+        AutoReplyDaemon(**options).run()
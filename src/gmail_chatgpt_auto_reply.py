@@ -1,60 +1,53 @@
-import os
-import base64
+import argparse
 import datetime
-import requests
-import openai
-import gspread
+import time
 
-from dotenv import load_dotenv
 from email.utils import parseaddr
-from oauth2client.service_account import ServiceAccountCredentials
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 
-# ---------- 0. Config ---------- #
-load_dotenv()
-CLIENT_ID     = os.getenv("CLIENT_ID")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET")
-REFRESH_TOKEN = os.getenv("REFRESH_TOKEN")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-SHEET_ID = "19R0THrBOMCWafXHf_X9DQJNnvvmbhLGMwX5TU84abq8"
-USER_ID = "me"
+import core
+from gmail_fetch import iter_message_ids, iter_messages_by_id, iter_thread_ids
+from gmail_labels import LabelQueue
+from gmail_query import FilterReport
+from gmail_sync import HistorySync
+from gmail_threads import iter_conversations, thread_ids_for
+from message_store import MessageStore
+from metrics import METRICS
+from reply_pool import estimate_tokens
 
-KEYWORDS = ["formation", "gardiennage", "prix", "intéressé par la formation"]
-IGNORED_SENDERS = {"d.oliveira@academiexguard.ca", "academie@academiexguard.ca"}
+# ---------- 0. Config ---------- #
+# src/config.py + .env, chargés une fois par core ; les clients sont créés au premier usage
+CONFIG = core.get_config()
+USER_ID = CONFIG["user_id"]
+BATCH_SIZE = CONFIG["gmail_batch_size"]
+ELITE_SENDER = CONFIG["elite_sender"]
+# Règles poussées dans la requête Gmail (expéditeurs ignorés, sujets exclus) ; les mots-clés
+# de config.py restent vérifiés localement sauf SERVER_KEYWORDS=1
+RULES = core.filter_rules()
+# FILTER_REPORT=1 : estimation des téléchargements évités (deux messages.list de plus par cycle)
+FILTER_REPORT = CONFIG["filter_report"]
 
-openai.api_key = OPENAI_API_KEY
+REPLY_CACHE = core.get_reply_cache()
+REPLY_POOL = core.get_reply_pool()
+# Citations, signatures et avis légaux retirés avant l'envoi à OpenAI
+PROMPT_TRIMMER = core.prompt_trimmer()
+# Labels appliqués en fin de cycle par batchModify ; PROCESSED_LABEL=Traité et/ou
+# MARK_PROCESSED_READ=1 marquent les messages dont la suggestion a été consignée
+LABEL_QUEUE = LabelQueue(user_id=USER_ID)
+PROCESSED_LABEL = CONFIG["processed_label"]
+MARK_PROCESSED_READ = CONFIG["mark_processed_read"]
 
 # ---------- 1. Gmail Auth ---------- #
+# Le jeton d'accès est mis en cache (mémoire + disque) et rafraîchi avant expiration
 def refresh_access_token():
-    r = requests.post("https://oauth2.googleapis.com/token", data={
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "refresh_token": REFRESH_TOKEN,
-        "grant_type": "refresh_token",
-    }, timeout=30)
-    r.raise_for_status()
-    return r.json()["access_token"]
+    return core.token_manager().get_token()
 
 def gmail_service():
-    creds = Credentials(token=refresh_access_token(),
-                        refresh_token=REFRESH_TOKEN,
-                        token_uri="https://oauth2.googleapis.com/token",
-                        client_id=CLIENT_ID,
-                        client_secret=CLIENT_SECRET)
-    return build("gmail", "v1", credentials=creds)
+    return core.gmail_service()
 
 # ---------- 2. Helpers ---------- #
-def extract_text(payload):
-    parts = payload.get("parts", [])
-    for part in parts:
-        if part.get("mimeType") == "text/plain":
-            data = part["body"].get("data", "")
-            return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
-    return ""
-
-def generate_reply(body):
-    prompt = f"""Tu es le service à la clientèle pour une école de formation en sécurité privée au Québec.
+REPLY_MODEL = CONFIG["reply_model"]
+REPLY_MAX_TOKENS = 500
+PROMPT_TEMPLATE = """Tu es le service à la clientèle pour une école de formation en sécurité privée au Québec.
 
 Voici le message d’un client :
 ---
@@ -62,77 +55,177 @@ Voici le message d’un client :
 ---
 
 Écris une réponse professionnelle, claire et rassurante, en français. Si la personne est intéressée à acheter, aide-la à comprendre quoi faire ensuite (ex. s'inscrire, payer, etc.)."""
-    response = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=500,
-    )
-    return response.choices[0].message.content.strip()
-
-def move_to_label(service, msg_id, label_name="Élite"):
-    # Crée le label s’il n’existe pas encore
-    labels = service.users().labels().list(userId=USER_ID).execute().get("labels", [])
-    label_id = next((l["id"] for l in labels if l["name"].lower() == label_name.lower()), None)
-    if not label_id:
-        label = service.users().labels().create(userId=USER_ID, body={"name": label_name}).execute()
-        label_id = label["id"]
-    # Applique le label
-    service.users().messages().modify(
-        userId=USER_ID,
-        id=msg_id,
-        body={"addLabelIds": [label_id]}
-    ).execute()
+
+def cached_reply(body, thread=None):
+    # thread=(threadId, dernier message) : même suggestion tant que le fil n'a pas bougé
+    return REPLY_CACHE.get(body, PROMPT_TEMPLATE, REPLY_MODEL, REPLY_MAX_TOKENS, thread=thread)
+
+def generate_reply(body, thread=None):
+    # Appelé par REPLY_POOL pour les seuls absents du cache (cached_reply) : budget OpenAI réservé
+    reply = core.complete([{"role": "user", "content": PROMPT_TEMPLATE.format(body=body)}],
+                          REPLY_MAX_TOKENS, model=REPLY_MODEL)
+    REPLY_CACHE.put(body, PROMPT_TEMPLATE, REPLY_MODEL, REPLY_MAX_TOKENS, reply, thread=thread)
+    return reply
+
+def move_to_label(service, msg_id, label_name="Élite", queue=None):
+    # Mis en attente : LABEL_QUEUE.flush() applique tous les labels du cycle en un batchModify,
+    # le label étant résolu (ou créé s'il n'existe pas encore) une seule fois par processus
+    (queue or LABEL_QUEUE).add(msg_id, add=[label_name])
+
+def label_elite_messages(service, account=None):
+    """ELITE_SENDER est exclu par la requête : ses messages sont étiquetés sans être téléchargés"""
+    account = account or default_account()
+    if not account.elite_sender:
+        return
+    for msg_id in iter_message_ids(service, q=f"is:unread from:{account.elite_sender}"):
+        move_to_label(service, msg_id, label_name="Élite", queue=account.label_queue)
 
 # ---------- 3. GSheet Auth ---------- #
+# Un seul client autorisé par processus ; les lignes partent par lots (append_rows)
+SHEET_WRITER = core.get_sheet_writer()
+
 def gsheet_append_row(row):
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-    client = gspread.authorize(creds)
-    sheet = client.open_by_key(SHEET_ID)
-    worksheet = sheet.worksheet("Feuille 1")
-    worksheet.append_row(row)
-
-# ---------- 4. Main ---------- #
-def main():
-    service = gmail_service()
-    results = service.users().messages().list(userId=USER_ID, q="is:unread", maxResults=5).execute()
-    messages = results.get("messages", [])
+    SHEET_WRITER.append(row)
 
-    if not messages:
-        print("📭 Aucun message non lu trouvé.")
-        return
+# ---------- 4. Comptes ---------- #
+class Account:
+    """État propre à une boîte Gmail : feuille, labels en attente, règles et politique de labels.
 
-    for msg_meta in messages:
-        msg_id = msg_meta["id"]
-        msg = service.users().messages().get(userId=USER_ID, id=msg_id, format="full").execute()
-        payload = msg["payload"]
-        headers = payload.get("headers", [])
+    Le cache de réponses et le pool OpenAI restent communs au processus ; en mode
+    multi-comptes (mailboxes.py), chaque boîte a son Account et ses messages
+    sont préfixés par son nom.
+    """
 
-        sender = next((h["value"] for h in headers if h["name"] == "From"), "")
-        subject = next((h["value"] for h in headers if h["name"] == "Subject"), "(aucun sujet)")
-        sender_name, sender_email = parseaddr(sender)
+    def __init__(self, sheet_writer, label_queue, rules, name="", elite_sender=None,
+                 processed_label="", mark_processed_read=False, prompt_trimmer=None):
+        self.name = name
+        self.sheet_writer = sheet_writer
+        self.label_queue = label_queue
+        self.rules = rules
+        self.elite_sender = elite_sender
+        self.processed_label = processed_label
+        self.mark_processed_read = mark_processed_read
+        self.prompt_trimmer = prompt_trimmer or core.prompt_trimmer()
+        self.prefix = f"[{name}] " if name else ""
 
-        if sender_email.lower() in IGNORED_SENDERS:
-            print(f"⏭️ Ignoré : expéditeur exclu ({sender_email})")
-            if sender_email.lower() == "d.oliveira@academiexguard.ca":
-                move_to_label(service, msg_id, label_name="Élite")
-            continue
+def default_account():
+    """Le compte du .env, construit à partir des globales du module (remplaçables par les benchs)"""
+    return Account(SHEET_WRITER, LABEL_QUEUE, RULES, elite_sender=ELITE_SENDER,
+                   processed_label=PROCESSED_LABEL, mark_processed_read=MARK_PROCESSED_READ,
+                   prompt_trimmer=PROMPT_TRIMMER)
 
-        if subject.lower().startswith("confirmation d'inscription"):
-            print(f"⏭️ Ignoré : sujet exclu pour {sender_email}")
-            continue
+# ---------- 5. Main ---------- #
+def run_cycle(service, store=None, sync=None, threads=False, account=None):
+    """Traite un cycle complet ; retourne {"seen": examinés, "suggested": suggestions ajoutées}.
 
-        body = extract_text(payload)
-        if not any(kw in body.lower() for kw in KEYWORDS):
-            print(f"⏭️ Ignoré : aucun mot-clé dans le message de {sender_email}")
+    Avec un HistorySync, seuls les messages ajoutés depuis le dernier curseur sont récupérés.
+    Avec threads=True, une seule suggestion par fil, à partir du dernier message non lu.
+    account (par défaut le compte du .env) fournit la feuille, les labels et les règles de la boîte.
+    Les durées par étape et les compteurs d'appels sont exportés par METRICS en fin de cycle.
+    """
+    account = account or default_account()
+    rules, sheet, queue = account.rules, account.sheet_writer, account.label_queue
+    labels = {"account": account.name} if account.name else {}
+
+    def say(text):
+        # Une seule écriture par ligne : les cycles de plusieurs boîtes ne s'entremêlent pas
+        print(f"{account.prefix}{text}\n", end="")
+
+    start = time.perf_counter()
+    report = None
+    if sync:
+        ids = sync.poll()
+    else:
+        # Les exclusions sont appliquées par Gmail : rien à télécharger pour elles
+        label_elite_messages(service, account)
+        if FILTER_REPORT:
+            report = FilterReport()
+            report.estimate(service, rules)
+        ids = None if threads else iter_message_ids(service, q=rules.query())
+    # Les messages déjà consignés dans la feuille ne sont ni téléchargés ni renvoyés à GPT
+    if ids is not None:
+        ids = (msg_id for msg_id in ids if not sheet.is_known(msg_id))
+
+    def triage(msg):
+        # Vérifications locales sur les métadonnées : historique Gmail (non filtré)
+        # et règles inexprimables en q= ; le corps n'est téléchargé que si elles passent
+        if rules.triage(msg):
+            return True
+        _, sender_email = parseaddr(msg["from"])
+        say(f"⏭️ Ignoré sur en-têtes : {sender_email} — {msg['subject'] or '(aucun sujet)'}")
+        if account.elite_sender and sender_email.lower() == account.elite_sender:
+            move_to_label(service, msg["id"], label_name="Élite", queue=queue)
+        return False
+
+    fetch_stats = {"metadata": 0, "full": 0, "rejected": 0, "failed": []}
+    if threads:
+        if ids is not None:
+            thread_ids = thread_ids_for(service, ids, failed=fetch_stats["failed"])
+        else:
+            thread_ids = iter_thread_ids(service, q=rules.query())
+        # Dernier message du fil déjà consigné : rien de nouveau depuis la dernière suggestion,
+        # le fil est écarté sur ses métadonnées sans télécharger ce message
+        conversations = iter_conversations(service, thread_ids, batch_size=BATCH_SIZE, store=store,
+                                           triage=triage, known=sheet.is_known, stats=fetch_stats)
+        items = ((c.latest, c) for c in conversations)
+    else:
+        items = ((msg, None) for msg in iter_messages_by_id(service, ids, batch_size=BATCH_SIZE,
+                                                            store=store, triage=triage,
+                                                            stats=fetch_stats))
+
+    seen = 0
+    candidates = []
+    for msg, conversation in items:
+        seen += 1
+        msg_id = msg["id"]
+        subject = msg["subject"] or "(aucun sujet)"
+        sender_name, sender_email = parseaddr(msg["from"])
+
+        body = msg["body"]
+        detected = rules.matching_keywords(body)
+        if not detected:
+            say(f"⏭️ Ignoré : aucun mot-clé dans le message de {sender_email}")
             continue
 
-        reply = generate_reply(body)
-        detected = [kw for kw in KEYWORDS if kw in body.lower()]
+        candidates.append((msg_id, sender_name, sender_email, subject, body, detected, conversation))
+
+    # Génération en parallèle ; les résultats restent dans l'ordre des messages
+    if report:
+        report.fetched = seen
+        report.rejected_locally = fetch_stats["rejected"] + seen - len(candidates)
+        say(report.summary())
+    if fetch_stats["rejected"]:
+        say(f"📨 Tri sur en-têtes : {fetch_stats['rejected']}/{fetch_stats['metadata']} "
+            f"messages écartés sans télécharger leur corps")
+
+    prompts = []
+    for msg_id, _, _, _, body, _, conversation in candidates:
+        body = account.prompt_trimmer.trim(body)
+        if conversation:
+            prompts.append((conversation.prompt_body(body), (conversation.id, msg_id)))
+        else:
+            prompts.append((body, None))
+    if prompts:
+        say(account.prompt_trimmer.summary())
+        account.prompt_trimmer.reset()
+    with METRICS.span("generate", **labels):
+        replies = REPLY_POOL.map(lambda prompt: generate_reply(*prompt), prompts,
+                                 cost=lambda prompt: estimate_tokens(PROMPT_TEMPLATE)
+                                 + estimate_tokens(prompt[0]) + REPLY_MAX_TOKENS,
+                                 cached=lambda prompt: cached_reply(*prompt))
+
+    suggested = failed = 0
+    for candidate, reply in zip(candidates, replies):
+        msg_id, sender_name, sender_email, subject, body, detected, conversation = candidate
+        if isinstance(reply, Exception):
+            say(f"❌ Échec de génération pour {sender_email} : {reply}")
+            METRICS.inc("messages_total", outcome="failed", **labels)
+            failed += 1
+            continue
         category = detected[0] if detected else ""
         now = datetime.datetime.now().strftime("%Y-%m-%d")
 
-        gsheet_append_row([
+        sheet.append([
             now,
             msg_id,
             sender_name,
@@ -143,9 +236,65 @@ def main():
             category,
             reply,
             "À valider",
-            "", "", "Oui"
+            "", "", "Oui",
+            conversation.id if conversation else "",
         ])
-        print(f"✅ Suggestion ajoutée pour {sender_email}")
+        if conversation and len(conversation.unread_ids) > 1:
+            say(f"✅ Suggestion ajoutée pour {sender_email} "
+                f"(fil de {conversation.depth} messages, {len(conversation.unread_ids)} non lus)")
+        else:
+            say(f"✅ Suggestion ajoutée pour {sender_email}")
+        suggested += 1
+        if account.processed_label or account.mark_processed_read:
+            for processed_id in (conversation.unread_ids if conversation else [msg_id]):
+                queue.mark_processed(processed_id, account.processed_label,
+                                     read=account.mark_processed_read)
+
+    sheet.flush()
+    # Après la feuille : un message n'est marqué traité que si sa suggestion y est consignée
+    queued = len(queue)
+    if queued:
+        calls = queue.calls
+        queue.flush(service)
+        say(f"🏷️ Labels appliqués à {queued} messages en {queue.calls - calls} appel(s) batchModify")
+    REPLY_CACHE.save()
+    if sync:
+        # Échec de téléchargement ou de génération : le même delta sera relu au prochain cycle
+        sync.commit(failed=failed + len(fetch_stats["failed"]))
+    if not seen and not fetch_stats["rejected"]:
+        say("📭 Aucun message non lu trouvé.")
+    elapsed = time.perf_counter() - start
+    METRICS.observe("stage_seconds", elapsed, stage="cycle", **labels)
+    METRICS.inc("messages_total", seen, outcome="seen", **labels)
+    METRICS.inc("messages_total", suggested, outcome="suggested", **labels)
+    METRICS.set("last_cycle_timestamp_seconds", round(time.time()), **labels)
+    METRICS.set("last_cycle_duration_seconds", round(elapsed, 3), **labels)
+    METRICS.export("cycle", script="gmail_chatgpt_auto_reply", seen=seen, suggested=suggested,
+                   seconds=round(elapsed, 3), **labels)
+    return {"seen": seen, "suggested": suggested}
+
+def main(incremental=False, threads=False, accounts=None, workers=None):
+    if accounts:
+        # Plusieurs boîtes traitées en parallèle, budgets OpenAI et Sheets partagés
+        from mailboxes import load_mailboxes, run_mailboxes
+        results = run_mailboxes(load_mailboxes(accounts), workers=workers, incremental=incremental,
+                                threads=threads)
+        return not any(isinstance(r, Exception) for r in results.values())
+    service = gmail_service()
+    run_cycle(service, MessageStore(), HistorySync(service) if incremental else None, threads=threads)
+    return True
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true",
+                        help="synchronisation incrémentale via l'historique Gmail")
+    parser.add_argument("--threads", action="store_true",
+                        help="une suggestion par conversation (dernier message non lu du fil)")
+    parser.add_argument("--accounts", metavar="PATH",
+                        help="fichier JSON des boîtes à traiter en parallèle (voir mailboxes.py)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="boîtes traitées simultanément (défaut : toutes)")
+    args = parser.parse_args()
+    if not main(incremental=args.incremental, threads=args.threads, accounts=args.accounts,
+                workers=args.workers):
+        raise SystemExit(1)
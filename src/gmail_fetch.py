@@ -0,0 +1,230 @@
+"""
+Récupération Gmail par lots (batch HTTP) partagée par les scripts et les interfaces
+"""
+import time
+
+from metrics import METRICS
+from mime_text import extract_text
+
+USER_ID = "me"
+MAX_BATCH_SIZE = 100      # limite Gmail : 100 sous-requêtes par appel batch
+DEFAULT_BATCH_SIZE = 50   # Google recommande <= 50 pour éviter les 429
+MAX_PAGE_SIZE = 500       # limite Gmail pour messages().list
+TRIAGE_HEADERS = ["From", "Subject"]
+
+
+# ---------- 1. Parsing ---------- #
+def attachment_fetcher(service, msg_id, user_id=USER_ID):
+    """Rappel pour extract_text : corps volumineux stocké en attachmentId, téléchargé s'il est lu"""
+    def fetch(attachment_id):
+        METRICS.inc("gmail_api_calls_total", method="messages.attachments.get")
+        return service.users().messages().attachments().get(
+            userId=user_id, messageId=msg_id, id=attachment_id).execute().get("data", "")
+    return fetch
+
+
+def parse_message(msg, fetch_attachment=None):
+    """Transforme une ressource Gmail en dictionnaire plat utilisé par les scripts"""
+    payload = msg.get("payload", {})
+    headers = {h["name"]: h["value"] for h in payload.get("headers", [])}
+    body = ""
+    if payload:
+        with METRICS.span("decode"):
+            body = extract_text(payload, fetch_attachment)
+    return {
+        "id": msg["id"],
+        "threadId": msg.get("threadId", ""),
+        "from": headers.get("From", ""),
+        "subject": headers.get("Subject", ""),
+        "headers": headers,
+        "snippet": msg.get("snippet", ""),
+        "body": body,
+        "labelIds": msg.get("labelIds", []),
+        "internalDate": int(msg.get("internalDate", 0) or 0),
+    }
+
+
+# ---------- 2. Listing ---------- #
+def list_page(service, q=None, label_ids=None, page_token=None, page_size=MAX_PAGE_SIZE,
+              user_id=USER_ID, resource="messages"):
+    """Une page de messages().list (ou threads().list) : (IDs, nextPageToken ou None)"""
+    kwargs = {"userId": user_id, "maxResults": min(page_size, MAX_PAGE_SIZE)}
+    if q:
+        kwargs["q"] = q
+    if label_ids:
+        kwargs["labelIds"] = label_ids
+    if page_token:
+        kwargs["pageToken"] = page_token
+    with METRICS.span("gmail_list"):
+        res = getattr(service.users(), resource)().list(**kwargs).execute()
+    METRICS.inc("gmail_api_calls_total", method=f"{resource}.list")
+    return [m["id"] for m in res.get(resource, [])], res.get("nextPageToken")
+
+
+def iter_message_ids(service, q=None, label_ids=None, limit=None, page_size=MAX_PAGE_SIZE,
+                     user_id=USER_ID, resource="messages"):
+    """Parcourt messages().list (ou threads().list) en suivant nextPageToken et produit les IDs"""
+    page_token = None
+    count = 0
+    while True:
+        size = min(page_size, MAX_PAGE_SIZE)
+        if limit is not None:
+            size = min(size, limit - count)
+        ids, page_token = list_page(service, q=q, label_ids=label_ids, page_token=page_token,
+                                    page_size=size, user_id=user_id, resource=resource)
+        for msg_id in ids:
+            yield msg_id
+            count += 1
+            if limit is not None and count >= limit:
+                return
+        if not page_token:
+            return
+
+
+# ---------- 3. Batch get ---------- #
+def http_status(exc):
+    """Code HTTP d'une erreur googleapiclient (HttpError.resp.status) ou None"""
+    resp = getattr(exc, "resp", None)
+    status = getattr(resp, "status", None) or getattr(exc, "status_code", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc):
+    status = http_status(exc)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def iter_thread_ids(service, q=None, label_ids=None, limit=None, page_size=MAX_PAGE_SIZE,
+                    user_id=USER_ID):
+    """IDs des fils dont au moins un message correspond à q"""
+    return iter_message_ids(service, q=q, label_ids=label_ids, limit=limit, page_size=page_size,
+                            user_id=user_id, resource="threads")
+
+
+def fetch_batch(service, ids, fmt="full", metadata_headers=None, user_id=USER_ID,
+                retries=3, backoff=1.0, resource="messages", failed=None):
+    """Récupère jusqu'à MAX_BATCH_SIZE messages (ou fils) en un seul appel HTTP.
+
+    Retourne les ressources brutes dans l'ordre des IDs ; les sous-requêtes
+    en échec (429, 5xx) sont rejouées dans un nouveau batch. Les IDs encore
+    en échec après les reprises sont ajoutés à la liste failed, sauf les 404
+    (message supprimé entre-temps : rien à reprendre).
+    """
+    if len(ids) > MAX_BATCH_SIZE:
+        raise ValueError(f"batch de {len(ids)} > {MAX_BATCH_SIZE} sous-requêtes")
+    results = {}
+    pending = list(ids)
+    for attempt in range(retries + 1):
+        errors = []
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                errors.append((request_id, exception))
+            else:
+                results[request_id] = response
+
+        batch = service.new_batch_http_request(callback=callback)
+        for msg_id in pending:
+            kwargs = {"userId": user_id, "id": msg_id, "format": fmt}
+            if metadata_headers:
+                kwargs["metadataHeaders"] = metadata_headers
+            batch.add(getattr(service.users(), resource)().get(**kwargs), request_id=msg_id)
+        with METRICS.span("gmail_fetch", format=fmt):
+            batch.execute()
+        METRICS.inc("gmail_api_calls_total", method="batch")
+        METRICS.inc("gmail_batch_items_total", len(pending), method=f"{resource}.get")
+
+        pending = []
+        for msg_id, exc in errors:
+            if is_retryable(exc) and attempt < retries:
+                pending.append(msg_id)
+            else:
+                print(f"⚠️ Échec de récupération pour {msg_id} : {exc}")
+                if failed is not None and http_status(exc) != 404:
+                    failed.append(msg_id)
+        if not pending:
+            break
+        METRICS.inc("gmail_retries_total", len(pending))
+        time.sleep(backoff * (2 ** attempt))
+    return [results[msg_id] for msg_id in ids if msg_id in results]
+
+
+def iter_messages(service, q="is:unread", label_ids=None, limit=None,
+                  batch_size=DEFAULT_BATCH_SIZE, fmt="full", user_id=USER_ID,
+                  store=None, refresh_labels=False, triage=None, stats=None):
+    """Générateur de messages parsés, récupérés par lots de batch_size"""
+    ids = iter_message_ids(service, q=q, label_ids=label_ids, limit=limit, user_id=user_id)
+    yield from iter_messages_by_id(service, ids, batch_size=batch_size, fmt=fmt, user_id=user_id,
+                                   store=store, refresh_labels=refresh_labels, triage=triage,
+                                   stats=stats)
+
+
+def _triage_chunk(service, missing, user_id, triage, stats):
+    """Phase 1 : From/Subject + snippet seulement ; retourne les IDs retenus"""
+    kept = []
+    for raw in fetch_batch(service, missing, fmt="metadata", metadata_headers=TRIAGE_HEADERS,
+                           user_id=user_id, failed=stats.setdefault("failed", [])):
+        stats["metadata"] += 1
+        if triage(parse_message(raw)):
+            kept.append(raw["id"])
+        else:
+            stats["rejected"] += 1
+    return kept
+
+
+def _fetch_chunk(service, chunk, fmt, user_id, store, refresh_labels, triage=None, stats=None):
+    stats = stats if stats is not None else {"metadata": 0, "full": 0, "rejected": 0, "failed": []}
+    cached = store.get_many(chunk) if store is not None else {}
+    if triage:
+        for msg_id in [i for i in cached if not triage(cached[i])]:
+            stats["rejected"] += 1
+            del cached[msg_id]
+    missing = [msg_id for msg_id in chunk if msg_id not in cached]
+    if triage and missing:
+        missing_set = set(_triage_chunk(service, missing, user_id, triage, stats))
+        missing = [msg_id for msg_id in missing if msg_id in missing_set]
+        chunk = [msg_id for msg_id in chunk if msg_id in cached or msg_id in missing_set]
+    fetched = {}
+    if missing:
+        stats["full"] += len(missing)
+        for raw in fetch_batch(service, missing, fmt=fmt, user_id=user_id,
+                               failed=stats.setdefault("failed", [])):
+            fetched[raw["id"]] = parse_message(raw, attachment_fetcher(service, raw["id"], user_id))
+        # Seuls les messages complets sont mis en cache
+        if store is not None and fmt == "full":
+            store.put_many(fetched.values())
+    if refresh_labels and cached:
+        # Rafraîchissement léger : format=minimal ne contient que les labels
+        labels = {raw["id"]: raw.get("labelIds", [])
+                  for raw in fetch_batch(service, list(cached), fmt="minimal", user_id=user_id)}
+        store.update_labels(labels)
+        for msg_id, label_ids in labels.items():
+            cached[msg_id]["labelIds"] = label_ids
+    for msg_id in chunk:
+        msg = cached.get(msg_id) or fetched.get(msg_id)
+        if msg is not None:
+            yield msg
+
+
+def iter_messages_by_id(service, ids, batch_size=DEFAULT_BATCH_SIZE, fmt="full", user_id=USER_ID,
+                        store=None, refresh_labels=False, triage=None, stats=None):
+    """Comme iter_messages, mais à partir d'une liste (ou d'un itérateur) d'IDs.
+
+    Avec un MessageStore, seuls les IDs jamais vus sont demandés à Gmail.
+    Avec triage(msg) -> bool, récupération en deux phases : un batch
+    format=metadata (From, Subject, snippet) d'abord, puis format=full
+    uniquement pour les messages retenus. stats compte les deux phases ;
+    stats["failed"] liste les IDs que Gmail n'a pas rendus malgré les reprises.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    chunk = []
+    for msg_id in ids:
+        chunk.append(msg_id)
+        if len(chunk) >= batch_size:
+            yield from _fetch_chunk(service, chunk, fmt, user_id, store, refresh_labels, triage, stats)
+            chunk = []
+    if chunk:
+        yield from _fetch_chunk(service, chunk, fmt, user_id, store, refresh_labels, triage, stats)
@@ -0,0 +1,142 @@
+"""
+Labels Gmail : correspondance nom → ID chargée une fois par processus, modifications groupées par batchModify
+"""
+import threading
+from collections import OrderedDict
+
+from gmail_fetch import USER_ID
+from metrics import METRICS
+
+MAX_BATCH_MODIFY = 1000   # limite Gmail : IDs par appel messages().batchModify
+UNREAD = "UNREAD"
+
+
+class LabelRegistry:
+    """Nom de label (casse ignorée) → ID, partagé par tout le processus.
+
+    labels().list n'est appelé qu'au premier besoin, puis seulement quand un
+    nom est inconnu (label créé entre-temps dans Gmail) ; un label toujours
+    absent est créé une fois. Les labels système (UNREAD, INBOX…) ont un ID
+    égal à leur nom et passent donc par le même chemin.
+    """
+
+    def __init__(self, user_id=USER_ID):
+        self.user_id = user_id
+        self.ids = None
+        self.lock = threading.Lock()
+        self.calls = {"list": 0, "create": 0}
+
+    def _load(self, service):
+        labels = service.users().labels().list(userId=self.user_id).execute().get("labels", [])
+        self.calls["list"] += 1
+        METRICS.inc("gmail_api_calls_total", method="labels.list")
+        self.ids = {label["name"].lower(): label["id"] for label in labels}
+
+    def label_id(self, service, name, create=True):
+        key = name.lower()
+        with self.lock:
+            if self.ids is None:
+                self._load(service)
+            if key not in self.ids:
+                self._load(service)
+            if key not in self.ids:
+                if not create:
+                    return None
+                label = service.users().labels().create(userId=self.user_id, body={"name": name}).execute()
+                self.calls["create"] += 1
+                METRICS.inc("gmail_api_calls_total", method="labels.create")
+                self.ids[key] = label["id"]
+            return self.ids[key]
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_label_registry(user_id=USER_ID):
+    """LabelRegistry unique par compte pour tout le processus"""
+    with _registries_lock:
+        if user_id not in _registries:
+            _registries[user_id] = LabelRegistry(user_id)
+        return _registries[user_id]
+
+
+class LabelQueue:
+    """Modifications de labels en attente, appliquées en fin de cycle par messages().batchModify.
+
+    add(msg_id, add=[noms], remove=[noms]) ne fait aucun appel ; flush(service)
+    regroupe les messages qui reçoivent exactement les mêmes changements et
+    envoie un batchModify par groupe (par tranches de MAX_BATCH_MODIFY IDs).
+    Marquer « Traité » ou lu passe par le même chemin : un appel par cycle au
+    lieu d'un par message.
+    """
+
+    def __init__(self, registry=None, user_id=USER_ID):
+        self.registry = registry or get_label_registry(user_id)
+        self.user_id = user_id
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()   # (ajouts, retraits) → {ID de message: None}, dans l'ordre
+        self.calls = 0
+        self.modified = 0
+
+    def add(self, msg_id, add=(), remove=()):
+        change = (tuple(sorted(set(add))), tuple(sorted(set(remove))))
+        if not change[0] and not change[1]:
+            return
+        with self.lock:
+            self.pending.setdefault(change, OrderedDict())[msg_id] = None
+
+    def mark_read(self, msg_id):
+        self.add(msg_id, remove=[UNREAD])
+
+    def mark_processed(self, msg_id, label_name, read=False):
+        self.add(msg_id, add=[label_name] if label_name else [], remove=[UNREAD] if read else [])
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(ids) for ids in self.pending.values())
+
+    def flush(self, service):
+        """Applique les modifications en attente ; retourne le nombre de messages modifiés.
+
+        En cas d'erreur, ce qui n'a pas été appliqué est remis en attente pour
+        le prochain flush() avant que l'exception ne remonte.
+        """
+        with self.lock:
+            pending = [(change, list(ids)) for change, ids in self.pending.items()]
+            self.pending = OrderedDict()
+        modified = 0
+        try:
+            while pending:
+                (add, remove), ids = pending[0]
+                body = self._body(service, add, remove)
+                while body and ids:
+                    with METRICS.span("labels"):
+                        service.users().messages().batchModify(
+                            userId=self.user_id, body=dict(body, ids=ids[:MAX_BATCH_MODIFY])).execute()
+                    self.calls += 1
+                    METRICS.inc("gmail_api_calls_total", method="messages.batchModify")
+                    modified += len(ids[:MAX_BATCH_MODIFY])
+                    del ids[:MAX_BATCH_MODIFY]
+                pending.pop(0)
+        except Exception:
+            with self.lock:
+                for change, ids in pending:
+                    for msg_id in ids:
+                        self.pending.setdefault(change, OrderedDict())[msg_id] = None
+            raise
+        finally:
+            self.modified += modified
+        return modified
+
+    def _body(self, service, add, remove):
+        body = {}
+        if add:
+            body["addLabelIds"] = [self.registry.label_id(service, name) for name in add]
+        if remove:
+            # Un label absent n'est sur aucun message : rien à retirer, rien à créer
+            remove_ids = [i for i in (self.registry.label_id(service, name, create=False)
+                                      for name in remove) if i]
+            if remove_ids:
+                body["removeLabelIds"] = remove_ids
+        return body
@@ -0,0 +1,180 @@
+"""
+Ingestion par notifications push Gmail (users().watch + Pub/Sub) au lieu du polling
+"""
+import argparse
+import base64
+import json
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from gmail_fetch import USER_ID
+
+WATCH_RENEW_MARGIN = 24 * 3600   # Gmail expire un watch après 7 jours ; on renouvelle la veille
+
+
+def register_watch(service, topic_name, label_ids=("INBOX",), user_id=USER_ID):
+    """Enregistre (ou renouvelle) le watch Gmail ; retourne {historyId, expiration}"""
+    body = {"topicName": topic_name, "labelIds": list(label_ids), "labelFilterBehavior": "INCLUDE"}
+    return service.users().watch(userId=user_id, body=body).execute()
+
+
+def decode_push(envelope):
+    """Décode une enveloppe Pub/Sub push : retourne {emailAddress, historyId}"""
+    data = envelope.get("message", {}).get("data", "")
+    return json.loads(base64.b64decode(data).decode("utf-8"))
+
+
+class PushReceiver:
+    """Point de terminaison HTTP pour un abonnement Pub/Sub en mode push.
+
+    Chaque notification est acquittée immédiatement (204) ; le traitement a lieu
+    dans un thread dédié. Les notifications reçues pendant un traitement sont
+    regroupées en un seul passage suivant, et celles dont le historyId est déjà
+    couvert sont ignorées : Gmail n'est interrogé que s'il signale du nouveau.
+
+    on_new_history(history_id) retourne True si le passage a abouti. Sinon (valeur
+    fausse ou exception), le historyId n'est pas tenu pour traité : la notification
+    suivante, même renvoyée avec le même historyId, relance un passage.
+    """
+
+    def __init__(self, on_new_history, host="127.0.0.1", port=8085, token=None):
+        self.on_new_history = on_new_history
+        self.token = token
+        self.latest_history_id = 0
+        self.processed_history_id = 0
+        self.notifications = 0
+        self.runs = 0
+        self.failures = 0
+        self.pending = threading.Event()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.threads = []
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def _handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if receiver.token:
+                    query = parse_qs(urlparse(self.path).query)
+                    if query.get("token", [None])[0] != receiver.token:
+                        self.send_response(403)
+                        self.end_headers()
+                        return
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    notification = decode_push(json.loads(self.rfile.read(length)))
+                    receiver.notify(int(notification["historyId"]))
+                except (ValueError, KeyError) as e:
+                    print(f"⚠️ Notification illisible : {e}")
+                # Toujours acquitter, sinon Pub/Sub renvoie la notification en boucle
+                self.send_response(204)
+                self.end_headers()
+
+        return Handler
+
+    def notify(self, history_id):
+        with self.lock:
+            self.notifications += 1
+            if history_id <= self.processed_history_id:
+                return
+            self.latest_history_id = max(self.latest_history_id, history_id)
+        self.pending.set()
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            if not self.pending.wait(timeout=0.5):
+                continue
+            self.pending.clear()
+            with self.lock:
+                target = self.latest_history_id
+            try:
+                ok = self.on_new_history(target)
+            except Exception as e:
+                print(f"❌ Traitement push en échec : {e}")
+                ok = False
+            with self.lock:
+                self.runs += 1
+                if ok:
+                    self.processed_history_id = max(self.processed_history_id, target)
+                else:
+                    self.failures += 1
+
+    def start(self):
+        for target in (self.httpd.serve_forever, self._worker):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self.threads.append(t)
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for t in self.threads[1:]:
+            t.join(timeout=5)
+
+
+def daemon_receiver(daemon, host="127.0.0.1", port=8085, token=None):
+    """PushReceiver qui lance un cycle du démon par passage ; un cycle en échec n'acquitte rien"""
+    return PushReceiver(lambda history_id: daemon.run_once(wait=True) is not None, host=host, port=port,
+                        token=token)
+
+
+def serve(topic_name, host, port, token=None, fallback_interval=3600):
+    """Mode push du démon : cycle incrémental à chaque notification + filet de sécurité lent"""
+    from gmail_auto_reply_daemon import AutoReplyDaemon, FileLock
+
+    file_lock = FileLock()
+    if not file_lock.acquire():
+        print("⚠️ Une autre instance traite déjà la boîte, abandon.")
+        return
+    daemon = AutoReplyDaemon(incremental=True)
+    watch = register_watch(daemon.service, topic_name)
+    receiver = daemon_receiver(daemon, host=host, port=port, token=token).start()
+    print(f"📡 Watch actif (historyId {watch.get('historyId')}), écoute sur {receiver.url}")
+
+    signal.signal(signal.SIGINT, daemon.request_stop)
+    signal.signal(signal.SIGTERM, daemon.request_stop)
+    expiration = int(watch.get("expiration", 0)) / 1000
+    last_cycle = time.monotonic()
+    try:
+        while not daemon.stop_event.wait(60):
+            if expiration and time.time() > expiration - WATCH_RENEW_MARGIN:
+                expiration = int(register_watch(daemon.service, topic_name).get("expiration", 0)) / 1000
+                print("🔄 Watch Gmail renouvelé")
+            # Pub/Sub peut perdre une notification : un cycle de rattrapage reste planifié
+            if time.monotonic() - last_cycle >= fallback_interval:
+                daemon.run_once()
+                last_cycle = time.monotonic()
+    finally:
+        receiver.stop()
+        # stop() n'attend le worker que 5 s : un cycle déclenché par une notification (appels
+        # OpenAI) peut durer plus longtemps, et close() ne doit pas fermer le cache sous ses pieds
+        with daemon.cycle_lock:
+            daemon.close()
+        file_lock.release()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--topic", required=True, help="projects/<projet>/topics/<topic>")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--token", default=None, help="jeton attendu dans ?token= de l'URL push")
+    parser.add_argument("--fallback-interval", type=float, default=3600)
+    args = parser.parse_args()
+    serve(args.topic, args.host, args.port, token=args.token, fallback_interval=args.fallback_interval)
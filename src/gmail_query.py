@@ -0,0 +1,137 @@
+"""
+Compilation des règles de filtrage (expéditeurs, sujets, mots-clés) en requête Gmail q=
+"""
+from email.utils import parseaddr
+
+from src.config import DEFAULT_CONFIG
+
+from gmail_fetch import USER_ID
+from keyword_matcher import KeywordMatcher
+from metrics import METRICS
+
+
+def _quote(term):
+    term = term.replace('"', "").strip()
+    return f'"{term}"' if any(c in term for c in " ()'-:") else term
+
+
+def _is_full_address(sender):
+    local, _, domain = sender.partition("@")
+    return bool(local and domain and "." in domain)
+
+
+class FilterRules:
+    """Règles d'exclusion et de mots-clés, appliquées côté Gmail quand c'est possible.
+
+    - adresses complètes → -from:adresse ; les préfixes (« noreply@ ») restent locaux
+    - phrases de sujet → -subject:"phrase"
+    - mots-clés → (a OR b OR "c d") seulement si server_keywords : Gmail cherche
+      des mots entiers (« informations » ne contient pas « formation » pour lui)
+      alors que la vérification locale cherche des sous-chaînes ; les mots-clés
+      restent donc locaux par défaut.
+
+    Les vérifications locales (sender_ignored, subject_excluded, matching_keywords)
+    couvrent toutes les règles et restent appliquées après le listing. Les
+    mots-clés et leurs synonymes y passent par un KeywordMatcher compilé.
+    """
+
+    def __init__(self, ignored_senders=(), excluded_subject_phrases=(), keywords=(),
+                 base_query="is:unread", server_keywords=False, synonyms=None):
+        self.ignored_senders = sorted({s.lower() for s in ignored_senders})
+        self.excluded_subject_phrases = [p.lower() for p in excluded_subject_phrases]
+        self.keywords = list(keywords)
+        self.synonyms = dict(synonyms or {})
+        self.base_query = base_query or ""
+        self.server_keywords = server_keywords
+        self.matcher = KeywordMatcher(self.keywords, self.synonyms)
+
+    @classmethod
+    def from_config(cls, config=DEFAULT_CONFIG, ignored_senders=(), excluded_subject_phrases=(),
+                    keywords=None, **kwargs):
+        """Fusionne les expéditeurs ignorés de config.py avec ceux du script"""
+        senders = set(config.get("ignored_senders", [])) | set(ignored_senders)
+        if keywords is None:
+            keywords = config.get("keywords", [])
+        kwargs.setdefault("synonyms", config.get("keyword_synonyms"))
+        return cls(senders, excluded_subject_phrases, keywords, **kwargs)
+
+    def search_terms(self):
+        return list(dict.fromkeys(self.keywords + [w for ws in self.synonyms.values() for w in ws]))
+
+    # ---------- Côté serveur ---------- #
+    def query(self):
+        terms = [self.base_query] if self.base_query else []
+        terms += [f"-from:{s}" for s in self.ignored_senders if _is_full_address(s)]
+        terms += [f"-subject:{_quote(p)}" for p in self.excluded_subject_phrases]
+        if self.server_keywords and self.keywords:
+            terms.append("(" + " OR ".join(_quote(k) for k in self.search_terms()) + ")")
+        return " ".join(terms)
+
+    def local_only(self):
+        """Règles que la requête Gmail ne peut pas exprimer"""
+        rules = [f"from:{s}*" for s in self.ignored_senders if not _is_full_address(s)]
+        if not self.server_keywords:
+            rules += [f"mot-clé:{k}" for k in self.search_terms()]
+        return rules
+
+    # ---------- Côté local ---------- #
+    def sender_ignored(self, sender_email):
+        sender_email = sender_email.lower()
+        for s in self.ignored_senders:
+            if sender_email == s:
+                return True
+            if s.endswith("@") and sender_email.startswith(s):
+                return True
+            if s.startswith("@") and sender_email.endswith(s):
+                return True
+        return False
+
+    def subject_excluded(self, subject):
+        subject = subject.lower()
+        return any(p in subject for p in self.excluded_subject_phrases)
+
+    def matching_keywords(self, text):
+        return self.matcher.matching(text)
+
+    def triage(self, msg, snippet_keywords=False):
+        """Tri sur métadonnées (From, Subject, snippet) avant de télécharger le corps.
+
+        Le snippet ne contient que le début du message : les mots-clés n'y sont
+        cherchés que si snippet_keywords est demandé explicitement.
+        """
+        _, sender_email = parseaddr(msg["from"])
+        if self.sender_ignored(sender_email) or self.subject_excluded(msg["subject"]):
+            return False
+        if snippet_keywords and len(self.matcher) and not self.matcher.search(msg["snippet"]):
+            return False
+        return True
+
+
+class FilterReport:
+    """Compte les téléchargements évités par la requête compilée"""
+
+    def __init__(self):
+        self.base_estimate = 0
+        self.compiled_estimate = 0
+        self.fetched = 0
+        self.rejected_locally = 0
+
+    @property
+    def avoided(self):
+        return max(0, self.base_estimate - self.compiled_estimate)
+
+    def estimate(self, service, rules, user_id=USER_ID):
+        """Deux listings d'un seul ID : resultSizeEstimate avec et sans les règles"""
+        messages = service.users().messages()
+        with METRICS.span("gmail_list"):
+            self.base_estimate = messages.list(userId=user_id, q=rules.base_query or None,
+                                               maxResults=1).execute().get("resultSizeEstimate", 0)
+            self.compiled_estimate = messages.list(userId=user_id, q=rules.query(),
+                                                   maxResults=1).execute().get("resultSizeEstimate", 0)
+        METRICS.inc("gmail_api_calls_total", 2, method="messages.list")
+        return self.avoided
+
+    def summary(self):
+        return (f"🔎 Filtrage Gmail : ~{self.avoided} téléchargements évités "
+                f"({self.base_estimate} → {self.compiled_estimate}), "
+                f"{self.fetched} récupérés, {self.rejected_locally} rejetés localement")
@@ -1,80 +1,75 @@
-import os
-import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-from dotenv import load_dotenv
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-import requests, base64
-import openai
 
-def load_env():
-    load_dotenv()
-    openai.api_key = os.getenv("OPENAI_API_KEY")
+import core
+from gmail_fetch import iter_messages_by_id, list_page
+from message_store import MessageStore
+from metrics import METRICS
+from paged_inbox import PagedInbox, fill_view, lazy_scroll, sync_listbox
+from tk_tasks import BackgroundTasks, StatusBar, SuggestionPrefetcher
 
-# Gmail helper functions
-CLIENT_ID = os.getenv("CLIENT_ID")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET")
-REFRESH_TOKEN = os.getenv("REFRESH_TOKEN")
-USER_ID = "me"
-KEYWORDS = ["formation", "gardiennage", "prix", "intéressé par la formation"]
+# Shared config (src/config.py + .env, loaded once); Gmail/OpenAI clients are built on first use
+CONFIG = core.get_config()
+USER_ID = CONFIG["user_id"]
+RULES = core.filter_rules()
+REPLY_CACHE = core.get_reply_cache()
+PROMPT_TRIMMER = core.prompt_trimmer()
 
+# Gmail helper functions
 def refresh_access_token():
-    token_url = "https://oauth2.googleapis.com/token"
-    r = requests.post(token_url, data={
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "refresh_token": REFRESH_TOKEN,
-        "grant_type": "refresh_token",
-    })
-    r.raise_for_status()
-    return r.json()["access_token"]
+    return core.token_manager().get_token()
 
 def gmail_service():
-    creds = Credentials(token=refresh_access_token(),
-                        refresh_token=REFRESH_TOKEN,
-                        token_uri="https://oauth2.googleapis.com/token",
-                        client_id=CLIENT_ID,
-                        client_secret=CLIENT_SECRET)
-    return build("gmail", "v1", credentials=creds)
-
-# Fetch unread messages matching keywords
-def fetch_messages(max_results=5):
-    svc = gmail_service()
-    res = svc.users().messages().list(userId=USER_ID, q="is:unread", maxResults=max_results).execute()
-    items = res.get("messages", [])
-    emails = []
-    for m in items:
-        msg = svc.users().messages().get(userId=USER_ID, id=m['id'], format='full').execute()
-        headers = {h['name']: h['value'] for h in msg['payload']['headers']}
-        # skip our administrative replies
-        if headers.get('From', '').startswith(('academie@', 'd.oliveira@')):
-            continue
-        parts = msg['payload'].get('parts', [])
-        body = ''
-        for p in parts:
-            if p.get('mimeType')=='text/plain':
-                body = base64.urlsafe_b64decode(p['body']['data']).decode()
-                break
-        if not any(kw in body.lower() for kw in KEYWORDS):
-            continue
-        emails.append({
-            'id': m['id'],
-            'from': headers.get('From',''),
-            'subject': headers.get('Subject','(Sans sujet)'),
-            'body': body,
-        })
-    return emails
+    return core.gmail_service()
+
+def email_row(msg):
+    # skip our administrative replies
+    if msg['from'].startswith(('academie@', 'd.oliveira@')):
+        return None
+    body = msg['body']
+    if not RULES.matcher.search(body):
+        return None
+    return {
+        'id': msg['id'],
+        'from': msg['from'],
+        'subject': msg['subject'] or '(Sans sujet)',
+        'body': body,
+    }
+
+# One page of IDs / the rows for those IDs, for the scrolling list
+def list_email_page(page_token, page_size):
+    with METRICS.span("gui_list", log=True, app="gmail_reply_app"):
+        return list_page(gmail_service(), q=RULES.query(), page_token=page_token, page_size=page_size)
+
+def fetch_email_rows(ids, store=None):
+    with METRICS.span("gui_fetch", log=True, app="gmail_reply_app"):
+        # {id: row or None when filtered}; IDs Gmail failed to return are simply absent
+        return {msg['id']: email_row(msg) for msg in iter_messages_by_id(gmail_service(), ids, store=store)}
 
 # Generate ChatGPT reply
+REPLY_MODEL = CONFIG["reply_model"]
+REPLY_MAX_TOKENS = 300
+PROMPT_TEMPLATE = "Compose a polite, professional reply in French to:\n\n{body_text}"
+
 def generate_reply(body_text):
-    prompt = f"Compose a polite, professional reply in French to:\n\n{body_text}"
-    resp = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=[{"role":"user","content":prompt}],
-        max_tokens=300
-    )
-    return resp.choices[0].message.content.strip()
+    body_text = PROMPT_TRIMMER.trim(body_text)
+    def call():
+        return core.complete([{"role":"user","content":PROMPT_TEMPLATE.format(body_text=body_text)}],
+                             REPLY_MAX_TOKENS, model=REPLY_MODEL, stage="gui_generate", log=True,
+                             app="gmail_reply_app", mode="complete")
+    return REPLY_CACHE.get_or_generate(body_text, PROMPT_TEMPLATE, REPLY_MODEL, REPLY_MAX_TOKENS, call)
+
+# Réponse affichée mot à mot (stream=True) ; REPLY_STREAMING=0 pour attendre la réponse complète
+STREAM_REPLIES = CONFIG["reply_streaming"]
+
+def stream_reply(body_text):
+    """Générateur des morceaux de la réponse ; même clé de cache que generate_reply"""
+    body_text = PROMPT_TRIMMER.trim(body_text)
+    def call():
+        return core.stream([{"role":"user","content":PROMPT_TEMPLATE.format(body_text=body_text)}],
+                           REPLY_MAX_TOKENS, model=REPLY_MODEL, stage="gui_generate", log=True,
+                           app="gmail_reply_app", mode="stream")
+    return REPLY_CACHE.stream_or_generate(body_text, PROMPT_TEMPLATE, REPLY_MODEL, REPLY_MAX_TOKENS, call)
 
 # GUI Application
 class ReplyApp(tk.Tk):
@@ -83,6 +78,15 @@ class ReplyApp(tk.Tk):
         self.title("XGuard Reply Suggester")
         self.geometry("800x600")
         self.emails = []
+        self.shown = []       # ids in listbox order
+        self.ignored = set()
+        self.store = MessageStore()
+        self.inbox = PagedInbox(list_email_page, lambda ids: fetch_email_rows(ids, self.store))
+        self.tasks = BackgroundTasks(self)
+        # Suggestions des premiers courriels générées dès l'affichage de la liste
+        self.prefetcher = SuggestionPrefetcher(self, generate_reply,
+                                               stream=stream_reply if STREAM_REPLIES else None)
+        self.protocol("WM_DELETE_WINDOW", self.close)
         self.create_widgets()
         self.load_emails()
 
@@ -92,8 +96,12 @@ class ReplyApp(tk.Tk):
 
         # Left: list of emails
         frame_list = ttk.Frame(pane, width=200)
-        self.listbox = tk.Listbox(frame_list)
+        self.listbox = tk.Listbox(frame_list, exportselection=False)
+        scrollbar = ttk.Scrollbar(frame_list, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.listbox.pack(fill=tk.BOTH, expand=True)
+        # next pages are loaded when scrolling near the bottom
+        lazy_scroll(self.listbox, scrollbar, self.load_more)
         self.listbox.bind('<<ListboxSelect>>', self.on_select)
         pane.add(frame_list)
 
@@ -109,16 +117,43 @@ class ReplyApp(tk.Tk):
         btn_frame = ttk.Frame(frame_detail)
         ttk.Button(btn_frame, text="Envoyer", command=self.send_reply).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Ignorer", command=self.ignore_email).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Rafraîchir", command=self.refresh).pack(side=tk.LEFT, padx=5)
         btn_frame.pack(pady=5)
         pane.add(frame_detail)
 
+        self.status = StatusBar(self)
+        self.status.pack(fill=tk.X, side=tk.BOTTOM)
+
+    # Gmail et OpenAI tournent dans self.tasks ; seuls les rappels touchent aux widgets
     def load_emails(self):
-        def task():
-            self.emails = fetch_messages()
-            self.listbox.delete(0, tk.END)
-            for e in self.emails:
-                self.listbox.insert(tk.END, e['subject'])
-        threading.Thread(target=task).start()
+        self.load_more()
+
+    def load_more(self):
+        if self.inbox.exhausted or self.tasks.busy('load'):
+            return
+        self.status.start('load', "⏳ Chargement des courriels…")
+        self.tasks.submit('load', self.inbox.load_more,
+                          on_done=self.show_emails, on_error=self.load_failed)
+
+    def refresh(self):
+        # re-list the pages already seen: new emails appear, read ones go away
+        self.status.start('load', "⏳ Actualisation…")
+        self.tasks.submit('load', self.inbox.refresh,
+                          on_done=self.show_emails, on_error=self.load_failed)
+
+    def show_emails(self, emails):
+        # insert/remove deltas only, so the selected email stays selected
+        self.emails = [e for e in emails if e['id'] not in self.ignored]
+        self.shown = sync_listbox(self.listbox, self.shown, self.emails,
+                                  lambda e: e['id'], lambda e: e['subject'])
+        self.prefetcher.prefetch([(e['id'], e['body']) for e in self.emails])
+        more = "" if self.inbox.exhausted else " (défiler pour la suite)"
+        self.status.stop('load', f"{len(self.emails)} courriel(s){more}")
+        # a list shorter than the view can't scroll: keep loading until it fills up
+        fill_view(self.listbox, self.inbox, self.load_more)
+
+    def load_failed(self, error):
+        self.status.stop('load', f"❌ Gmail : {error}")
 
     def on_select(self, evt):
         idx = self.listbox.curselection()
@@ -127,12 +162,25 @@ class ReplyApp(tk.Tk):
         self.lbl_meta.config(text=f"De: {e['from']} | Sujet: {e['subject']}")
         self.txt_body.delete('1.0', tk.END)
         self.txt_body.insert(tk.END, e['body'])
-        # generate
-        def task_gen():
-            rep = generate_reply(e['body'])
-            self.txt_reply.delete('1.0', tk.END)
-            self.txt_reply.insert(tk.END, rep)
-        threading.Thread(target=task_gen).start()
+        self.txt_reply.delete('1.0', tk.END)
+        # Suggestion déjà pré-générée : affichée tout de suite ; sinon demandée en priorité,
+        # et en flux ses morceaux s'ajoutent à la boîte au fil de l'eau
+        if not self.prefetcher.request(e['id'], e['body'], self.show_reply, self.reply_failed,
+                                       on_delta=self.append_reply):
+            self.status.start('reply', "⏳ Génération de la suggestion…")
+
+    def append_reply(self, delta):
+        self.txt_reply.insert(tk.END, delta)
+        self.txt_reply.see(tk.END)
+
+    def show_reply(self, reply):
+        self.txt_reply.delete('1.0', tk.END)
+        self.txt_reply.insert(tk.END, reply)
+        self.status.stop('reply', "")
+
+    def reply_failed(self, error):
+        self.txt_reply.delete('1.0', tk.END)
+        self.status.stop('reply', f"❌ OpenAI : {error}")
 
     def send_reply(self):
         messagebox.showinfo("Envoyer", "Fonction d'envoi à implémenter")
@@ -140,10 +188,17 @@ class ReplyApp(tk.Tk):
     def ignore_email(self):
         idx = self.listbox.curselection()
         if idx:
+            self.ignored.add(self.emails[idx[0]]['id'])
             self.listbox.delete(idx)
             del self.emails[idx[0]]
+            del self.shown[idx[0]]
+
+    def close(self):
+        self.prefetcher.shutdown()
+        self.tasks.shutdown()
+        METRICS.export("session", app="gmail_reply_app", prefetch=self.prefetcher.stats)
+        self.destroy()
 
 if __name__ == '__main__':
-    load_env()
     app = ReplyApp()
     app.mainloop()
@@ -1,68 +1,88 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import base64
-import os
-import openai
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from dotenv import load_dotenv
-import requests
 import re
 
-# Charger les variables d'environnement
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-USER_ID = "me"
-KEYWORDS = ["formation", "gardiennage", "prix", "intéressé par la formation"]
-IGNORED_SENDERS = ["academie@academiexguard.ca", "d.oliveira@academiexguard.ca"]
+import core
+from gmail_fetch import iter_messages_by_id, list_page
+from keyword_matcher import KeywordMatcher
+from message_store import MessageStore
+from metrics import METRICS
+from paged_inbox import PagedInbox, fill_view, lazy_scroll, sync_tree
+from tk_tasks import BackgroundTasks, StatusBar, SuggestionPrefetcher
+
+# Réglages communs (src/config.py + .env) ; clients Gmail et OpenAI créés au premier usage
+CONFIG = core.get_config()
+USER_ID = CONFIG["user_id"]
+# Copie : « Toujours ignorer » y ajoute des expéditeurs pour la session
+IGNORED_SENDERS = list(CONFIG["ignored_senders"])
+REPLY_CACHE = core.get_reply_cache()
+PROMPT_TRIMMER = core.prompt_trimmer()
 
 def authenticate():
-    creds = Credentials.from_authorized_user_file("token.json", ["https://www.googleapis.com/auth/gmail.modify"])
-    service = build("gmail", "v1", credentials=creds)
-    return service
-
-def list_messages(service, user_id):
-    response = service.users().messages().list(userId=user_id, maxResults=10).execute()
-    messages = []
-    if "messages" in response:
-        for msg in response["messages"]:
-            msg_data = service.users().messages().get(userId=user_id, id=msg["id"], format="full").execute()
-            payload = msg_data["payload"]
-            headers = {h["name"]: h["value"] for h in payload.get("headers", [])}
-            body = ""
-            if "parts" in payload:
-                for part in payload["parts"]:
-                    if part["mimeType"] == "text/plain":
-                        data = part["body"].get("data")
-                        if data:
-                            body = base64.urlsafe_b64decode(data).decode("utf-8")
-                            break
-            elif "body" in payload and "data" in payload["body"]:
-                body = base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
-            messages.append({
-                "id": msg["id"],
-                "from": headers.get("From", ""),
-                "subject": headers.get("Subject", ""),
-                "body": body,
-            })
-    return messages
+    # Jeton partagé par le processus (REFRESH_TOKEN du .env, sinon token.json) ; un service par thread
+    return core.gmail_service()
+
+def message_row(msg):
+    return {
+        "id": msg["id"],
+        "threadId": msg["threadId"],
+        "from": msg["from"],
+        "subject": msg["subject"],
+        "body": msg["body"],
+    }
+
+KEYWORD_MATCHER = KeywordMatcher.from_config(CONFIG)
 
 def message_contains_keywords(msg):
-    return any(kw.lower() in msg["body"].lower() for kw in KEYWORDS)
+    return KEYWORD_MATCHER.search(msg["body"])
+
+# Appelés hors du thread Tk (PagedInbox) : service Gmail propre au thread de l'exécuteur
+def list_conversation_page(page_token, page_size):
+    # IGNORED_SENDERS change avec « Toujours ignorer » : la requête est recompilée à chaque page
+    query = core.filter_rules(ignored_senders=IGNORED_SENDERS, base_query="").query()
+    with METRICS.span("gui_list", log=True, app="gmail_reply_app_v2"):
+        return list_page(authenticate(), q=query, page_token=page_token, page_size=page_size, user_id=USER_ID)
+
+def fetch_conversation_rows(ids, store=None):
+    with METRICS.span("gui_fetch", log=True, app="gmail_reply_app_v2"):
+        return {msg["id"]: message_row(msg) if message_contains_keywords(msg) else None
+                for msg in iter_messages_by_id(authenticate(), ids, user_id=USER_ID, store=store)}
+
+REPLY_MODEL = CONFIG["reply_model"]
+REPLY_MAX_TOKENS = 300
+SYSTEM_PROMPT = "Tu es un assistant du service client."
+PROMPT_TEMPLATE = "Un client a écrit : {body}\n\nRédige une réponse professionnelle et rassurante pour XGuard Formation."
+
+def suggest_reply(body):
+    """Comme generate_reply, mais laisse remonter les erreurs (rien n'est gardé en session)"""
+    body = PROMPT_TRIMMER.trim(body)
+    def call():
+        return core.complete([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": PROMPT_TEMPLATE.format(body=body)}
+        ], REPLY_MAX_TOKENS, model=REPLY_MODEL, stage="gui_generate", log=True,
+            app="gmail_reply_app_v2", mode="complete")
+    return REPLY_CACHE.get_or_generate(body, SYSTEM_PROMPT + "\n" + PROMPT_TEMPLATE,
+                                       REPLY_MODEL, REPLY_MAX_TOKENS, call)
+
+# Réponse affichée mot à mot (stream=True) ; REPLY_STREAMING=0 pour attendre la réponse complète
+STREAM_REPLIES = CONFIG["reply_streaming"]
+
+def stream_reply(body):
+    """Générateur des morceaux de la suggestion ; même clé de cache que suggest_reply"""
+    body = PROMPT_TRIMMER.trim(body)
+    def call():
+        return core.stream([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": PROMPT_TEMPLATE.format(body=body)}
+        ], REPLY_MAX_TOKENS, model=REPLY_MODEL, stage="gui_generate", log=True,
+            app="gmail_reply_app_v2", mode="stream")
+    return REPLY_CACHE.stream_or_generate(body, SYSTEM_PROMPT + "\n" + PROMPT_TEMPLATE,
+                                          REPLY_MODEL, REPLY_MAX_TOKENS, call)
 
 def generate_reply(body):
-    prompt = f"Un client a écrit : {body}\n\nRédige une réponse professionnelle et rassurante pour XGuard Formation."
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Tu es un assistant du service client."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=300
-        )
-        return response["choices"][0]["message"]["content"].strip()
+        return suggest_reply(body)
     except Exception as e:
         return f"Erreur lors de la génération : {str(e)}"
 
@@ -70,13 +90,19 @@ class GmailApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Gmail Reply App")
-        self.service = authenticate()
         self.ignored_threads = set()
+        self.store = MessageStore()
 
-        self.tree = ttk.Treeview(root, columns=("from", "subject"), show="headings")
+        list_frame = tk.Frame(root)
+        list_frame.pack(fill="both", expand=True)
+        self.tree = ttk.Treeview(list_frame, columns=("from", "subject"), show="headings")
         self.tree.heading("from", text="De")
         self.tree.heading("subject", text="Sujet")
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical")
+        scrollbar.pack(side="right", fill="y")
         self.tree.pack(fill="both", expand=True)
+        # Pages suivantes chargées quand on approche du bas de la liste
+        lazy_scroll(self.tree, scrollbar, self.load_more)
         self.tree.bind("<<TreeviewSelect>>", self.display_selected)
 
         self.textbox = scrolledtext.ScrolledText(root, height=12)
@@ -87,29 +113,92 @@ class GmailApp:
 
         tk.Button(btn_frame, text="✅ Confirmer", command=self.confirm).pack(side="left", padx=5)
         tk.Button(btn_frame, text="📝 Modifier", command=self.edit).pack(side="left", padx=5)
-        tk.Button(btn_frame, text="🔁 Rafraîchir", command=self.refresh_messages).pack(side="left", padx=5)
+        self.refresh_button = tk.Button(btn_frame, text="🔁 Rafraîchir", command=self.refresh_messages)
+        self.refresh_button.pack(side="left", padx=5)
         tk.Button(btn_frame, text="🚫 Ignorer", command=self.ignore).pack(side="left", padx=5)
         tk.Button(btn_frame, text="❌ Toujours ignorer", command=self.ignore_forever).pack(side="left", padx=5)
 
-        self.messages = []
-        self.refresh_messages()
+        self.status = StatusBar(root)
+        self.status.pack(fill="x")
+
+        # Gmail et OpenAI tournent dans l'exécuteur ; le thread Tk ne fait qu'afficher
+        self.tasks = BackgroundTasks(root)
+        # Suggestions des premières conversations générées dès l'affichage de la liste
+        self.prefetcher = SuggestionPrefetcher(root, suggest_reply,
+                                               stream=stream_reply if STREAM_REPLIES else None)
+        root.protocol("WM_DELETE_WINDOW", self.close)
+        # Une ligne par conversation : le listing arrive du plus récent au plus ancien,
+        # seul le premier message de chaque fil est gardé
+        self.inbox = PagedInbox(list_conversation_page, lambda ids: fetch_conversation_rows(ids, self.store),
+                                key=lambda msg: msg["threadId"])
+        self.rows = []        # dernière liste reçue, avant les filtres « Ignorer »
+        self.messages = {}    # threadId -> ligne affichée
+        self.load_more()
 
     def refresh_messages(self):
-        self.messages = [msg for msg in list_messages(self.service, USER_ID)
-                         if message_contains_keywords(msg)
-                         and msg["from"] not in IGNORED_SENDERS
-                         and msg["id"] not in self.ignored_threads]
-        self.tree.delete(*self.tree.get_children())
-        for i, msg in enumerate(self.messages):
-            self.tree.insert("", "end", iid=i, values=(msg["from"], msg["subject"]))
+        # Reliste les pages déjà vues : nouvelles conversations ajoutées, conversations lues retirées
+        self.refresh_button.config(state="disabled")
+        self.status.start("inbox", "⏳ Chargement des conversations…")
+        self.tasks.submit("inbox", self.inbox.refresh, on_done=self.show_messages, on_error=self.refresh_failed)
+
+    def load_more(self):
+        if self.inbox.exhausted or self.tasks.busy("inbox"):
+            return
+        self.status.start("inbox", "⏳ Chargement de la page suivante…")
+        self.tasks.submit("inbox", self.inbox.load_more, on_done=self.show_messages, on_error=self.refresh_failed)
+
+    def visible(self, msg):
+        return (msg["threadId"] not in self.ignored_threads
+                and not any(sender in msg["from"] for sender in IGNORED_SENDERS))
+
+    def show_messages(self, rows):
+        # Deltas seulement : la ligne sélectionnée garde sa sélection et sa suggestion
+        self.rows = rows
+        messages = [msg for msg in rows if self.visible(msg)]
+        sync_tree(self.tree, messages, lambda msg: msg["threadId"], lambda msg: (msg["from"], msg["subject"]))
+        self.messages = {msg["threadId"]: msg for msg in messages}
+        self.prefetcher.prefetch([(msg["id"], msg["body"]) for msg in messages])
+        if self.tree.focus() not in self.messages:
+            self.status.stop("reply")
+            self.textbox.delete("1.0", tk.END)
+        if not self.tasks.busy("inbox"):
+            self.refresh_button.config(state="normal")
+            more = "" if self.inbox.exhausted else " (défiler pour la suite)"
+            self.status.stop("inbox", f"{len(messages)} conversation(s){more}")
+        fill_view(self.tree, self.inbox, self.load_more)
+
+    def refresh_failed(self, error):
+        self.refresh_button.config(state="normal")
+        self.status.stop("inbox", f"❌ Gmail : {error}")
 
     def display_selected(self, event):
         selected = self.tree.focus()
         if selected:
-            msg = self.messages[int(selected)]
-            suggestion = generate_reply(msg["body"])
+            msg = self.messages[selected]
             self.textbox.delete("1.0", tk.END)
-            self.textbox.insert(tk.END, suggestion)
+            # Suggestion déjà pré-générée : affichée tout de suite ; sinon demandée en priorité,
+            # et en flux ses morceaux s'ajoutent à la boîte au fil de l'eau
+            if not self.prefetcher.request(msg["id"], msg["body"], self.show_reply, self.reply_failed,
+                                           on_delta=self.append_reply):
+                self.status.start("reply", "⏳ Génération de la suggestion…")
+
+    def append_reply(self, delta):
+        self.textbox.insert(tk.END, delta)
+        self.textbox.see(tk.END)
+
+    def show_reply(self, suggestion):
+        self.textbox.delete("1.0", tk.END)
+        self.textbox.insert(tk.END, suggestion)
+        self.status.stop("reply", "")
+
+    def reply_failed(self, error):
+        self.textbox.delete("1.0", tk.END)
+        self.textbox.insert(tk.END, f"Erreur lors de la génération : {error}")
+        self.status.stop("reply", "")
+
+    def drop(self):
+        """Retire localement les lignes ignorées, sans refaire d'aller-retour Gmail"""
+        self.show_messages(self.rows)
 
     def confirm(self):
         messagebox.showinfo("Envoyé", "Réponse confirmée. (À brancher si tu veux envoyer)")
@@ -120,20 +209,26 @@ class GmailApp:
     def ignore(self):
         selected = self.tree.focus()
         if selected:
-            msg = self.messages[int(selected)]
-            self.ignored_threads.add(msg["id"])
-            self.refresh_messages()
+            msg = self.messages[selected]
+            self.ignored_threads.add(msg["threadId"])
+            self.drop()
 
     def ignore_forever(self):
         selected = self.tree.focus()
         if selected:
-            msg = self.messages[int(selected)]
+            msg = self.messages[selected]
             sender = msg["from"]
             parsed_email = re.findall(r"<(.*?)>", sender)
             if parsed_email:
                 sender = parsed_email[0]
             IGNORED_SENDERS.append(sender)
-            self.refresh_messages()
+            self.drop()
+
+    def close(self):
+        self.prefetcher.shutdown()
+        self.tasks.shutdown()
+        METRICS.export("session", app="gmail_reply_app_v2", prefetch=self.prefetcher.stats)
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,77 +1,85 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-from dotenv import load_dotenv
-import os
-import base64
-import requests
-import openai
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-CLIENT_ID = os.getenv("CLIENT_ID")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET")
-REFRESH_TOKEN = os.getenv("REFRESH_TOKEN")
-USER_ID = "me"
-
-KEYWORDS = ["formation", "gardiennage", "prix", "intéressé par la formation"]
-EXCLUDED_SENDERS = ["academie@academiexguard.ca", "d.oliveira@academiexguard.ca"]
-EXCLUDED_SUBJECT_PHRASES = ["Confirmation d'inscription"]
+
+import core
+from gmail_fetch import iter_messages_by_id, list_page
+from message_store import MessageStore
+from metrics import METRICS
+from paged_inbox import PagedInbox, fill_view, lazy_scroll, sync_tree
+from tk_tasks import BackgroundTasks, StatusBar, SuggestionPrefetcher
+
+# Configuration chargée une fois par core ; openai et googleapiclient ne sont importés qu'au premier appel
+CONFIG = core.get_config()
+USER_ID = CONFIG["user_id"]
+
+EXCLUDED_SENDERS = CONFIG["ignored_senders"]
+EXCLUDED_SUBJECT_PHRASES = CONFIG["excluded_subject_phrases"]
+RULES = core.filter_rules(base_query="")
+REPLY_CACHE = core.get_reply_cache()
+PROMPT_TRIMMER = core.prompt_trimmer()
 
 def refresh_access_token():
-    token_url = "https://oauth2.googleapis.com/token"
-    payload = {
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "refresh_token": REFRESH_TOKEN,
-        "grant_type": "refresh_token",
-    }
-    r = requests.post(token_url, data=payload)
-    return r.json().get("access_token")
+    return core.token_manager().get_token()
 
 def build_gmail_service():
-    creds = Credentials(token=refresh_access_token())
-    return build("gmail", "v1", credentials=creds)
-
-def get_latest_messages():
-    service = build_gmail_service()
-    results = service.users().messages().list(userId=USER_ID, maxResults=15).execute()
-    messages = results.get("messages", [])
-    filtered = []
-    for m in messages:
-        msg = service.users().messages().get(userId=USER_ID, id=m["id"]).execute()
-        headers = {h["name"]: h["value"] for h in msg["payload"]["headers"]}
-        subject = headers.get("Subject", "")
-        sender = headers.get("From", "")
-        snippet = msg.get("snippet", "")
-        if any(sender.lower().startswith(ex.lower()) for ex in EXCLUDED_SENDERS):
-            continue
-        if any(phrase.lower() in subject.lower() for phrase in EXCLUDED_SUBJECT_PHRASES):
-            continue
-        if any(k.lower() in snippet.lower() for k in KEYWORDS):
-            filtered.append({
-                "id": m["id"],
-                "subject": subject,
-                "from": sender,
-                "snippet": snippet,
-            })
-        if len(filtered) >= 5:
-            break
-    return filtered
+    return core.gmail_service()
+
+def message_row(msg):
+    """Ligne affichée pour un message, ou None s'il est écarté"""
+    subject = msg["subject"]
+    sender = msg["from"]
+    snippet = msg["snippet"]
+    if any(sender.lower().startswith(ex.lower()) for ex in EXCLUDED_SENDERS):
+        return None
+    if any(phrase.lower() in subject.lower() for phrase in EXCLUDED_SUBJECT_PHRASES):
+        return None
+    if not RULES.matcher.search(snippet):
+        return None
+    return {
+        "id": msg["id"],
+        "subject": subject,
+        "from": sender,
+        "snippet": snippet,
+    }
+
+def list_message_page(page_token, page_size):
+    with METRICS.span("gui_list", log=True, app="gmail_reply_gui"):
+        return list_page(build_gmail_service(), q=RULES.query(), page_token=page_token, page_size=page_size)
+
+def fetch_message_rows(ids, store=None):
+    with METRICS.span("gui_fetch", log=True, app="gmail_reply_gui"):
+        # Seuls From, Subject et le snippet sont affichés : format=metadata suffit, aucun corps téléchargé
+        return {msg["id"]: message_row(msg)
+                for msg in iter_messages_by_id(build_gmail_service(), ids, fmt="metadata", store=store)}
+
+REPLY_MODEL = CONFIG["reply_model"]
+REPLY_MAX_TOKENS = 300
+PROMPT_TEMPLATE = "Voici un message reçu : {prompt}\n\nPropose une réponse polie, utile et orientée vers la vente pour XGuard Formation."
+
+def suggest_reply(prompt):
+    """Comme generate_reply, mais laisse remonter les erreurs (rien n'est gardé en session)"""
+    prompt = PROMPT_TRIMMER.trim(prompt)
+    def call():
+        return core.complete([{"role": "user", "content": PROMPT_TEMPLATE.format(prompt=prompt)}],
+                             REPLY_MAX_TOKENS, model=REPLY_MODEL, stage="gui_generate", log=True,
+                             app="gmail_reply_gui", mode="complete")
+    return REPLY_CACHE.get_or_generate(prompt, PROMPT_TEMPLATE, REPLY_MODEL, REPLY_MAX_TOKENS, call)
+
+# Réponse affichée mot à mot (stream=True) ; REPLY_STREAMING=0 pour attendre la réponse complète
+STREAM_REPLIES = CONFIG["reply_streaming"]
+
+def stream_reply(prompt):
+    """Générateur des morceaux de la suggestion ; même clé de cache que suggest_reply"""
+    prompt = PROMPT_TRIMMER.trim(prompt)
+    def call():
+        return core.stream([{"role": "user", "content": PROMPT_TEMPLATE.format(prompt=prompt)}],
+                           REPLY_MAX_TOKENS, model=REPLY_MODEL, stage="gui_generate", log=True,
+                           app="gmail_reply_gui", mode="stream")
+    return REPLY_CACHE.stream_or_generate(prompt, PROMPT_TEMPLATE, REPLY_MODEL, REPLY_MAX_TOKENS, call)
 
 def generate_reply(prompt):
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[{
-                "role": "user",
-                "content": f"Voici un message reçu : {prompt}\n\nPropose une réponse polie, utile et orientée vers la vente pour XGuard Formation."
-            }],
-            max_tokens=300
-        )
-        return response.choices[0].message.content.strip()
+        return suggest_reply(prompt)
     except Exception as e:
         return f"Erreur GPT : {e}"
 
@@ -80,10 +88,16 @@ class GmailApp:
         self.root = root
         root.title("Gmail Reply App")
 
-        self.tree = ttk.Treeview(root, columns=("De", "Sujet"), show="headings")
+        list_frame = tk.Frame(root)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(list_frame, columns=("De", "Sujet"), show="headings")
         self.tree.heading("De", text="De")
         self.tree.heading("Sujet", text="Sujet")
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.pack(fill=tk.BOTH, expand=True)
+        # Pages suivantes chargées quand on approche du bas de la liste
+        lazy_scroll(self.tree, scrollbar, self.load_more)
 
         self.reply_box = scrolledtext.ScrolledText(root, height=10)
         self.reply_box.pack(fill=tk.X, padx=10, pady=5)
@@ -92,28 +106,87 @@ class GmailApp:
         button_frame.pack(pady=5)
         tk.Button(button_frame, text="✅ Confirmer", command=self.confirm).pack(side=tk.LEFT, padx=5)
         tk.Button(button_frame, text="📝 Modifier", command=self.modify).pack(side=tk.LEFT, padx=5)
-        tk.Button(button_frame, text="🔄 Rafraîchir", command=self.refresh).pack(side=tk.LEFT, padx=5)
+        self.refresh_button = tk.Button(button_frame, text="🔄 Rafraîchir", command=self.refresh)
+        self.refresh_button.pack(side=tk.LEFT, padx=5)
+
+        self.status = StatusBar(root)
+        self.status.pack(fill=tk.X)
 
         self.tree.bind("<<TreeviewSelect>>", self.on_select)
 
-        self.messages = []
-        self.refresh()
+        # Gmail et OpenAI tournent dans l'exécuteur ; le thread Tk ne fait qu'afficher
+        self.tasks = BackgroundTasks(root)
+        # Suggestions des premières lignes générées dès l'affichage de la liste
+        self.prefetcher = SuggestionPrefetcher(root, suggest_reply,
+                                               stream=stream_reply if STREAM_REPLIES else None)
+        root.protocol("WM_DELETE_WINDOW", self.close)
+        self.messages = {}
+        self.store = MessageStore()
+        self.inbox = PagedInbox(list_message_page, lambda ids: fetch_message_rows(ids, self.store))
+        self.load_more()
 
     def refresh(self):
-        self.tree.delete(*self.tree.get_children())
-        self.messages = get_latest_messages()
-        for i, m in enumerate(self.messages):
-            self.tree.insert("", "end", iid=str(i), values=(m["from"], m["subject"]))
-        self.reply_box.delete("1.0", tk.END)
+        # Reliste les pages déjà vues : nouveaux messages ajoutés, messages lus retirés
+        self.refresh_button.config(state=tk.DISABLED)
+        self.status.start("inbox", "⏳ Chargement des messages…")
+        self.tasks.submit("inbox", self.inbox.refresh,
+                          on_done=self.show_messages, on_error=self.refresh_failed)
+
+    def load_more(self):
+        if self.inbox.exhausted or self.tasks.busy("inbox"):
+            return
+        self.status.start("inbox", "⏳ Chargement de la page suivante…")
+        self.tasks.submit("inbox", self.inbox.load_more,
+                          on_done=self.show_messages, on_error=self.refresh_failed)
+
+    def show_messages(self, messages):
+        # Deltas seulement : la ligne sélectionnée garde sa sélection et sa suggestion
+        sync_tree(self.tree, messages, lambda m: m["id"], lambda m: (m["from"], m["subject"]))
+        self.messages = {m["id"]: m for m in messages}
+        self.prefetcher.prefetch([(m["id"], m["snippet"]) for m in messages])
+        if self.tree.focus() not in self.messages:
+            self.status.stop("reply")
+            self.reply_box.delete("1.0", tk.END)
+        self.refresh_button.config(state=tk.NORMAL)
+        more = "" if self.inbox.exhausted else " (défiler pour la suite)"
+        self.status.stop("inbox", f"{len(messages)} message(s){more}")
+        fill_view(self.tree, self.inbox, self.load_more)
+
+    def refresh_failed(self, error):
+        self.refresh_button.config(state=tk.NORMAL)
+        self.status.stop("inbox", f"❌ Gmail : {error}")
 
     def on_select(self, event):
         selected = self.tree.focus()
         if not selected:
             return
-        msg = self.messages[int(selected)]
-        suggestion = generate_reply(msg["snippet"])
+        msg = self.messages[selected]
+        self.reply_box.delete("1.0", tk.END)
+        # Suggestion déjà pré-générée : affichée tout de suite ; sinon demandée en priorité,
+        # et en flux ses morceaux s'ajoutent à la boîte au fil de l'eau
+        if not self.prefetcher.request(msg["id"], msg["snippet"], self.show_reply, self.reply_failed,
+                                       on_delta=self.append_reply):
+            self.status.start("reply", f"⏳ Suggestion pour {msg['from']}…")
+
+    def append_reply(self, delta):
+        self.reply_box.insert(tk.END, delta)
+        self.reply_box.see(tk.END)
+
+    def show_reply(self, suggestion):
         self.reply_box.delete("1.0", tk.END)
         self.reply_box.insert(tk.END, suggestion)
+        self.status.stop("reply", "")
+
+    def reply_failed(self, error):
+        self.reply_box.delete("1.0", tk.END)
+        self.reply_box.insert(tk.END, f"Erreur GPT : {error}")
+        self.status.stop("reply", "")
+
+    def close(self):
+        self.prefetcher.shutdown()
+        self.tasks.shutdown()
+        METRICS.export("session", app="gmail_reply_gui", prefetch=self.prefetcher.stats)
+        self.root.destroy()
 
     def confirm(self):
         messagebox.showinfo("Envoyé", "Réponse confirmée. (À automatiser plus tard)")
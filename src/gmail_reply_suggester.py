@@ -1,113 +1,131 @@
-gmail_reply_suggester.py
+# gmail_reply_suggester.py
 
-import os
-import base64
-import requests
-import openai
+import argparse
 import datetime
-from dotenv import load_dotenv
+import time
 from email.utils import parseaddr
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+
+import core
+from gmail_fetch import iter_message_ids, iter_messages_by_id
+from gmail_sync import HistorySync
+from message_store import MessageStore
+from metrics import METRICS
+from reply_pool import estimate_tokens
 
 # ---------- CHARGER VARIABLES ---------- #
-load_dotenv()
-CLIENT_ID      = os.getenv("CLIENT_ID")
-CLIENT_SECRET  = os.getenv("CLIENT_SECRET")
-REFRESH_TOKEN  = os.getenv("REFRESH_TOKEN")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GOOGLE_SHEET_ID = os.getenv("SHEET_ID")
-USER_ID = "me"
+# src/config.py + .env, chargés une fois par core (SHEET_ID, OPENAI_MODEL… surchargent config.py)
+CONFIG = core.get_config()
+USER_ID = CONFIG["user_id"]
+BATCH_SIZE = CONFIG["gmail_batch_size"]
 
-openai.api_key = OPENAI_API_KEY
+REPLY_CACHE = core.get_reply_cache()
+REPLY_POOL = core.get_reply_pool()
+PROMPT_TRIMMER = core.prompt_trimmer()
 
-KEYWORDS = ["formation", "gardiennage", "prix", "intéressé par la formation"]
+RULES = core.filter_rules()
 
 # ---------- GMAIL ---------- #
 def refresh_token():
-    r = requests.post("https://oauth2.googleapis.com/token", data={
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "refresh_token": REFRESH_TOKEN,
-        "grant_type": "refresh_token",
-    }, timeout=30)
-    r.raise_for_status()
-    return r.json()["access_token"]
+    return core.token_manager().get_token()
 
 def get_gmail_service():
-    creds = Credentials(
-        token=refresh_token(),
-        refresh_token=REFRESH_TOKEN,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-    )
-    return build("gmail", "v1", credentials=creds)
-
-def extract_text(payload):
-    if "parts" in payload:
-        for part in payload["parts"]:
-            if part["mimeType"] == "text/plain":
-                return base64.urlsafe_b64decode(part["body"]["data"]).decode("utf-8", errors="ignore")
-    elif payload["body"] and "data" in payload["body"]:
-        return base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8", errors="ignore")
-    return ""
+    return core.gmail_service()
 
 # ---------- SHEET ---------- #
 def get_sheet():
-    scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-    client = gspread.authorize(creds)
-    return client.open_by_key(GOOGLE_SHEET_ID).sheet1
+    return core.get_sheet_writer()
 
 # ---------- CHATGPT ---------- #
+REPLY_MODEL = CONFIG["reply_model"]
+REPLY_MAX_TOKENS = 300
+PROMPT_TEMPLATE = """Tu es un conseiller pour une école de formation en sécurité. Génère une réponse polie et rassurante à ce message, qui semble vouloir des infos sur la formation :\n\n{text}"""
+
+def cached_reply(text):
+    return REPLY_CACHE.get(text, PROMPT_TEMPLATE, REPLY_MODEL, REPLY_MAX_TOKENS)
+
 def generate_reply(text):
-    prompt = f"""Tu es un conseiller pour une école de formation en sécurité. Génère une réponse polie et rassurante à ce message, qui semble vouloir des infos sur la formation :\n\n{text}"""
-    result = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=300,
-    )
-    return result.choices[0].message.content.strip()
+    # Seulement pour les absents du cache : les réponses connues ne consomment pas le budget OpenAI
+    reply = core.complete([{"role": "user", "content": PROMPT_TEMPLATE.format(text=text)}],
+                          REPLY_MAX_TOKENS, model=REPLY_MODEL)
+    REPLY_CACHE.put(text, PROMPT_TEMPLATE, REPLY_MODEL, REPLY_MAX_TOKENS, reply)
+    return reply
 
 # ---------- MAIN ---------- #
-def main():
+def main(incremental=False):
+    start = time.perf_counter()
     service = get_gmail_service()
     sheet = get_sheet()
-
-    results = service.users().messages().list(userId=USER_ID, q="is:unread", maxResults=10).execute()
-    messages = results.get("messages", [])
-
-    if not messages:
-        print("✅ Aucun courriel non lu détecté.")
-        return
-
-    for msg_meta in messages:
-        msg_id = msg_meta["id"]
-        msg = service.users().messages().get(userId=USER_ID, id=msg_id, format="full").execute()
-        payload = msg["payload"]
-        headers = {h["name"]: h["value"] for h in payload["headers"]}
-        sender_name, sender_email = parseaddr(headers.get("From", ""))
-        subject = headers.get("Subject", "(Aucun sujet)")
-        body = extract_text(payload)
+    store = MessageStore()
+
+    sync = None
+    if incremental:
+        sync = HistorySync(service, cursor_path="history_cursor_suggester.json")
+        ids = sync.poll()
+    else:
+        ids = iter_message_ids(service, q=RULES.query())
+    ids = (msg_id for msg_id in ids if not sheet.is_known(msg_id))
+    fetch_stats = {"metadata": 0, "full": 0, "rejected": 0, "failed": []}
+    messages = iter_messages_by_id(service, ids, batch_size=BATCH_SIZE, store=store, stats=fetch_stats)
+
+    seen = 0
+    candidates = []
+    for msg in messages:
+        seen += 1
+        body = msg["body"]
 
         if not body:
             continue
 
-        if any(k in body.lower() for k in KEYWORDS):
-            suggested_reply = generate_reply(body)
-            detected = ", ".join(k for k in KEYWORDS if k in body.lower())
-            now = datetime.datetime.now().strftime("%Y-%m-%d")
+        detected = RULES.matching_keywords(body)
+        if detected:
+            candidates.append((msg, detected))
+
+    prompts = [PROMPT_TRIMMER.trim(m["body"]) for m, _ in candidates]
+    if prompts:
+        print(PROMPT_TRIMMER.summary())
+    with METRICS.span("generate"):
+        replies = REPLY_POOL.map(generate_reply, prompts,
+                                 cost=lambda body: estimate_tokens(PROMPT_TEMPLATE) + estimate_tokens(body)
+                                 + REPLY_MAX_TOKENS, cached=cached_reply)
+
+    failed = 0
+    for (msg, detected), suggested_reply in zip(candidates, replies):
+        msg_id = msg["id"]
+        sender_name, sender_email = parseaddr(msg["from"])
+        subject = msg["subject"] or "(Aucun sujet)"
+        body = msg["body"]
+        if isinstance(suggested_reply, Exception):
+            print(f"❌ Échec de génération pour : {sender_email} ({suggested_reply})")
+            METRICS.inc("messages_total", outcome="failed")
+            failed += 1
+            continue
 
-            sheet.append_row([
-                now, msg_id, sender_name, sender_email,
-                subject, body, detected,
-                "formation", suggested_reply,
-                "À valider", "", "", "Oui"
-            ])
-            print(f"📝 Suggestion ajoutée pour : {sender_email}")
+        now = datetime.datetime.now().strftime("%Y-%m-%d")
+
+        sheet.append([
+            now, msg_id, sender_name, sender_email,
+            subject, body, ", ".join(detected),
+            "formation", suggested_reply,
+            "À valider", "", "", "Oui"
+        ])
+        print(f"📝 Suggestion ajoutée pour : {sender_email}")
+        METRICS.inc("messages_total", outcome="suggested")
+
+    sheet.flush()
+    if sync:
+        sync.commit(failed=failed + len(fetch_stats["failed"]))
+    if not seen:
+        print("✅ Aucun courriel non lu détecté.")
+    elapsed = time.perf_counter() - start
+    METRICS.observe("stage_seconds", elapsed, stage="cycle")
+    METRICS.inc("messages_total", seen, outcome="seen")
+    METRICS.set("last_cycle_timestamp_seconds", round(time.time()))
+    METRICS.set("last_cycle_duration_seconds", round(elapsed, 3))
+    METRICS.export("cycle", script="gmail_reply_suggester", seen=seen, candidates=len(candidates),
+                   seconds=round(elapsed, 3))
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true",
+                        help="synchronisation incrémentale via l'historique Gmail")
+    main(incremental=parser.parse_args().incremental)
@@ -0,0 +1,114 @@
+"""
+Synchronisation incrémentale de la boîte via users().history().list et un curseur persistant
+"""
+import json
+import os
+
+from gmail_fetch import USER_ID, http_status, iter_message_ids
+from metrics import METRICS
+
+CURSOR_PATH = "history_cursor.json"
+RESYNC_LIMIT = 200   # nombre max de messages repris lors d'une resynchronisation complète
+
+
+def load_cursor(path=CURSOR_PATH):
+    """Retourne le dernier historyId enregistré, ou None"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("historyId")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_cursor(history_id, path=CURSOR_PATH):
+    """Écrit le curseur de façon atomique (fichier temporaire + rename)"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"historyId": str(history_id)}, f)
+    os.replace(tmp, path)
+
+
+def list_added_since(service, start_history_id, label_id="INBOX", user_id=USER_ID):
+    """Retourne (ids des messages ajoutés depuis le curseur, nouvel historyId).
+
+    Lève l'erreur HTTP 404 de Gmail si le curseur a expiré.
+    """
+    ids, seen = [], set()
+    latest = start_history_id
+    page_token = None
+    while True:
+        kwargs = {"userId": user_id, "startHistoryId": start_history_id,
+                  "historyTypes": ["messageAdded"], "maxResults": 500}
+        if label_id:
+            kwargs["labelId"] = label_id
+        if page_token:
+            kwargs["pageToken"] = page_token
+        with METRICS.span("gmail_list"):
+            res = service.users().history().list(**kwargs).execute()
+        METRICS.inc("gmail_api_calls_total", method="history.list")
+        for record in res.get("history", []):
+            for added in record.get("messagesAdded", []):
+                msg = added["message"]
+                if msg["id"] in seen or "UNREAD" not in msg.get("labelIds", ["UNREAD"]):
+                    continue
+                seen.add(msg["id"])
+                ids.append(msg["id"])
+        latest = res.get("historyId", latest)
+        page_token = res.get("nextPageToken")
+        if not page_token:
+            return ids, latest
+
+
+class HistorySync:
+    """Curseur de synchronisation incrémentale.
+
+    poll() retourne les IDs des nouveaux messages non lus ; commit() enregistre
+    le curseur une fois le traitement terminé, pour ne rien perdre en cas d'arrêt.
+    commit(failed=n) avec n > 0 garde l'ancien curseur : le prochain poll reprend
+    le même delta, les messages déjà consignés étant écartés par la feuille.
+    """
+
+    def __init__(self, service, cursor_path=CURSOR_PATH, resync_query="is:unread",
+                 resync_limit=RESYNC_LIMIT, user_id=USER_ID):
+        self.service = service
+        self.cursor_path = cursor_path
+        self.resync_query = resync_query
+        self.resync_limit = resync_limit
+        self.user_id = user_id
+        self.pending_history_id = None
+        self.last_poll_was_resync = False
+
+    def poll(self):
+        cursor = load_cursor(self.cursor_path)
+        if cursor is not None:
+            try:
+                ids, latest = list_added_since(self.service, cursor, user_id=self.user_id)
+                self.pending_history_id = latest
+                self.last_poll_was_resync = False
+                return ids
+            except Exception as e:
+                if http_status(e) != 404:
+                    raise
+                print("⚠️ Curseur d'historique expiré : resynchronisation complète")
+        return self.full_resync()
+
+    def full_resync(self):
+        """Liste au plus resync_limit messages non lus et repart du historyId courant"""
+        # Le historyId est lu avant le listing : un message arrivé entre les deux
+        # sera revu au prochain poll plutôt que perdu.
+        profile = self.service.users().getProfile(userId=self.user_id).execute()
+        METRICS.inc("gmail_api_calls_total", method="getProfile")
+        ids = list(iter_message_ids(self.service, q=self.resync_query,
+                                    limit=self.resync_limit, user_id=self.user_id))
+        self.pending_history_id = profile["historyId"]
+        self.last_poll_was_resync = True
+        return ids
+
+    def commit(self, failed=0):
+        if failed:
+            print(f"⚠️ {failed} message(s) en échec : curseur d'historique conservé pour les reprendre")
+            self.pending_history_id = None
+            return
+        if self.pending_history_id is not None:
+            save_cursor(self.pending_history_id, self.cursor_path)
+            self.pending_history_id = None
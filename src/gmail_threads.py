@@ -0,0 +1,108 @@
+"""
+Traitement par conversation : un fil Gmail (threadId) = une suggestion, à partir du dernier message non lu
+"""
+from email.utils import parseaddr
+
+from gmail_fetch import (DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, USER_ID, fetch_batch, iter_messages_by_id,
+                         parse_message)
+
+CONTEXT_MESSAGES = 3      # messages précédents repris dans le prompt
+CONTEXT_CHARS = 200       # par message : le snippet Gmail suffit
+THREAD_HEADERS = ["From", "Subject", "Date"]
+
+
+class Conversation:
+    """Fil avec au moins un message non lu.
+
+    messages : tout le fil en métadonnées (From, Subject, snippet), du plus ancien
+    au plus récent ; latest : dernier message non lu, téléchargé en entier ;
+    unread_ids : tous les messages non lus couverts par la même suggestion.
+    """
+
+    def __init__(self, thread_id, messages, latest, unread_ids):
+        self.id = thread_id
+        self.messages = messages
+        self.latest = latest
+        self.unread_ids = unread_ids
+
+    @property
+    def depth(self):
+        return len(self.messages)
+
+    def context(self, max_messages=CONTEXT_MESSAGES, max_chars=CONTEXT_CHARS):
+        """Messages précédant le dernier non lu, résumés en une ligne chacun"""
+        earlier = [m for m in self.messages if m["id"] != self.latest["id"]
+                   and m["internalDate"] <= self.latest["internalDate"]][-max_messages:]
+        lines = []
+        for m in earlier:
+            name, email = parseaddr(m["from"])
+            snippet = " ".join(m["snippet"].split())[:max_chars]
+            lines.append(f"- {name or email} : {snippet}")
+        return "\n".join(lines)
+
+    def prompt_body(self, body, max_messages=CONTEXT_MESSAGES):
+        """Corps du dernier message, précédé d'un court rappel du fil s'il y en a un"""
+        context = self.context(max_messages) if max_messages else ""
+        if not context:
+            return body
+        return f"Échanges précédents dans ce fil (résumé) :\n{context}\n\nDernier message :\n{body}"
+
+
+def thread_ids_for(service, message_ids, user_id=USER_ID, failed=None):
+    """threadId des messages donnés (format=minimal, par lots), sans doublon, dans l'ordre"""
+    thread_ids = []
+    message_ids = list(message_ids)
+    for i in range(0, len(message_ids), MAX_BATCH_SIZE):
+        for raw in fetch_batch(service, message_ids[i:i + MAX_BATCH_SIZE], fmt="minimal", user_id=user_id,
+                               failed=failed):
+            if raw["threadId"] not in thread_ids:
+                thread_ids.append(raw["threadId"])
+    return thread_ids
+
+
+def _conversations_chunk(service, chunk, user_id, store, triage, known, stats):
+    pending = []
+    for raw in fetch_batch(service, chunk, fmt="metadata", metadata_headers=THREAD_HEADERS,
+                           user_id=user_id, resource="threads", failed=stats.setdefault("failed", [])):
+        messages = sorted((parse_message(m) for m in raw.get("messages", [])),
+                          key=lambda m: m["internalDate"])
+        stats["metadata"] += len(messages)
+        unread = [m for m in messages if "UNREAD" in m["labelIds"] and "SENT" not in m["labelIds"]]
+        if not unread:
+            continue
+        if known and known(unread[-1]["id"]):
+            continue
+        if triage and not triage(unread[-1]):
+            stats["rejected"] += 1
+            continue
+        pending.append((raw["id"], messages, unread))
+    # Seul le dernier message non lu de chaque fil est téléchargé en entier
+    latest = {m["id"]: m for m in iter_messages_by_id(service, [u[-1]["id"] for _, _, u in pending],
+                                                      batch_size=MAX_BATCH_SIZE, user_id=user_id,
+                                                      store=store, stats=stats)}
+    for thread_id, messages, unread in pending:
+        if unread[-1]["id"] in latest:
+            yield Conversation(thread_id, messages, latest[unread[-1]["id"]], [m["id"] for m in unread])
+
+
+def iter_conversations(service, thread_ids, batch_size=DEFAULT_BATCH_SIZE, user_id=USER_ID,
+                       store=None, triage=None, known=None, stats=None):
+    """Conversations non lues des fils donnés.
+
+    Un batch threads().get(format=metadata) par lot de fils, puis un batch
+    format=full pour le seul dernier message non lu de chaque fil retenu.
+    triage(msg) -> bool s'applique à ce dernier message, comme dans
+    iter_messages_by_id ; known(msg_id) -> bool écarte, avant tout téléchargement
+    du corps, les fils dont ce dernier message est déjà traité. stats compte
+    messages en métadonnées, corps et rejets.
+    """
+    stats = stats if stats is not None else {"metadata": 0, "full": 0, "rejected": 0, "failed": []}
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    chunk = []
+    for thread_id in thread_ids:
+        chunk.append(thread_id)
+        if len(chunk) >= batch_size:
+            yield from _conversations_chunk(service, chunk, user_id, store, triage, known, stats)
+            chunk = []
+    if chunk:
+        yield from _conversations_chunk(service, chunk, user_id, store, triage, known, stats)
@@ -0,0 +1,134 @@
+"""
+Détection de mots-clés en une seule passe : termes compilés en trie-regex, texte normalisé une fois
+"""
+import re
+import unicodedata
+from collections import namedtuple
+
+from src.config import DEFAULT_CONFIG
+
+KeywordHit = namedtuple("KeywordHit", "keyword term start end")
+
+
+_COMBINING = re.compile("[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]")
+_folded_chars = {}   # caractère → forme normalisée, pour retrouver les positions d'origine
+
+
+def normalize(text):
+    """« Intéressé » → « interesse » ; « ﬁ » → « fi » ; « ß » → « ss »"""
+    if text.isascii():
+        return text.lower()
+    return _COMBINING.sub("", unicodedata.normalize("NFKD", text)).casefold()
+
+
+def _fold_char(char):
+    folded = _folded_chars.get(char)
+    if folded is None:
+        folded = _folded_chars[char] = normalize(char)
+    return folded
+
+
+def _offset_map(text):
+    """positions[i] = index dans text du caractère i du texte normalisé.
+
+    None quand chaque caractère donne exactement un caractère (cas courant :
+    lettres accentuées précomposées), les positions étant alors identiques.
+    """
+    if text.isascii() or all(len(_fold_char(c)) == 1 for c in set(text)):
+        return None
+    positions = []
+    for i, char in enumerate(text):
+        positions.extend([i] * len(_fold_char(char)))
+    positions.append(len(text))
+    return positions
+
+
+def _trie_pattern(node):
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # Terme complet ici mais d'autres le prolongent : la branche devient optionnelle
+        return ("(?:" + pattern + ")?") if len(branches) == 1 else pattern + "?"
+    return pattern
+
+
+class KeywordMatcher:
+    """Mots-clés (et synonymes par catégorie) compilés une fois en une regex factorisée.
+
+    Le texte est normalisé une seule fois (NFKD, accents retirés, casefold) :
+    « interesse », « Formations » et « GARDIENNAGE » sont reconnus. scan()
+    renvoie chaque occurrence avec sa position dans le texte d'origine, y
+    compris les termes qui se chevauchent (« formation » dans « intéressé par
+    la formation »). Comme l'ancienne vérification, la correspondance porte
+    sur des sous-chaînes et non sur des mots entiers.
+    """
+
+    def __init__(self, keywords=(), synonyms=None):
+        self.keywords = list(dict.fromkeys(keywords))
+        self.terms = {}   # terme normalisé → mot-clé (catégorie) d'origine
+        for keyword in self.keywords:
+            self.terms.setdefault(normalize(keyword), keyword)
+        for keyword, words in (synonyms or {}).items():
+            if keyword not in self.keywords:
+                self.keywords.append(keyword)
+            self.terms.setdefault(normalize(keyword), keyword)
+            for word in words:
+                self.terms.setdefault(normalize(word), keyword)
+        self.terms.pop("", None)
+        self._order = {k: i for i, k in enumerate(self.keywords)}
+
+        trie = {}
+        for term in self.terms:
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        # Un terme qui en prolonge un autre au même endroit masque le plus court :
+        # on précalcule les préfixes pour les rapporter aussi
+        self._prefixes = {t: [p for p in self.terms if t.startswith(p)] for t in self.terms}
+        pattern = _trie_pattern(trie)
+        self.regex = re.compile(pattern) if pattern else None
+
+    @classmethod
+    def from_config(cls, config=DEFAULT_CONFIG, keywords=None, synonyms=None):
+        if keywords is None:
+            keywords = config.get("keywords", [])
+        if synonyms is None:
+            synonyms = config.get("keyword_synonyms", {})
+        return cls(keywords, synonyms)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def scan(self, text):
+        """Toutes les occurrences, triées par position : [KeywordHit(keyword, term, start, end)]"""
+        if not self.regex or not text:
+            return []
+        folded = normalize(text)
+        found = []
+        match = self.regex.search(folded)
+        while match:
+            found.extend((match.start(), term) for term in self._prefixes[match.group()])
+            # Reprise au caractère suivant et non après l'occurrence : termes chevauchants
+            match = self.regex.search(folded, match.start() + 1)
+        if not found:
+            return []
+        positions = _offset_map(text)
+        hits = []
+        for start, term in found:
+            end = start + len(term)
+            if positions:
+                start, end = positions[start], positions[end - 1] + 1
+            hits.append(KeywordHit(self.terms[term], term, start, end))
+        return hits
+
+    def matching(self, text):
+        """Mots-clés détectés, sans doublon, dans l'ordre de déclaration"""
+        keywords = {hit.keyword for hit in self.scan(text)}
+        return sorted(keywords, key=self._order.__getitem__)
+
+    def search(self, text):
+        """True dès la première occurrence (pas de liste de positions)"""
+        return bool(self.regex and text and self.regex.search(normalize(text)))
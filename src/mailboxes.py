@@ -0,0 +1,150 @@
+"""
+Plusieurs boîtes Gmail dans un seul processus : une par thread, budgets OpenAI et Sheets partagés
+
+accounts.json est une liste d'objets, un par boîte :
+
+    [
+      {"name": "academie", "refresh_token": "$ACADEMIE_REFRESH_TOKEN",
+       "sheet_id": "1AbC…", "processed_label": "Traité", "mark_processed_read": true},
+      {"name": "info", "refresh_token": "$INFO_REFRESH_TOKEN", "sheet_id": "1DeF…",
+       "worksheet_name": "Suivi", "elite_sender": "", "ignored_senders": ["factures@"]}
+    ]
+
+Une valeur qui commence par « $ » est lue dans la variable d'environnement du
+même nom (les secrets restent dans .env). Les champs absents reprennent la
+configuration commune (client OAuth, feuille, labels, règles de config.py).
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import core
+import gmail_chatgpt_auto_reply as pipeline
+from gmail_labels import LabelQueue, LabelRegistry
+from gmail_sync import HistorySync
+from message_store import MessageStore
+from token_manager import TokenManager, get_gmail_service
+
+FIELDS = ("name", "client_id", "client_secret", "refresh_token", "sheet_id", "worksheet_name",
+          "processed_label", "mark_processed_read", "elite_sender", "ignored_senders", "keywords")
+
+
+def _resolve(value):
+    """« $NOM » → os.environ["NOM"] (après chargement du .env par core)"""
+    if isinstance(value, str) and value.startswith("$"):
+        return os.getenv(value[1:])
+    return value
+
+
+class Mailbox:
+    """Identifiants et politique d'une boîte ; tout son état local lui est propre.
+
+    Jeton d'accès, cache de messages, curseur d'historique, feuille, registre
+    et file de labels sont séparés par boîte : l'échec de l'une n'atteint pas
+    les autres. Le pool OpenAI, le cache de réponses et le budget Sheets sont
+    ceux de core, communs à toutes les boîtes du processus.
+    """
+
+    def __init__(self, name, refresh_token, client_id=None, client_secret=None, sheet_id=None,
+                 worksheet_name=None, processed_label=None, mark_processed_read=None,
+                 elite_sender=None, ignored_senders=(), keywords=None):
+        config = core.get_config()
+        self.name = name
+        self.refresh_token = refresh_token
+        self.client_id = client_id or config["client_id"]
+        self.client_secret = client_secret or config["client_secret"]
+        self.sheet_id = sheet_id or config["sheet_id"]
+        self.worksheet_name = worksheet_name or config["worksheet_name"]
+        self.processed_label = config["processed_label"] if processed_label is None else processed_label
+        self.mark_processed_read = (config["mark_processed_read"] if mark_processed_read is None
+                                    else bool(mark_processed_read))
+        self.elite_sender = (config["elite_sender"] if elite_sender is None else elite_sender).lower()
+        self.ignored_senders = list(ignored_senders)
+        self.keywords = keywords
+        self.token_manager = TokenManager(self.client_id, self.client_secret, refresh_token,
+                                          cache_path=f"access_token_{name}.json")
+
+    @classmethod
+    def from_dict(cls, data):
+        unknown = set(data) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Champs inconnus pour la boîte {data.get('name')!r} : {sorted(unknown)}")
+        values = {k: _resolve(v) for k, v in data.items()}
+        if not values.get("name") or not values.get("refresh_token"):
+            raise ValueError(f"Boîte sans name ou refresh_token : {data.get('name')!r}")
+        return cls(**values)
+
+    @property
+    def store_path(self):
+        return f"messages_{self.name}.db"
+
+    @property
+    def cursor_path(self):
+        return f"history_cursor_{self.name}.json"
+
+    def gmail_service(self):
+        """Service Gmail du thread courant pour ce compte"""
+        return get_gmail_service(self.token_manager)
+
+    def account(self):
+        """État de cycle de la boîte pour pipeline.run_cycle"""
+        return pipeline.Account(
+            core.sheet_writer(self.sheet_id, self.worksheet_name),
+            LabelQueue(LabelRegistry()),
+            core.filter_rules(ignored_senders=self.ignored_senders, keywords=self.keywords),
+            name=self.name,
+            elite_sender=self.elite_sender,
+            processed_label=self.processed_label,
+            mark_processed_read=self.mark_processed_read,
+        )
+
+
+def load_mailboxes(path):
+    """Liste de Mailbox depuis un fichier JSON ; les noms servent de clés et doivent être uniques"""
+    with open(path, encoding="utf-8") as f:
+        mailboxes = [Mailbox.from_dict(data) for data in json.load(f)]
+    names = [m.name for m in mailboxes]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"Noms de boîtes en double dans {path} : {duplicates}")
+    return mailboxes
+
+
+def run_mailbox(mailbox, incremental=False, threads=False):
+    """Un cycle complet pour une boîte, avec ses propres clients (créés dans le thread appelant)"""
+    service = mailbox.gmail_service()
+    store = MessageStore(mailbox.store_path)
+    account = mailbox.account()
+    try:
+        sync = HistorySync(service, cursor_path=mailbox.cursor_path) if incremental else None
+        return pipeline.run_cycle(service, store, sync, threads=threads, account=account)
+    finally:
+        account.sheet_writer.close()
+        store.close()
+
+
+def run_mailboxes(mailboxes, workers=None, incremental=False, threads=False):
+    """Traite toutes les boîtes en parallèle ; retourne {nom: stats ou exception}.
+
+    Des threads plutôt que des processus : le RateLimiter OpenAI et celui de
+    Sheets ne sont partagés qu'à l'intérieur d'un processus, et le travail est
+    surtout de l'attente réseau. Une boîte en échec est signalée sans
+    interrompre les autres.
+    """
+    results = {}
+    if not mailboxes:
+        return results
+    with ThreadPoolExecutor(max_workers=workers or len(mailboxes),
+                            thread_name_prefix="mailbox") as executor:
+        futures = {m.name: executor.submit(run_mailbox, m, incremental, threads) for m in mailboxes}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"❌ [{name}] Cycle en échec : {e}")
+                results[name] = e
+    pipeline.REPLY_CACHE.save()
+    ok = [r for r in results.values() if not isinstance(r, Exception)]
+    print(f"📬 {len(ok)}/{len(results)} boîtes traitées : {sum(r['seen'] for r in ok)} examinés, "
+          f"{sum(r['suggested'] for r in ok)} suggestions")
+    return results
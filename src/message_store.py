@@ -0,0 +1,139 @@
+"""
+Cache local persistant (SQLite) des messages Gmail parsés, indexé par ID de message
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from metrics import METRICS
+from mime_text import EXTRACTOR_VERSION
+
+STORE_PATH = "messages.db"
+MAX_ENTRIES = 5000
+
+
+class MessageStore:
+    """Les messages Gmail sont immuables : une entrée n'est jamais invalidée.
+
+    Seuls les labels changent ; update_labels() permet de les rafraîchir sans
+    retélécharger le corps. Au-delà de max_entries, les entrées les moins
+    récemment consultées sont évincées. Le fichier porte la version de
+    l'extracteur de texte (PRAGMA user_version) : un cache écrit par une
+    version antérieure est vidé à l'ouverture.
+    """
+
+    def __init__(self, path=STORE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS messages (
+            id TEXT PRIMARY KEY,
+            thread_id TEXT,
+            internal_date INTEGER,
+            labels TEXT,
+            data TEXT,
+            last_access REAL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON messages(last_access)")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version < EXTRACTOR_VERSION:
+            # Corps extraits par l'ancien code (ex. vides pour les multipart imbriqués) : retéléchargés
+            dropped = self.db.execute("DELETE FROM messages").rowcount
+            if dropped:
+                print(f"🧹 Cache de messages vidé ({dropped} entrées) : extracteur de texte "
+                      f"v{version} → v{EXTRACTOR_VERSION}")
+            self.db.execute(f"PRAGMA user_version = {EXTRACTOR_VERSION}")
+        self.db.commit()
+        self.count = self.db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    # ---------- Lecture ---------- #
+    def get(self, msg_id):
+        return self.get_many([msg_id]).get(msg_id)
+
+    def get_many(self, ids):
+        """Retourne {id: message} pour les IDs présents (compte hits et misses)"""
+        ids = list(ids)
+        if not ids:
+            return {}
+        found = {}
+        with self.lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self.db.execute(
+                    f"SELECT id, labels, data FROM messages WHERE id IN ({marks})", chunk)
+                for msg_id, labels, data in rows:
+                    msg = json.loads(data)
+                    msg["labelIds"] = json.loads(labels)
+                    found[msg_id] = msg
+                self.db.execute(f"UPDATE messages SET last_access = ? WHERE id IN ({marks})",
+                                [time.time(), *chunk])
+            self.db.commit()
+            self.hits += len(found)
+            self.misses += len(ids) - len(found)
+        METRICS.inc("cache_requests_total", len(found), cache="messages", result="hit")
+        METRICS.inc("cache_requests_total", len(ids) - len(found), cache="messages", result="miss")
+        return found
+
+    def __contains__(self, msg_id):
+        with self.lock:
+            row = self.db.execute("SELECT 1 FROM messages WHERE id = ?", (msg_id,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.count
+
+    # ---------- Écriture ---------- #
+    def put(self, msg):
+        self.put_many([msg])
+
+    def put_many(self, messages):
+        rows = [(m["id"], m.get("threadId", ""), m.get("internalDate", 0),
+                 json.dumps(m.get("labelIds", [])), json.dumps(m), time.time())
+                for m in messages]
+        if not rows:
+            return
+        with self.lock:
+            before = self.db.total_changes
+            self.db.executemany(
+                "INSERT OR IGNORE INTO messages (id, thread_id, internal_date, labels, data, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.count += self.db.total_changes - before
+            self._evict()
+            self.db.commit()
+
+    def update_labels(self, labels_by_id):
+        """Met à jour les labels {id: [labelIds]} sans toucher au contenu"""
+        with self.lock:
+            self.db.executemany("UPDATE messages SET labels = ? WHERE id = ?",
+                                [(json.dumps(labels), msg_id) for msg_id, labels in labels_by_id.items()])
+            self.db.commit()
+
+    def _evict(self):
+        excess = self.count - self.max_entries
+        if excess <= 0:
+            return
+        self.db.execute("DELETE FROM messages WHERE id IN "
+                        "(SELECT id FROM messages ORDER BY last_access ASC LIMIT ?)", (excess,))
+        self.count -= excess
+        self.evictions += excess
+
+    # ---------- Statistiques ---------- #
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": self.count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,234 @@
+"""
+Métriques du pipeline : durées par étape, compteurs d'appels API, export en JSON et en texte Prometheus
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "xguard_"
+LOG_PATH = os.getenv("METRICS_LOG", "")      # une ligne JSON par cycle / opération ; "-" = stderr
+PROM_PATH = os.getenv("METRICS_FILE", "")    # fichier texte Prometheus (node_exporter textfile)
+
+HELP = {
+    "stage_seconds": "Durée des étapes du pipeline",
+    "stage_errors_total": "Étapes terminées par une exception",
+    "gmail_api_calls_total": "Appels HTTP à l'API Gmail (un batch = un appel)",
+    "gmail_batch_items_total": "Sous-requêtes envoyées dans des batchs Gmail",
+    "gmail_retries_total": "Sous-requêtes Gmail rejouées après 429/5xx",
+    "openai_requests_total": "Complétions OpenAI demandées",
+    "openai_tokens_total": "Jetons OpenAI consommés (champ usage)",
+    "openai_retries_total": "Appels OpenAI rejoués après 429/5xx",
+    "cache_requests_total": "Consultations des caches (réponses, messages)",
+    "sheets_api_calls_total": "Appels à l'API Google Sheets",
+    "sheets_rows_total": "Lignes écrites dans la feuille",
+    "messages_total": "Messages traités par résultat",
+    "cycles_total": "Cycles du démon par résultat",
+    "last_cycle_timestamp_seconds": "Fin du dernier cycle (epoch)",
+    "last_cycle_duration_seconds": "Durée du dernier cycle",
+}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _stage_name(labels):
+    """stage="generate", app="gui" -> 'generate{app="gui"}' pour les lignes JSON"""
+    others = tuple((k, v) for k, v in labels if k != "stage")
+    return dict(labels).get("stage", "") + _format_labels(others)
+
+
+def _usage(response):
+    """Champ usage d'une réponse openai<1.0 (OpenAIObject ou dict) ou d'un objet openai>=1.0"""
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    if not isinstance(usage, dict):
+        usage = {k: getattr(usage, k, 0) for k in ("prompt_tokens", "completion_tokens")}
+    return usage
+
+
+class Metrics:
+    """Compteurs, jauges et durées en mémoire, partagés par tous les threads du processus.
+
+    span(étape) chronomètre un bloc ; les étapes sont mesurées là où le travail
+    a lieu (listing, batch, décodage, appel OpenAI, écriture Sheets), ce qui
+    reste juste avec les générateurs paresseux du pipeline. export() écrit une
+    ligne JSON (durées et compteurs depuis l'export précédent) et réécrit le
+    fichier Prometheus ; serve(port) expose le même texte sur /metrics.
+    """
+
+    def __init__(self, log_path=LOG_PATH, prom_path=PROM_PATH, prefix=PREFIX):
+        self.log_path = log_path
+        self.prom_path = prom_path
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}     # (nom, labels) -> valeur
+        self.gauges = {}
+        self.timings = {}      # (nom, labels) -> [nombre, somme, max]
+        self.exported = ({}, {})
+        self.httpd = None
+
+    # ---------- Enregistrement ---------- #
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            timing = self.timings.setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextmanager
+    def span(self, stage, log=False, **labels):
+        """Chronomètre un bloc dans stage_seconds{stage=…} ; log=True écrit aussi une ligne JSON"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("stage_seconds", elapsed, stage=stage, **labels)
+            if error:
+                self.inc("stage_errors_total", stage=stage, **labels)
+            if log:
+                self.log("span", stage=stage, seconds=round(elapsed, 4), error=error, **labels)
+
+    def record_completion(self, response, model):
+        """Compte une complétion OpenAI et les jetons de son champ usage"""
+        self.inc("openai_requests_total", model=model)
+        usage = _usage(response)
+        for kind in ("prompt", "completion"):
+            if usage.get(f"{kind}_tokens"):
+                self.inc("openai_tokens_total", usage[f"{kind}_tokens"], model=model, kind=kind)
+
+    # ---------- Lecture ---------- #
+    def snapshot(self):
+        """{"counters": {...}, "gauges": {...}, "timings": {...}} avec des clés nom{labels}"""
+        with self.lock:
+            return {
+                "counters": {n + _format_labels(l): v for (n, l), v in self.counters.items()},
+                "gauges": {n + _format_labels(l): v for (n, l), v in self.gauges.items()},
+                "timings": {n + _format_labels(l): {"count": c, "sum": round(s, 4), "max": round(m, 4)}
+                            for (n, l), (c, s, m) in self.timings.items()},
+            }
+
+    def _since_export(self):
+        """Durées par étape et compteurs depuis le dernier export"""
+        counters, stages = self.exported
+        with self.lock:
+            current = dict(self.counters)
+            current_stages = {_stage_name(l): s for (n, l), (_, s, _) in self.timings.items()
+                              if n == "stage_seconds"}
+            self.exported = (current, current_stages)
+        return ({s: round(v - stages.get(s, 0.0), 4) for s, v in current_stages.items()
+                 if v - stages.get(s, 0.0) > 0},
+                {n + _format_labels(l): v - counters.get((n, l), 0) for (n, l), v in current.items()
+                 if v != counters.get((n, l), 0)})
+
+    def prometheus(self):
+        """Format texte d'exposition Prometheus"""
+        lines, typed = [], set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {self.prefix}{name} {HELP[name]}")
+                lines.append(f"# TYPE {self.prefix}{name} {kind}")
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                header(name, "counter")
+                lines.append(f"{self.prefix}{name}{_format_labels(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                header(name, "gauge")
+                lines.append(f"{self.prefix}{name}{_format_labels(labels)} {value}")
+            for (name, labels), (count, total, _) in sorted(self.timings.items()):
+                header(name, "summary")
+                lines.append(f"{self.prefix}{name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{self.prefix}{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    # ---------- Export ---------- #
+    def log(self, event, **fields):
+        """Ligne JSON vers METRICS_LOG (rien si non configuré)"""
+        if not self.log_path:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, ensure_ascii=False)
+        with self.lock:
+            if self.log_path == "-":
+                print(line, file=sys.stderr, flush=True)
+            else:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def write_prometheus(self, path=None):
+        path = path or self.prom_path
+        if not path:
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+    def export(self, event="cycle", **fields):
+        """Fin de cycle : ligne JSON (étapes et compteurs du cycle) + fichier Prometheus"""
+        stages, counters = self._since_export()
+        self.log(event, stages=stages, counters=counters, **fields)
+        try:
+            self.write_prometheus()
+        except OSError as e:
+            print(f"⚠️ Fichier de métriques non écrit ({self.prom_path}) : {e}")
+
+    def serve(self, port, host=""):
+        """Expose prometheus() sur http://host:port/metrics dans un thread démon"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        print(f"📈 Métriques Prometheus sur http://{host or '0.0.0.0'}:{self.httpd.server_port}/metrics")
+        return self.httpd
+
+    def close(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+# Instance unique du processus : tous les modules y enregistrent leurs mesures
+METRICS = Metrics()
@@ -0,0 +1,109 @@
+"""
+Extraction du corps texte d'une ressource Gmail : parcours MIME itératif, décodage paresseux, repli HTML
+"""
+import base64
+import binascii
+import html
+import re
+
+MAX_BODY_BYTES = 256 * 1024   # au-delà, le corps est tronqué (les réponses GPT n'en lisent pas plus)
+# À incrémenter quand extract_text change de résultat : les corps déjà en cache (message_store) sont rejetés
+EXTRACTOR_VERSION = 2
+
+_CHARSET = re.compile(r'charset\s*=\s*"?([\w.:-]+)', re.IGNORECASE)
+_HTML_DROP = re.compile(r"<(script|style|head|title)\b.*?</\1\s*>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+_HTML_BREAK = re.compile(r"<\s*(br|/p|/div|/li|/tr|/h[1-6]|/blockquote)\b[^>]*>", re.IGNORECASE)
+_HTML_TAG = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"[ \t\r\f\v\u00a0]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def _header(part, name):
+    name = name.lower()
+    for h in part.get("headers", []) or []:
+        if h.get("name", "").lower() == name:
+            return h.get("value", "")
+    return ""
+
+
+def _is_attachment(part):
+    return bool(part.get("filename")) or _header(part, "Content-Disposition").lower().startswith("attachment")
+
+
+def find_body_parts(payload):
+    """Parcours en profondeur (pile, sans récursion) : retourne (partie text/plain, partie text/html).
+
+    Les premières parties de chaque type dans l'ordre du document sont retenues ;
+    les pièces jointes (filename ou Content-Disposition: attachment) sont ignorées,
+    ce qui couvre multipart/alternative imbriqué dans multipart/mixed (iPhone, Outlook).
+    """
+    plain = html_part = None
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        mime_type = (part.get("mimeType") or "").lower()
+        children = part.get("parts") or []
+        if children:
+            # Ordre inverse sur la pile pour visiter les enfants dans l'ordre du document
+            stack.extend(reversed(children))
+        elif _is_attachment(part):
+            continue
+        elif mime_type == "text/plain" and plain is None:
+            plain = part
+        elif mime_type == "text/html" and html_part is None:
+            html_part = part
+    if plain is None and html_part is None and not payload.get("parts"):
+        # Message simple d'un autre type (text/calendar, etc.) : on garde son corps
+        plain = payload
+    return plain, html_part
+
+
+def _b64decode(data, max_bytes):
+    if max_bytes:
+        # 4 caractères base64 → 3 octets : on ne décode que le nécessaire
+        data = data[:(max_bytes + 2) // 3 * 4]
+    data = data.rstrip("=")
+    try:
+        return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except (binascii.Error, ValueError):
+        return b""
+
+
+def decode_part(part, fetch_attachment=None, max_bytes=MAX_BODY_BYTES):
+    """Décode une seule partie selon son charset ; télécharge attachmentId seulement si nécessaire"""
+    body = part.get("body") or {}
+    data = body.get("data")
+    if not data and body.get("attachmentId") and fetch_attachment:
+        data = fetch_attachment(body["attachmentId"])
+    if not data:
+        return ""
+    raw = _b64decode(data, max_bytes)
+    match = _CHARSET.search(_header(part, "Content-Type"))
+    charset = match.group(1) if match else "utf-8"
+    try:
+        return raw.decode(charset, errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
+
+
+def html_to_text(markup):
+    """Conversion rapide par expressions régulières (pas de parseur DOM)"""
+    text = _HTML_DROP.sub("", markup)
+    text = _HTML_BREAK.sub("\n", text)
+    text = html.unescape(_HTML_TAG.sub("", text))
+    text = _SPACES.sub(" ", text)
+    return _BLANK_LINES.sub("\n\n", "\n".join(line.strip() for line in text.split("\n"))).strip()
+
+
+def extract_text(payload, fetch_attachment=None, max_bytes=MAX_BODY_BYTES):
+    """Corps texte du message : text/plain, sinon text/html converti, sinon ''"""
+    if not payload:
+        return ""
+    plain, html_part = find_body_parts(payload)
+    if plain is not None:
+        text = decode_part(plain, fetch_attachment, max_bytes)
+        if text.strip() or html_part is None:
+            return text
+    if html_part is not None:
+        return html_to_text(decode_part(html_part, fetch_attachment, max_bytes))
+    return ""
@@ -0,0 +1,178 @@
+"""
+Liste de messages paginée pour les interfaces : pages Gmail chargées au défilement, mises à jour par deltas
+"""
+import threading
+
+PAGE_SIZE = 50            # IDs demandés à messages().list par page affichée
+LOAD_AHEAD = 0.9          # page suivante demandée quand le bas de la liste dépasse 90 % de la vue
+
+
+class PagedInbox:
+    """IDs listés page par page (pageToken), lignes gardées en mémoire pour la session.
+
+    list_page(page_token, page_size) -> (IDs, nextPageToken) et fetch_rows(IDs)
+    -> {ID: ligne (dict avec "id") ou None si écartée} sont appelés hors du
+    thread Tk, sous self.lock : load_more() et refresh() peuvent donc venir de
+    deux tâches successives sans se marcher dessus. Les messages écartés par
+    fetch_rows (filtres) sont mémorisés comme tels et ne sont pas redemandés ;
+    ceux qu'il ne renvoie pas (échec Gmail) le seront au prochain refresh().
+    Une erreur pendant load_more() laisse la page à charger au prochain appel.
+    rows() renvoie une copie ordonnée, dédoublonnée par key(ligne) (premier
+    gardé), à passer à sync_tree() / sync_listbox() sur le thread Tk.
+    """
+
+    def __init__(self, list_page, fetch_rows, page_size=PAGE_SIZE, key=lambda row: row["id"]):
+        self.list_page = list_page
+        self.fetch_rows = fetch_rows
+        self.page_size = page_size
+        self.key = key
+        self.lock = threading.Lock()
+        self.order = []          # IDs listés, dans l'ordre Gmail
+        self.loaded = {}         # ID -> ligne, ou None si écartée par fetch_rows ; absent si pas encore reçu
+        self.next_token = None
+        self.started = False
+        self.stats = {"pages": 0, "fetched": 0}
+
+    @property
+    def exhausted(self):
+        return self.started and self.next_token is None
+
+    def _fetch(self, ids):
+        missing = [i for i in ids if i not in self.loaded]
+        if missing:
+            self.stats["fetched"] += len(missing)
+            self.loaded.update(self.fetch_rows(missing))
+
+    def load_more(self):
+        """Page suivante (la première si rien n'est chargé) ; renvoie rows()"""
+        with self.lock:
+            if not self.exhausted:
+                ids, token = self.list_page(self.next_token, self.page_size)
+                self.stats["pages"] += 1
+                listed = set(self.order)
+                new = [i for i in dict.fromkeys(ids) if i not in listed]
+                # Jeton avancé seulement une fois la page reçue : une erreur la laisse à recharger
+                self._fetch(new)
+                self.order.extend(new)
+                self.next_token, self.started = token, True
+            return self._rows()
+
+    def refresh(self):
+        """Reliste depuis le début autant d'IDs que déjà chargés ; seuls les nouveaux sont téléchargés.
+
+        Les messages disparus du listing (lus, archivés) sont retirés, les
+        nouveaux apparaissent à leur place ; renvoie rows().
+        """
+        with self.lock:
+            wanted = max(len(self.order), self.page_size)
+            order, listed, token = [], set(), None
+            while True:
+                ids, token = self.list_page(token, self.page_size)
+                self.stats["pages"] += 1
+                order.extend(i for i in ids if i not in listed)
+                listed.update(ids)
+                if not token or len(order) >= wanted:
+                    break
+            self._fetch(order)
+            kept = set(order)
+            self.loaded = {i: row for i, row in self.loaded.items() if i in kept}
+            self.order, self.next_token, self.started = order, token, True
+            return self._rows()
+
+    def _rows(self):
+        rows, seen = [], set()
+        for msg_id in self.order:
+            row = self.loaded.get(msg_id)
+            if row is not None and self.key(row) not in seen:
+                seen.add(self.key(row))
+                rows.append(row)
+        return rows
+
+    def rows(self):
+        with self.lock:
+            return self._rows()
+
+
+def sync_tree(tree, rows, iid, values):
+    """Aligne un Treeview sur rows par insertions/suppressions/déplacements, sans tout reconstruire.
+
+    iid(ligne) sert d'identifiant Tk : la sélection et le focus suivent donc la
+    ligne même quand d'autres apparaissent ou disparaissent au-dessus.
+    Renvoie (insérées, retirées, déplacées).
+    """
+    wanted = [str(iid(row)) for row in rows]
+    keep = set(wanted)
+    stale = [i for i in tree.get_children() if i not in keep]
+    if stale:
+        tree.delete(*stale)
+    current = list(tree.get_children())
+    present = set(current)
+    inserted = moved = 0
+    for index, (item, row) in enumerate(zip(wanted, rows)):
+        if index < len(current) and current[index] == item:
+            continue
+        if item in present:
+            tree.move(item, "", index)
+            current.remove(item)
+            moved += 1
+        else:
+            tree.insert("", index, iid=item, values=values(row))
+            present.add(item)
+            inserted += 1
+        current.insert(index, item)
+    return inserted, len(stale), moved
+
+
+def sync_listbox(listbox, shown, rows, key, label):
+    """Même chose pour un Listbox (sans identifiants) : shown = clés affichées, renvoie les nouvelles.
+
+    Une ligne sélectionnée qui change de place reste sélectionnée.
+    """
+    wanted = [key(row) for row in rows]
+    keep = set(wanted)
+    current = list(shown)
+    for index in range(len(current) - 1, -1, -1):
+        if current[index] not in keep:
+            listbox.delete(index)
+            del current[index]
+    present = set(current)
+    for index, (item, row) in enumerate(zip(wanted, rows)):
+        if index < len(current) and current[index] == item:
+            continue
+        selected = False
+        if item in present:
+            old = current.index(item)
+            selected = listbox.selection_includes(old)
+            listbox.delete(old)
+            current.remove(item)
+        listbox.insert(index, label(row))
+        if selected:
+            listbox.selection_set(index)
+        present.add(item)
+        current.insert(index, item)
+    return current
+
+
+def lazy_scroll(widget, scrollbar, on_near_end, threshold=LOAD_AHEAD):
+    """Relie widget et barre de défilement ; on_near_end() quand le bas visible dépasse threshold"""
+    def on_scroll(first, last):
+        scrollbar.set(first, last)
+        if float(last) >= threshold:
+            on_near_end()
+    widget.configure(yscrollcommand=on_scroll)
+    scrollbar.configure(command=widget.yview)
+
+
+def fill_view(widget, inbox, load_more, threshold=LOAD_AHEAD):
+    """À appeler après sync_tree() / sync_listbox() : page suivante tant que la vue n'est pas remplie.
+
+    Une liste plus courte que la vue (première page écartée par les filtres,
+    lignes trop peu nombreuses) ne défile pas : lazy_scroll ne serait jamais
+    appelé. Vérifié après le réaffichage (after_idle) ; load_more() passe par
+    l'exécuteur, et son rappel rappelle fill_view() jusqu'à remplir la vue ou
+    épuiser la boîte.
+    """
+    def check():
+        if not inbox.exhausted and float(widget.yview()[1]) >= threshold:
+            load_more()
+    widget.after_idle(check)
@@ -0,0 +1,139 @@
+"""
+Réduction des corps envoyés à OpenAI : historique cité, signatures et mentions légales retirés
+"""
+import re
+import threading
+
+from reply_pool import estimate_tokens
+from src.config import DEFAULT_CONFIG
+
+BODY_TOKEN_BUDGET = DEFAULT_CONFIG.get("prompt_body_tokens", 800)
+TRUNCATION_MARK = " […]"
+
+# Début d'un historique cité : tout ce qui suit est retiré
+_WROTE = re.compile(r"^\s*(le|on)\b.{0,200}\b(a écrit|wrote)\s*:\s*$", re.IGNORECASE)
+_QUOTE_HEADERS = re.compile(
+    r"^\s*(-{2,}\s*(original message|message d'origine|forwarded message|message transféré)\s*-{2,}"
+    r"|_{10,}\s*$)", re.IGNORECASE)
+_OUTLOOK_FROM = re.compile(r"^\s*\*?(de|from)\s*:", re.IGNORECASE)
+_OUTLOOK_NEXT = re.compile(r"^\s*\*?(envoyé|sent|date|à|to|objet|subject)\s*:", re.IGNORECASE)
+
+# Fin du message utile : signature, mentions d'envoi mobile, avis de confidentialité
+_SIGNATURE_MARKERS = re.compile(
+    r"^\s*(--\s*$|envoyé de mon|sent from my|get outlook for|obtenir outlook pour"
+    r"|avis de confidentialit|confidentialit[ée]\s*:|ce (courriel|message) (et ses pièces jointes )?"
+    r"(est|peut) (confidentiel|contenir)|this (e-?mail|message) (and any attachments )?"
+    r"(is|may contain) confidential|disclaimer\s*:|pensez à l'environnement|please consider the environment)",
+    re.IGNORECASE)
+_CLOSINGS = re.compile(r"^\s*(cordialement|bien à vous|merci( beaucoup)?|salutations|au plaisir"
+                       r"|bonne journée|regards|best regards|thanks|thank you)\b[\s,.!]*$", re.IGNORECASE)
+MAX_SIGNATURE_LINES = 6
+MAX_CONTACT_WORDS = 5      # nom, fonction, entreprise, adresse : lignes courtes, pas des phrases
+_CONTACT_DETAIL = re.compile(r"^[\W\d_]*(t[ée]l|t|cell?|fax|courriel|e-?mail|web|site)?[\s.:]*"
+                             r"([+\d(][\d\s().-]{6,}|\S+@\S+|(https?://|www\.)\S+)\s*$", re.IGNORECASE)
+
+
+def _count(text):
+    return estimate_tokens(text) if text else 0
+
+
+def _starts_quote(lines, i):
+    line = lines[i]
+    if _QUOTE_HEADERS.match(line) or _WROTE.match(line):
+        return True
+    nxt = lines[i + 1] if i + 1 < len(lines) else ""
+    # Gmail coupe souvent « Le …, Nom <adresse> a écrit : » sur deux lignes
+    if nxt and _WROTE.match(line + " " + nxt):
+        return True
+    # « De : » n'est un en-tête Outlook que s'il est suivi d'Envoyé :/À :/Objet :
+    return bool(_OUTLOOK_FROM.match(line)
+                and any(_OUTLOOK_NEXT.match(n) for n in lines[i + 1:i + 4]))
+
+
+def strip_quoted(text):
+    """Coupe à la première ligne d'en-tête de citation et retire les lignes « > »"""
+    lines = text.splitlines()
+    kept = []
+    for i, line in enumerate(lines):
+        if _starts_quote(lines, i):
+            break
+        if not line.lstrip().startswith(">"):
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def _is_contact_line(line):
+    """Ligne de bloc de coordonnées : nom, fonction, adresse, téléphone, courriel ; jamais une question"""
+    line = line.strip()
+    if "?" in line:
+        return False
+    return len(line.split()) <= MAX_CONTACT_WORDS or bool(_CONTACT_DETAIL.match(line))
+
+
+def strip_signature(text):
+    """Retire signature (« -- »), mentions mobiles et avis légaux ; garde la formule et le nom"""
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if _SIGNATURE_MARKERS.match(line):
+            lines = lines[:i]
+            break
+    # Bloc de coordonnées après « Cordialement, » : on garde la formule et la ligne du nom.
+    # Un « Merci! » suivi de phrases ou de questions est au milieu du message : rien n'est coupé.
+    for i in range(len(lines) - 1, -1, -1):
+        if _CLOSINGS.match(lines[i]):
+            tail = [line for line in lines[i + 1:] if line.strip()]
+            if len(tail) <= MAX_SIGNATURE_LINES and all(_is_contact_line(line) for line in tail):
+                lines = lines[:i + 1] + tail[:1]
+            break
+    return "\n".join(lines)
+
+
+def truncate_tokens(text, budget):
+    """Tronque à ~budget jetons (même estimation que le limiteur de débit), sur une limite de mot"""
+    if _count(text) <= budget:
+        return text
+    cut = text[:max(0, budget * 4 - len(TRUNCATION_MARK))]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + TRUNCATION_MARK
+
+
+def clean_body(text, budget=BODY_TOKEN_BUDGET):
+    cleaned = re.sub(r"\n\s*\n+", "\n\n", strip_signature(strip_quoted(text))).strip()
+    # Message réduit à rien (réponse écrite sous la citation) : on garde l'original
+    cleaned = cleaned or text.strip()
+    return truncate_tokens(cleaned, budget) if budget else cleaned
+
+
+class PromptTrimmer:
+    """clean_body() avec compteurs avant/après, partagé entre les threads du ReplyPool"""
+
+    def __init__(self, budget=BODY_TOKEN_BUDGET):
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.bodies = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.truncated = 0
+
+    def trim(self, text):
+        cleaned = clean_body(text or "", self.budget)
+        with self.lock:
+            self.bodies += 1
+            self.tokens_before += _count(text or "")
+            self.tokens_after += _count(cleaned)
+            self.truncated += cleaned.endswith(TRUNCATION_MARK)
+        return cleaned
+
+    @property
+    def saved(self):
+        return self.tokens_before - self.tokens_after
+
+    def summary(self):
+        ratio = self.saved / self.tokens_before * 100 if self.tokens_before else 0
+        return (f"✂️ Prompts : {self.tokens_before} → {self.tokens_after} jetons estimés "
+                f"(-{ratio:.0f} %) sur {self.bodies} messages, {self.truncated} tronqués")
@@ -0,0 +1,151 @@
+"""
+Cache des suggestions de réponse (adressé par contenu) pour éviter de rappeler OpenAI
+"""
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from metrics import METRICS
+
+CACHE_PATH = "reply_cache.json"
+DEFAULT_TTL = 7 * 24 * 3600   # une semaine
+MAX_ENTRIES = 1000
+
+_SPACES = re.compile(r"\s+")
+_PUNCT = re.compile(r"[^\w\s]")
+
+
+def normalize_body(text, aggressive=False):
+    """Normalise un corps de message pour la clé de cache.
+
+    Mode normal : espaces compactés. Mode agressif (quasi-doublons) : accents
+    retirés, casse et ponctuation ignorées, pour reconnaître les copier-coller
+    du type « Combien coûte la formation gardiennage? ».
+    """
+    if aggressive:
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+        text = _PUNCT.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+class ReplyCache:
+    """Cache LRU avec TTL, clé = (corps normalisé, gabarit de prompt, modèle, max_tokens)"""
+
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES,
+                 near_duplicates=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.near_duplicates = near_duplicates
+        self.entries = OrderedDict()   # clé -> (horodatage, réponse)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()   # plusieurs boîtes (mailboxes.py) peuvent sauver en même temps
+        self.dirty = False
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def key(self, body, template, model, max_tokens, thread=None):
+        """thread=(threadId, id du dernier message) : une entrée par état de conversation,
+        quel que soit le contexte résumé autour du corps"""
+        if thread is not None:
+            raw = json.dumps(["thread", list(thread), template, model, max_tokens])
+        else:
+            normalized = normalize_body(body, aggressive=self.near_duplicates)
+            raw = json.dumps([normalized, template, model, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, body, template, model, max_tokens, thread=None):
+        k = self.key(body, template, model, max_tokens, thread)
+        with self.lock:
+            entry = self.entries.get(k)
+            if entry and time.time() - entry[0] < self.ttl:
+                self.entries.move_to_end(k)
+                self.hits += 1
+                METRICS.inc("cache_requests_total", cache="reply", result="hit")
+                return entry[1]
+            if entry:
+                del self.entries[k]
+            self.misses += 1
+        METRICS.inc("cache_requests_total", cache="reply", result="miss")
+        return None
+
+    def put(self, body, template, model, max_tokens, reply, thread=None):
+        k = self.key(body, template, model, max_tokens, thread)
+        with self.lock:
+            self.entries[k] = (time.time(), reply)
+            self.entries.move_to_end(k)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def get_or_generate(self, body, template, model, max_tokens, generate, thread=None):
+        """Retourne la réponse en cache ou appelle generate() et la mémorise.
+
+        Une exception levée par generate() n'est pas mise en cache.
+        """
+        reply = self.get(body, template, model, max_tokens, thread)
+        if reply is None:
+            reply = generate()
+            self.put(body, template, model, max_tokens, reply, thread)
+        return reply
+
+    def stream_or_generate(self, body, template, model, max_tokens, stream, thread=None):
+        """Version générateur de get_or_generate pour stream=True.
+
+        Une réponse en cache sort en un seul morceau ; sinon les morceaux de
+        stream() sont relayés au fil de l'eau et le texte complet n'est mis en
+        cache qu'à la fin. Un flux abandonné (close()) n'est pas mis en cache.
+        """
+        reply = self.get(body, template, model, max_tokens, thread)
+        if reply is not None:
+            yield reply
+            return
+        parts = []
+        deltas = stream()
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield delta
+        finally:
+            deltas.close()
+        self.put(body, template, model, max_tokens, "".join(parts).strip(), thread)
+
+    # ---------- Persistance ---------- #
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        now = time.time()
+        with self.lock:
+            for k, (ts, reply) in sorted(data.items(), key=lambda item: item[1][0]):
+                if now - ts < self.ttl:
+                    self.entries[k] = (ts, reply)
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with self.save_lock:
+            with self.lock:
+                data = dict(self.entries)
+                self.dirty = False
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
@@ -0,0 +1,138 @@
+"""
+Génération concurrente des réponses OpenAI avec budgets RPM/TPM et reprises sur 429/5xx
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS
+
+DEFAULT_WORKERS = 4
+DEFAULT_RPM = 60         # requêtes par minute
+DEFAULT_TPM = 40000      # jetons par minute
+MAX_RETRIES = 5
+
+
+def estimate_tokens(text):
+    """Estimation grossière : ~4 caractères par jeton"""
+    return len(text) // 4 + 1
+
+
+def error_status(exc):
+    """Code HTTP d'une erreur OpenAI (http_status) ou HTTP générique, sinon None"""
+    for attr in ("http_status", "status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    status = getattr(getattr(exc, "resp", None), "status", None)
+    return int(status) if status is not None else None
+
+
+def is_retryable(exc):
+    status = error_status(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    # openai<1.0 : Timeout, APIConnectionError, ServiceUnavailableError n'ont pas toujours de code
+    return type(exc).__name__ in {"Timeout", "APIConnectionError", "ServiceUnavailableError",
+                                  "TryAgain", "RateLimitError"}
+
+
+class RateLimiter:
+    """Double seau à jetons (requêtes/min et jetons/min), partageable entre threads"""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens=0):
+        """Bloque jusqu'à ce qu'une requête de `tokens` jetons tienne dans les budgets"""
+        tokens = min(tokens, self.tpm)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.requests >= 1 and self.tokens >= tokens:
+                    self.requests -= 1
+                    self.tokens -= tokens
+                    return
+                wait = max((1 - self.requests) * 60 / self.rpm,
+                           (tokens - self.tokens) * 60 / self.tpm, 0.01)
+            time.sleep(wait)
+
+
+def call_with_retry(fn, retries=MAX_RETRIES, base_delay=1.0, max_delay=30.0, on_retry=None):
+    """Appelle fn() en rejouant les erreurs 429/5xx avec un backoff exponentiel à gigue complète"""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if on_retry:
+                on_retry(e, attempt, delay)
+            time.sleep(delay)
+
+
+class ReplyPool:
+    """Exécute N générations en parallèle en respectant un RateLimiter commun.
+
+    map() retourne les résultats dans l'ordre d'entrée ; une génération en échec
+    après toutes les reprises est retournée sous forme d'exception. Les réponses
+    trouvées par cached() ne passent pas par le RateLimiter.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, limiter=None, retries=MAX_RETRIES,
+                 base_delay=1.0):
+        self.workers = workers
+        self.limiter = limiter or RateLimiter()
+        self.retries = retries
+        self.base_delay = base_delay
+        self.retry_count = 0
+        self.lock = threading.Lock()
+
+    def _on_retry(self, exc, attempt, delay):
+        with self.lock:
+            self.retry_count += 1
+        METRICS.inc("openai_retries_total", status=error_status(exc) or type(exc).__name__)
+        print(f"⏳ OpenAI {error_status(exc) or type(exc).__name__}, nouvel essai dans {delay:.1f}s")
+
+    def _run(self, fn, item, tokens):
+        def attempt():
+            self.limiter.acquire(tokens)
+            return fn(item)
+        try:
+            return call_with_retry(attempt, retries=self.retries, base_delay=self.base_delay,
+                                   on_retry=self._on_retry)
+        except Exception as e:
+            return e
+
+    def map(self, fn, items, cost=None, cached=None):
+        """cost(item) -> jetons estimés (prompt + max_tokens) pour le budget TPM ;
+        cached(item) -> réponse déjà connue ou None, consulté avant de réserver du budget.
+
+        Les éléments (hashables) identiques ne sont générés qu'une fois.
+        """
+        items = list(items)
+        results = [cached(item) if cached else None for item in items]
+        todo = [i for i, result in enumerate(results) if result is None]
+        if not todo:
+            return results
+        distinct = list(dict.fromkeys(items[i] for i in todo))
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(distinct))) as executor:
+            futures = {item: executor.submit(self._run, fn, item, cost(item) if cost else 0)
+                       for item in distinct}
+            for i in todo:
+                results[i] = futures[items[i]].result()
+        return results
@@ -0,0 +1,126 @@
+"""
+Écriture Google Sheets regroupée : un client autorisé par processus et append_rows par lots
+"""
+import atexit
+import threading
+import time
+
+from metrics import METRICS
+
+SHEETS_SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+MAX_BUFFERED_ROWS = 50
+MAX_BUFFER_AGE = 60.0   # secondes
+ID_COLUMN = 2           # colonne msg_id des lignes de suggestion
+
+
+class SheetWriter:
+    """Accumule les lignes et les envoie en un seul appel append_rows.
+
+    Le vidage a lieu sur flush() (fin de cycle), quand le tampon atteint
+    max_rows lignes ou max_age secondes, et à l'arrêt du processus.
+
+    La colonne id_column (msg_id) est chargée une fois en mémoire : is_known()
+    permet d'ignorer un message déjà consigné avant même de le télécharger.
+    limiter (RateLimiter de reply_pool) : budget de requêtes Sheets partagé entre
+    plusieurs SheetWriter du même processus (une feuille par compte Gmail).
+    """
+
+    def __init__(self, sheet_id, worksheet_name=None, credentials_path="credentials.json",
+                 scope=SHEETS_SCOPE, max_rows=MAX_BUFFERED_ROWS, max_age=MAX_BUFFER_AGE,
+                 worksheet=None, id_column=ID_COLUMN, limiter=None):
+        self.sheet_id = sheet_id
+        self.worksheet_name = worksheet_name
+        self.credentials_path = credentials_path
+        self.scope = scope
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self._worksheet = worksheet
+        self.id_column = id_column
+        self.limiter = limiter
+        self.known_ids = None
+        self.buffer = []
+        self.first_buffered = None
+        self.rows_written = 0
+        self.lock = threading.RLock()
+        atexit.register(self.close)
+
+    @property
+    def worksheet(self):
+        """Ouvre la feuille une seule fois par processus"""
+        with self.lock:
+            if self._worksheet is None:
+                import gspread
+                from oauth2client.service_account import ServiceAccountCredentials
+                creds = ServiceAccountCredentials.from_json_keyfile_name(self.credentials_path, self.scope)
+                sheet = gspread.authorize(creds).open_by_key(self.sheet_id)
+                if self.worksheet_name:
+                    try:
+                        self._worksheet = sheet.worksheet(self.worksheet_name)
+                    except gspread.exceptions.WorksheetNotFound:
+                        self._worksheet = sheet.sheet1
+                        print(f"⚠️ Onglet « {self.worksheet_name} » introuvable : "
+                              f"écriture dans le premier onglet ({self._worksheet.title})")
+                else:
+                    self._worksheet = sheet.sheet1
+            return self._worksheet
+
+    # ---------- Index de déduplication ---------- #
+    def resync(self):
+        """Recharge les IDs consignés en une seule lecture de colonne"""
+        self._acquire()
+        with METRICS.span("sheet_read"):
+            values = self.worksheet.col_values(self.id_column)
+        METRICS.inc("sheets_api_calls_total", method="col_values")
+        with self.lock:
+            self.known_ids = {v for v in values if v}
+            for row in self.buffer:
+                self._remember(row)
+        return len(self.known_ids)
+
+    def _remember(self, row):
+        if len(row) >= self.id_column:
+            self.known_ids.add(row[self.id_column - 1])
+
+    def _acquire(self, calls=1):
+        if self.limiter:
+            for _ in range(calls):
+                self.limiter.acquire()
+
+    def is_known(self, msg_id):
+        if self.known_ids is None:
+            self.resync()
+        return msg_id in self.known_ids
+
+    # ---------- Écriture ---------- #
+    def append(self, row):
+        with self.lock:
+            if self.known_ids is not None:
+                self._remember(row)
+            if not self.buffer:
+                self.first_buffered = time.monotonic()
+            self.buffer.append(row)
+            if (len(self.buffer) >= self.max_rows
+                    or time.monotonic() - self.first_buffered >= self.max_age):
+                self.flush()
+
+    def flush(self):
+        """Envoie les lignes en attente ; retourne le nombre de lignes écrites"""
+        with self.lock:
+            if not self.buffer:
+                return 0
+            rows = self.buffer
+            self._acquire()
+            with METRICS.span("sheet_append"):
+                self.worksheet.append_rows(rows)
+            METRICS.inc("sheets_api_calls_total", method="append_rows")
+            METRICS.inc("sheets_rows_total", len(rows))
+            self.buffer = []
+            self.first_buffered = None
+            self.rows_written += len(rows)
+            return len(rows)
+
+    def close(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"❌ Lignes non écrites dans la feuille ({len(self.buffer)}) : {e}")
@@ -1,13 +1,8 @@
 # smoke_test.py
-from dotenv import load_dotenv
-import os
-import openai
+import core
 
-# Charge ton .env
-load_dotenv()
-
-# Récupère ta clé
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Charge ton .env et configure openai avec ta clé (OPENAI_API_KEY)
+openai = core.get_openai()
 
 # Appel basique pour lister quelques modèles
 models = openai.Model.list()
@@ -17,14 +17,30 @@ DEFAULT_CONFIG = {
     "ignored_senders": [
         "noreply@",
         "no-reply@",
-        "notification@"
+        "notification@",
+        "academie@academiexguard.ca",
+        "d.oliveira@academiexguard.ca"
+    ],
+    # messages de cet expéditeur : label « Élite » sans suggestion
+    "elite_sender": "d.oliveira@academiexguard.ca",
+    "excluded_subject_phrases": [
+        "confirmation d'inscription"
     ],
     "keywords": [
         "formation",
         "gardiennage",
         "prix",
-        "intéressé"
-    ]
+        "intéressé par la formation"
+    ],
+    # catégorie → synonymes, reconnus comme le mot-clé (accents et casse ignorés)
+    "keyword_synonyms": {},
+    # jetons estimés du corps envoyé à OpenAI, après retrait des citations et signatures
+    "prompt_body_tokens": 800,
+    # Compte Gmail, feuille de suivi et modèle communs à tous les scripts (surchargés par .env)
+    "user_id": "me",
+    "sheet_id": "19R0THrBOMCWafXHf_X9DQJNnvvmbhLGMwX5TU84abq8",
+    "worksheet_name": "Feuille 1",
+    "reply_model": "gpt-4o"
 }
 
 # Messages
@@ -33,7 +49,6 @@ Réponds de manière professionnelle, claire et utile aux demandes concernant
 les formations en gardiennage et sécurité."""
 
 def load_env():
-    """Charge les variables d'environnement"""
-    if ENV_PATH.exists():
-        from dotenv import load_dotenv
-        load_dotenv(ENV_PATH)
+    """Charge les variables d'environnement : src/.env, sinon le premier .env trouvé en remontant"""
+    from dotenv import find_dotenv, load_dotenv
+    load_dotenv(ENV_PATH if ENV_PATH.exists() else find_dotenv())
@@ -0,0 +1,276 @@
+"""
+Exécution des appels Gmail/OpenAI hors du thread Tk : exécuteur, file de résultats vidée par after()
+"""
+import itertools
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk
+
+POLL_MS = 50
+DEFAULT_WORKERS = 4
+PREFETCH_ROWS = 8         # suggestions générées d'avance pour les premières lignes de la liste
+PREFETCH_WORKERS = 2      # appels OpenAI simultanés consacrés à la pré-génération
+SELECTED = 0              # priorité de la ligne sélectionnée, devant toute pré-génération
+
+
+class BackgroundTasks:
+    """Les fonctions soumises tournent dans un ThreadPoolExecutor ; leurs résultats
+    passent par une queue.Queue que le thread Tk vide toutes les POLL_MS via after().
+
+    Les rappels on_done/on_error s'exécutent donc toujours sur le thread Tk, seul
+    autorisé à toucher aux widgets. Chaque tâche appartient à un canal
+    (« refresh », « reply »…) : une nouvelle soumission sur le même canal rend la
+    précédente périmée. Si elle n'a pas démarré, elle est annulée ; sinon son
+    résultat est ignoré à l'arrivée.
+    """
+
+    def __init__(self, root, workers=DEFAULT_WORKERS, poll_ms=POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tk-io")
+        self.results = queue.Queue()
+        self.generations = {}   # canal -> numéro de la dernière soumission
+        self.futures = {}       # canal -> future de la dernière soumission
+        self.closed = False
+        self.root.after(self.poll_ms, self._drain)
+
+    def submit(self, channel, fn, *args, on_done=None, on_error=None):
+        """Planifie fn(*args) ; on_done(résultat) ou on_error(exception) sur le thread Tk"""
+        self.cancel(channel)
+        generation = self.generations.get(channel, 0) + 1
+        self.generations[channel] = generation
+        future = self.executor.submit(fn, *args)
+        self.futures[channel] = future
+        future.add_done_callback(
+            lambda f: self.results.put((channel, generation, f, on_done, on_error)))
+        return future
+
+    def cancel(self, channel):
+        """Rend la tâche en cours du canal périmée (annulée si elle n'a pas encore démarré)"""
+        future = self.futures.pop(channel, None)
+        if future is not None:
+            future.cancel()
+            self.generations[channel] = self.generations.get(channel, 0) + 1
+
+    def busy(self, channel):
+        future = self.futures.get(channel)
+        return future is not None and not future.done()
+
+    def _drain(self):
+        if self.closed:
+            return
+        while True:
+            try:
+                channel, generation, future, on_done, on_error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if future.cancelled() or generation != self.generations.get(channel):
+                continue
+            self.futures.pop(channel, None)
+            error = future.exception()
+            if error is not None:
+                if on_error:
+                    on_error(error)
+                else:
+                    print(f"❌ Tâche « {channel} » en échec : {error}")
+            elif on_done:
+                on_done(future.result())
+        self.root.after(self.poll_ms, self._drain)
+
+    def shutdown(self):
+        self.closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SuggestionPrefetcher:
+    """Pré-génération des suggestions pour les lignes affichées, gardées pour la session.
+
+    generate(arg) tourne dans PREFETCH_WORKERS threads qui tirent d'une
+    PriorityQueue : la ligne sélectionnée (priorité SELECTED) passe devant les
+    lignes pré-générées, elles-mêmes traitées dans l'ordre de la liste. Les
+    résultats sont conservés dans self.suggestions (clé → texte) ; request()
+    répond donc immédiatement pour une ligne déjà prête et, sinon, rappelle
+    on_done sur le thread Tk dès que la génération aboutit. Un nouvel appel à
+    prefetch() (liste rafraîchie) abandonne les lignes pas encore démarrées,
+    sauf la ligne sélectionnée ; les générations déjà lancées sont gardées.
+
+    Avec stream(arg) (générateur de morceaux de texte) à la place de generate,
+    chaque morceau est relayé à on_delta de la ligne sélectionnée dès son
+    arrivée. Une génération demandée par un clic est interrompue (flux fermé,
+    rien n'est gardé) quand l'opérateur passe à un autre courriel ; les
+    pré-générations vont à leur terme.
+    """
+
+    def __init__(self, root, generate=None, rows=PREFETCH_ROWS, workers=PREFETCH_WORKERS, poll_ms=POLL_MS,
+                 stream=None):
+        self.root = root
+        self.generate = generate
+        self.stream = stream
+        self.rows = rows
+        self.poll_ms = poll_ms
+        self.suggestions = {}
+        self.partial = {}        # clé → texte déjà reçu d'une génération en flux
+        self.lock = threading.Lock()
+        self.pending = {}        # clé → numéro de la demande en file encore valable
+        self.running = set()
+        self.waiting = None      # (clé, arg, on_done, on_error, on_delta) de la ligne sélectionnée
+        self.counter = itertools.count()
+        self.jobs = queue.PriorityQueue()
+        self.results = queue.Queue()
+        self.stats = {"prefetched": 0, "instant": 0, "waited": 0, "failed": 0, "cancelled": 0}
+        self.closed = False
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"prefetch-{i}", daemon=True).start()
+        self.root.after(self.poll_ms, self._drain)
+
+    def _enqueue(self, priority, key, arg):
+        seq = next(self.counter)
+        self.pending[key] = seq
+        self.jobs.put((priority, seq, key, arg))
+
+    def prefetch(self, items):
+        """items : (clé, argument de generate) des lignes dans l'ordre d'affichage"""
+        with self.lock:
+            selected = self.waiting[0] if self.waiting else None
+            self.pending = {k: seq for k, seq in self.pending.items() if k == selected}
+            for position, (key, arg) in enumerate(items[:self.rows], start=SELECTED + 1):
+                if key not in self.suggestions and key not in self.running:
+                    self._enqueue(position, key, arg)
+
+    def request(self, key, arg, on_done, on_error=None, on_delta=None):
+        """Suggestion de la ligne sélectionnée : immédiate si prête, sinon prioritaire.
+
+        Si la génération est déjà en cours en flux, le texte reçu jusque-là est
+        passé tout de suite à on_delta, puis les morceaux suivants.
+        """
+        if key in self.suggestions:
+            self.stats["instant"] += 1
+            self.waiting = None
+            on_done(self.suggestions[key])
+            return True
+        self.stats["waited"] += 1
+        self.waiting = (key, arg, on_done, on_error, on_delta)
+        if on_delta and self.partial.get(key):
+            on_delta(self.partial[key])
+        with self.lock:
+            if key not in self.running:
+                self._enqueue(SELECTED, key, arg)
+        return False
+
+    def forget(self, key):
+        self.suggestions.pop(key, None)
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def _abandoned(self, key, priority):
+        """Génération lancée par un clic alors que l'opérateur a changé de ligne"""
+        waiting = self.waiting
+        return priority == SELECTED and (waiting is None or waiting[0] != key)
+
+    def _run(self, key, priority, arg):
+        if self.stream is None:
+            return self.generate(arg)
+        parts = []
+        deltas = self.stream(arg)
+        try:
+            for delta in deltas:
+                if self._abandoned(key, priority):
+                    return None
+                parts.append(delta)
+                self.results.put(("delta", key, priority, delta))
+        finally:
+            # Ferme la connexion HTTP si le flux est abandonné en cours de route
+            deltas.close()
+        return "".join(parts).strip()
+
+    def _work(self):
+        while not self.closed:
+            priority, seq, key, arg = self.jobs.get()
+            with self.lock:
+                # Demande remplacée par une autre (liste rafraîchie, clic) ou déjà servie
+                if self.pending.get(key) != seq or key in self.suggestions or key in self.running:
+                    continue
+                del self.pending[key]
+                if self._abandoned(key, priority):
+                    continue
+                self.running.add(key)
+            try:
+                text = self._run(key, priority, arg)
+                self.results.put(("cancelled", key, priority, None) if text is None
+                                 else ("done", key, priority, text))
+            except Exception as e:
+                self.results.put(("failed", key, priority, e))
+
+    def _drain(self):
+        if self.closed:
+            return
+        while True:
+            try:
+                kind, key, priority, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            waiting = self.waiting if self.waiting and self.waiting[0] == key else None
+            if kind == "delta":
+                self.partial[key] = self.partial.get(key, "") + value
+                if waiting and waiting[4]:
+                    waiting[4](value)
+                continue
+            self.partial.pop(key, None)
+            with self.lock:
+                self.running.discard(key)
+            if kind == "cancelled":
+                self.stats["cancelled"] += 1
+                if waiting:
+                    # L'opérateur est revenu sur la ligne pendant l'interruption : on relance
+                    with self.lock:
+                        self._enqueue(SELECTED, key, waiting[1])
+                continue
+            if kind == "done":
+                self.suggestions[key] = value
+                self.stats["prefetched"] += priority != SELECTED
+            else:
+                self.stats["failed"] += 1
+            if waiting:
+                _, _, on_done, on_error, _ = waiting
+                self.waiting = None
+                if kind == "done":
+                    on_done(value)
+                elif on_error:
+                    on_error(value)
+                else:
+                    print(f"❌ Suggestion en échec : {value}")
+        self.root.after(self.poll_ms, self._drain)
+
+    def shutdown(self):
+        self.closed = True
+        self.waiting = None
+        with self.lock:
+            self.pending.clear()
+
+
+class StatusBar(ttk.Frame):
+    """Texte d'état + barre de progression indéterminée tant qu'une tâche est active"""
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.label = ttk.Label(self, text="")
+        self.label.pack(side=tk.LEFT, padx=5)
+        self.progress = ttk.Progressbar(self, mode="indeterminate", length=120)
+        self.active = set()
+
+    def start(self, key, text):
+        self.label.config(text=text)
+        if not self.active:
+            self.progress.pack(side=tk.RIGHT, padx=5)
+            self.progress.start(15)
+        self.active.add(key)
+
+    def stop(self, key, text=None):
+        self.active.discard(key)
+        if text is not None:
+            self.label.config(text=text)
+        if not self.active:
+            self.progress.stop()
+            self.progress.pack_forget()
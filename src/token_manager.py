@@ -0,0 +1,166 @@
+"""
+Gestion partagée du jeton d'accès OAuth Gmail (cache mémoire + disque) et du service Gmail
+"""
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+TOKEN_CACHE_PATH = "access_token.json"
+REFRESH_MARGIN = 300   # rafraîchir 5 minutes avant l'expiration
+
+
+class TokenManager:
+    """Fournit un jeton d'accès valide en ne contactant oauth2.googleapis.com qu'à l'expiration.
+
+    Le jeton et son expiration sont gardés en mémoire et dans cache_path, ce qui
+    profite aussi aux autres scripts lancés sur le même poste. Le fichier est lié
+    au refresh token (empreinte) pour ne jamais servir le jeton d'un autre compte.
+    """
+
+    def __init__(self, client_id, client_secret, refresh_token, cache_path=TOKEN_CACHE_PATH,
+                 margin=REFRESH_MARGIN):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_token = refresh_token
+        self.cache_path = cache_path
+        self.margin = margin
+        self.access_token = None
+        self.expires_at = 0.0
+        self.refresh_count = 0
+        self._credentials = None
+        self.lock = threading.Lock()
+        self.fingerprint = hashlib.sha256((refresh_token or "").encode("utf-8")).hexdigest()[:16]
+
+    def _fresh(self):
+        return self.access_token is not None and time.time() < self.expires_at - self.margin
+
+    def _load(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("fingerprint") == self.fingerprint:
+            self.access_token = data.get("access_token")
+            self.expires_at = float(data.get("expires_at", 0))
+
+    def _save(self):
+        tmp = f"{self.cache_path}.tmp"
+        # Jeton lisible par le seul propriétaire (0600), y compris après os.replace
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "access_token": self.access_token,
+                       "expires_at": self.expires_at}, f)
+        os.replace(tmp, self.cache_path)
+
+    def _refresh(self):
+        import requests
+        r = requests.post(TOKEN_URI, data={
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "refresh_token": self.refresh_token,
+            "grant_type": "refresh_token",
+        }, timeout=30)
+        r.raise_for_status()
+        data = r.json()
+        self.access_token = data["access_token"]
+        self.expires_at = time.time() + int(data.get("expires_in", 3600))
+        self.refresh_count += 1
+        if self.cache_path:
+            self._save()
+
+    def get_token(self):
+        """Jeton valide au moins `margin` secondes ; rafraîchi sous verrou si nécessaire"""
+        with self.lock:
+            if not self._fresh() and self.cache_path:
+                self._load()
+            if not self._fresh():
+                self._refresh()
+            return self.access_token
+
+    def expiry(self):
+        """Instant (UTC naïf, comme google-auth) où le jeton doit être rafraîchi"""
+        return datetime.datetime.utcfromtimestamp(self.expires_at - self.margin)
+
+    def credentials(self):
+        """Credentials google-auth dont le rafraîchissement passe par ce gestionnaire"""
+        from google.oauth2.credentials import Credentials
+
+        manager = self
+
+        class ManagedCredentials(Credentials):
+            def refresh(self, request):
+                self.token = manager.get_token()
+                self.expiry = manager.expiry()
+
+        creds = ManagedCredentials(token=self.get_token(), refresh_token=self.refresh_token,
+                                   token_uri=TOKEN_URI, client_id=self.client_id,
+                                   client_secret=self.client_secret)
+        creds.expiry = self.expiry()
+        return creds
+
+    def shared_credentials(self):
+        """Même objet Credentials pour tout le processus"""
+        with self.lock:
+            creds = self._credentials
+        if creds is None:
+            creds = self.credentials()
+            with self.lock:
+                self._credentials = self._credentials or creds
+                creds = self._credentials
+        return creds
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(client_id=None, client_secret=None, refresh_token=None):
+    """Gestionnaire unique par refresh token (par défaut : variables d'environnement)"""
+    client_id = client_id or os.getenv("CLIENT_ID")
+    client_secret = client_secret or os.getenv("CLIENT_SECRET")
+    refresh_token = refresh_token or os.getenv("REFRESH_TOKEN")
+    with _managers_lock:
+        if refresh_token not in _managers:
+            _managers[refresh_token] = TokenManager(client_id, client_secret, refresh_token)
+        return _managers[refresh_token]
+
+
+# ---------- Service Gmail ---------- #
+_discovery_doc = None
+_local = threading.local()
+
+
+def _gmail_discovery_doc():
+    """Document de découverte Gmail chargé une seule fois par processus"""
+    global _discovery_doc
+    if _discovery_doc is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        _discovery_doc = get_static_doc("gmail", "v1") or ""
+    return _discovery_doc
+
+
+def build_gmail_service(credentials):
+    """Service Gmail mis en cache par thread (httplib2 n'est pas thread-safe)"""
+    cache = getattr(_local, "services", None)
+    if cache is None:
+        cache = _local.services = {}
+    key = id(credentials)
+    if key not in cache:
+        from googleapiclient.discovery import build, build_from_document
+        doc = _gmail_discovery_doc()
+        if doc:
+            cache[key] = build_from_document(doc, credentials=credentials)
+        else:
+            cache[key] = build("gmail", "v1", credentials=credentials)
+    return cache[key]
+
+
+def get_gmail_service(manager=None):
+    """Service Gmail authentifié par un TokenManager partagé"""
+    manager = manager or get_token_manager()
+    return build_gmail_service(manager.shared_credentials())